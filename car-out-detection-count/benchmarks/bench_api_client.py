@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark ApiClient upload modes against a local stub server
+วัดประสิทธิภาพการส่งข้อมูลของ ApiClient กับ server จำลองในเครื่อง
+
+Usage:
+    python benchmarks/bench_api_client.py [--requests 500] [--batch 100] [--latency-ms 5]
+"""
+
+import os
+import sys
+import gzip
+import json
+import time
+import argparse
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from loguru import logger
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.api_client import ApiClient
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Minimal keep-alive API endpoint that accepts gzip/zstd and columnar payloads"""
+
+    protocol_version = "HTTP/1.1"
+    # ตอบ header และ body แยกกัน ต้องปิด Nagle ไม่เช่นนั้น connection แบบ keep-alive จะติด delayed ACK
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self._reply({"status": "ok", "formats": ["rows", "columnar"], "encodings": ["gzip", "zstd"]})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        stats = self.server.stats
+        with stats["lock"]:
+            stats["requests"] += 1
+            stats["bytes"] += len(body)
+            stats["connections"].add(self.client_address)
+
+        encoding = self.headers.get("Content-Encoding")
+        if encoding == "gzip":
+            body = gzip.decompress(body)
+        elif encoding == "zstd":
+            import zstandard
+            body = zstandard.ZstdDecompressor().decompress(body)
+        json.loads(body)
+
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        self._reply({"status": "ok"})
+
+    def _reply(self, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(latency):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.stats = {"lock": threading.Lock(), "requests": 0, "bytes": 0, "connections": set()}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def make_batch(size):
+    start = datetime(2026, 1, 1, 8, 0, 0)
+    batch = []
+    for i in range(size):
+        now = start + timedelta(seconds=i * 7)
+        batch.append({
+            "timestamp": now.strftime("%Y-%m-%d %H:%M:%S"),
+            "date": now.strftime("%Y-%m-%d"),
+            "time": now.strftime("%H:%M:%S"),
+            "location_id": "parking-lot-north",
+            "camera_id": "gate-exit-01",
+            "count": 1,
+            "total_count": 1000 + i
+        })
+    return batch
+
+
+def make_client(endpoint, payload_format, compression, max_workers):
+    config = {"api": {
+        "enabled": True, "endpoint": endpoint, "retry_attempts": 1, "timeout": 10,
+        "payload_format": payload_format, "compression": compression, "max_workers": max_workers
+    }}
+    return ApiClient(config)
+
+
+def reset_stats(server):
+    with server.stats["lock"]:
+        server.stats["requests"] = 0
+        server.stats["bytes"] = 0
+        server.stats["connections"] = set()
+
+
+def run_case(server, name, send, total_requests):
+    reset_stats(server)
+    started = time.perf_counter()
+    send()
+    elapsed = time.perf_counter() - started
+    stats = server.stats
+    print(f"{name:<34} {total_requests / elapsed:>9.1f} req/s "
+          f"{stats['bytes'] / max(1, stats['requests']):>9.0f} B/req "
+          f"{len(stats['connections']):>5} conn")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ApiClient upload modes")
+    parser.add_argument("--requests", type=int, default=500, help="Number of POST requests per case")
+    parser.add_argument("--batch", type=int, default=100, help="Records per request")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="Simulated server latency")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrency for the pooled case")
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    server = start_stub_server(args.latency_ms / 1000)
+    endpoint = f"http://127.0.0.1:{server.server_address[1]}"
+    batch = make_batch(args.batch)
+    total = args.requests
+
+    print(f"{total} requests x {args.batch} records, {args.latency_ms} ms server latency")
+
+    def legacy():
+        # แบบเดิม: requests.post ใหม่ทุกครั้ง, JSON ไม่บีบอัด
+        payload = json.dumps({"location_id": "parking-lot-north", "camera_id": "gate-exit-01",
+                              "timestamp": batch[0]["timestamp"], "data": batch})
+        for _ in range(total):
+            requests.post(endpoint, headers={"Content-Type": "application/json"}, data=payload, timeout=10)
+    run_case(server, "bare requests.post, rows", legacy, total)
+
+    cases = [
+        ("session, rows, none", "rows", "none", 1),
+        ("session, rows, gzip", "rows", "gzip", 1),
+        ("session, columnar, gzip", "columnar", "gzip", 1),
+        (f"session, columnar, gzip, {args.workers} workers", "columnar", "gzip", args.workers),
+    ]
+    try:
+        import zstandard  # noqa: F401
+        cases.append(("session, columnar, zstd", "columnar", "zstd", 1))
+        cases.append((f"session, columnar, zstd, {args.workers} workers", "columnar", "zstd", args.workers))
+    except ImportError:
+        print("zstandard not installed, skipping zstd case")
+
+    events = list(enumerate(batch, 1))
+    for name, payload_format, compression, workers in cases:
+        client = make_client(endpoint, payload_format, compression, workers)
+        run_case(server, name, lambda: client.post_batches("bench", [events] * total), total)
+        client.close()
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark CPU inference scaling with several detector workers per host
+วัด throughput รวมเมื่อเพิ่มจำนวน worker บนเครื่องเดียวกัน เทียบการตั้งค่า thread เริ่มต้นของ torch
+กับ model.cpu ที่แบ่ง thread/core ต่อ worker (cpu_tuning.apply_cpu_settings)
+
+Usage:
+    python benchmarks/bench_cpu_scaling.py --config config.yaml --workers 1 2 4 --duration 20
+"""
+
+import os
+import sys
+import copy
+import time
+import queue
+import argparse
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.config_manager import ConfigManager
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def make_worker_config(config, workers, index):
+    """การตั้งค่าของ worker ลำดับ index เมื่อแบ่ง thread/core ด้วย model.cpu"""
+    config = copy.deepcopy(config)
+    config["model"].setdefault("cpu", {}).update({
+        "workers_per_host": workers, "worker_index": index, "affinity": "auto", "intra_op_threads": 0
+    })
+    return config
+
+
+def worker(config, tuned, barrier, duration, results):
+    """โหลดโมเดล รอให้ทุก worker พร้อม แล้ว inference ต่อเนื่องจนครบเวลา"""
+    import numpy as np
+    from loguru import logger
+    from src.cpu_tuning import apply_cpu_settings, inference_context
+    from src.model_registry import ModelRegistry
+    from src.runtime_config import get_runtime_config
+
+    logger.remove()
+    # default = ไม่กำหนด thread/core และไม่ใช้ inference_mode (พฤติกรรมก่อนมี model.cpu)
+    report = apply_cpu_settings(config) if tuned else None
+    if not tuned:
+        config["model"]["cpu"] = {"inference_mode": False, "channels_last": False}
+
+    model_config = get_runtime_config(config).model
+    model = ModelRegistry(config).load(model_config)
+    context = inference_context(config, model_config.format)
+    frame = np.random.default_rng(0).integers(0, 255, (720, 1280, 3), dtype=np.uint8)
+
+    barrier.wait()
+    latencies = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        with context():
+            model.predict(frame, imgsz=model_config.imgsz, device=model_config.device, verbose=False)
+        latencies.append(time.perf_counter() - started)
+    results.put({"frames": len(latencies), "latencies": latencies, "cpu": report})
+
+
+def collect_results(processes, results, timeout):
+    """
+    รอผลจากทุก worker โดยไม่ค้างเมื่อ worker ตาย (เช่น โหลดโมเดลไม่สำเร็จ) หรือใช้เวลานานเกิน timeout
+
+    Raises:
+        RuntimeError: ถ้ามี worker จบด้วย exit code ไม่เป็น 0 ไม่ส่งผล หรือเกินเวลา
+    """
+    outputs = []
+    deadline = time.monotonic() + timeout
+    while len(outputs) < len(processes):
+        try:
+            outputs.append(results.get(timeout=1.0))
+            continue
+        except queue.Empty:
+            pass
+
+        failed = [process for process in processes if process.exitcode not in (None, 0)]
+        if failed:
+            codes = ", ".join(f"{process.name}={process.exitcode}" for process in failed)
+            raise RuntimeError(f"Benchmark worker failed (exit code {codes})")
+        if all(process.exitcode is not None for process in processes):
+            raise RuntimeError(f"{len(processes) - len(outputs)} benchmark worker(s) exited without results")
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"Benchmark workers did not finish within {timeout:.0f}s")
+    return outputs
+
+
+def run_case(config, mode, workers, duration, timeout):
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [
+        context.Process(target=worker, args=(make_worker_config(config, workers, index), mode == "tuned",
+                                             barrier, duration, results))
+        for index in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        outputs = collect_results(processes, results, duration + timeout)
+    finally:
+        # worker ที่ยังรอ barrier หรือยัง inference อยู่เมื่อเกิดข้อผิดพลาดจะถูกหยุด
+        for process in processes:
+            process.join(1.0)
+            if process.is_alive():
+                process.terminate()
+            process.join()
+
+    latencies = [latency for output in outputs for latency in output["latencies"]]
+    return {
+        "fps": sum(output["frames"] for output in outputs) / duration,
+        "p50": percentile(latencies, 0.50),
+        "p95": percentile(latencies, 0.95),
+        "threads": [output["cpu"]["intra_op_threads"] for output in outputs if output["cpu"]]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark detector throughput as workers per host grow")
+    parser.add_argument("--config", default="config.yaml", help="Configuration file (model section is used)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Worker counts to test")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds of inference per case")
+    parser.add_argument("--modes", nargs="+", default=["default", "tuned"], choices=["default", "tuned"],
+                        help="default = torch thread defaults, tuned = model.cpu partitioning")
+    parser.add_argument("--timeout", type=float, default=300.0,
+                        help="Seconds allowed for loading and warming up the model on top of --duration")
+    args = parser.parse_args()
+
+    config = ConfigManager(args.config).get_config()
+    print(f"{os.cpu_count()} CPUs, model {config['model']['model_path']} "
+          f"({config['model'].get('format', 'pytorch')}, imgsz {config['model'].get('imgsz', 640)})")
+    print(f"{'mode':<8} {'workers':>7} {'total fps':>10} {'fps/worker':>11} {'scaling':>8} "
+          f"{'p50 ms':>8} {'p95 ms':>8}  threads")
+
+    for mode in args.modes:
+        baseline = None
+        for workers in args.workers:
+            try:
+                result = run_case(config, mode, workers, args.duration, args.timeout)
+            except RuntimeError as e:
+                print(f"{mode} with {workers} worker(s): {e}", file=sys.stderr)
+                return 1
+            if baseline is None:
+                baseline = result["fps"] / workers
+            # ประสิทธิภาพเมื่อเทียบกับการเพิ่ม worker แบบเชิงเส้นจากกรณีแรก
+            scaling = result["fps"] / (baseline * workers) if baseline else 0.0
+            threads = ",".join(str(t) for t in result["threads"]) or "torch default"
+            print(f"{mode:<8} {workers:>7} {result['fps']:>10.1f} {result['fps'] / workers:>11.1f} "
+                  f"{scaling:>7.0%} {result['p50'] * 1000:>8.1f} {result['p95'] * 1000:>8.1f}  {threads}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Import-time report for src/main.py startup modes
+วัดเวลานำเข้าโมดูลตอนเริ่มโปรแกรมแต่ละโหมด ด้วย python -X importtime
+และตรวจว่าโหมดที่ไม่ใช้โมเดล/GUI ไม่ได้โหลด torch, ultralytics หรือ PySide6
+
+Usage:
+    python benchmarks/bench_startup.py [--top 10] [--repeat 3] [--json]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(ROOT, "src", "main.py")
+
+# แพ็กเกจหนักที่ต้องนำเข้าเฉพาะโหมดที่ใช้จริง
+HEAVY_PACKAGES = ("torch", "ultralytics", "PySide6", "cv2", "requests", "pyarrow")
+
+# โหมด: (ชื่อ, argument ของ main.py หรือ None = import โมดูลโดยตรง)
+MODES = [
+    ("help", ["--help"]),
+    ("summary", ["--summary"]),
+    ("export", ["--export", "export.csv", "--format", "csv"]),
+    ("pipeline imports", None),
+]
+
+PIPELINE_IMPORTS = (
+    "import src.main, src.video_processor, src.vehicle_detector, src.line_counter, "
+    "src.api_client, src.api_sender, src.async_uploader, src.state_store"
+)
+
+
+def parse_importtime(stderr):
+    """
+    แยกผลของ -X importtime
+
+    Returns:
+        dict: {ชื่อโมดูล: (self_us, cumulative_us, ระดับการย่อหน้า)} ระดับ 1 คือ import ระดับบนสุด
+    """
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3:
+            continue
+        name = fields[2].rstrip()
+        modules[name.strip()] = (int(fields[0]), int(fields[1]), len(name) - len(name.lstrip()))
+    return modules
+
+
+def run_mode(args, workdir):
+    """รันหนึ่งโหมดใน subprocess แล้วคืน (เวลาจริง, ผลของ importtime)"""
+    if args is None:
+        command = [sys.executable, "-X", "importtime", "-c", PIPELINE_IMPORTS]
+    else:
+        command = [sys.executable, "-X", "importtime", MAIN, "--config", "missing.yaml"] + args
+    env = dict(os.environ, PYTHONPATH=ROOT, PYTHONDONTWRITEBYTECODE="1")
+
+    started = time.perf_counter()
+    result = subprocess.run(command, cwd=workdir, env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - started
+    return elapsed, result.returncode, parse_importtime(result.stderr)
+
+
+def summarize(name, runs, top):
+    """รวมผลหลายรอบ (ใช้รอบที่เร็วที่สุด ลดผลของ disk cache)"""
+    elapsed, returncode, modules = min(runs, key=lambda run: run[0])
+    # import ระดับบนสุด (ไม่มีการย่อหน้า) รวมกันเท่ากับเวลานำเข้าทั้งหมด
+    roots = {module: cumulative for module, (_, cumulative, depth) in modules.items() if depth == 1}
+    loaded = {module.split(".")[0] for module in modules}
+    return {
+        "mode": name,
+        "returncode": returncode,
+        "wall_time": elapsed,
+        "import_time": sum(roots.values()) / 1e6,
+        "modules": len(modules),
+        "heavy": sorted(package for package in HEAVY_PACKAGES if package in loaded),
+        "top": sorted(roots.items(), key=lambda item: item[1], reverse=True)[:top]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report import time of each startup mode")
+    parser.add_argument("--top", type=int, default=8, help="Slowest top-level imports to list per mode")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per mode (fastest is reported)")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    reports = []
+    with tempfile.TemporaryDirectory(prefix="bench-startup-") as workdir:
+        for name, mode_args in MODES:
+            runs = [run_mode(mode_args, workdir) for _ in range(args.repeat)]
+            reports.append(summarize(name, runs, args.top))
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+        return 0
+
+    for report in reports:
+        status = "" if report["returncode"] == 0 else f" (exit {report['returncode']})"
+        heavy = ", ".join(report["heavy"]) or "none"
+        print(f"{report['mode']:<18} wall {report['wall_time'] * 1000:7.1f} ms, "
+              f"imports {report['import_time'] * 1000:7.1f} ms, {report['modules']} modules{status}")
+        print(f"{'':<18} heavy packages: {heavy}")
+        for module, cumulative in report["top"]:
+            print(f"{'':<18} {cumulative / 1000:8.1f} ms  {module}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
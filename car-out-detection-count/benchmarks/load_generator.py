@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Load generator for the API uploader
+สร้างเหตุการณ์การนับจำลองจากกล้องเสมือน N ตัว ส่งผ่าน ApiSender หรือ AsyncUploader
+แล้วรายงาน throughput, latency (p50/p99) และข้อมูลที่สูญหาย
+
+Usage:
+    python benchmarks/load_generator.py --cameras 8 --rate 5 --duration 30 --uploader async \
+        --latency-ms 50 --error-rate 0.1
+    python benchmarks/load_generator.py --endpoint http://127.0.0.1:8080 ...   # mock_api_server.py ภายนอก
+"""
+
+import os
+import sys
+import copy
+import json
+import time
+import argparse
+import tempfile
+from datetime import datetime
+
+import requests
+from loguru import logger
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.api_client import ApiClient
+from src.api_sender import ApiSender
+from src.async_uploader import AsyncUploader
+from mock_api_server import add_server_arguments, server_from_arguments
+
+
+def make_config(args, endpoint, spool_dir):
+    return {
+        "api": {
+            "enabled": True,
+            "endpoint": endpoint,
+            "retry_attempts": 1,
+            "timeout": args.timeout,
+            "send_interval": args.send_interval,
+            "batch_size": args.batch_size,
+            "backoff_base": args.backoff_base,
+            "backoff_max": args.backoff_max,
+            "max_workers": args.max_workers,
+            "payload_format": args.payload_format,
+            "compression": args.compression,
+            "heartbeat_interval": args.heartbeat_interval,
+            "probe_interval": args.probe_interval,
+            "rate_limit": args.rate_limit,
+            "spool_path": os.path.join(spool_dir, "spool.db"),
+            "spool_flush_interval": 0.1
+        },
+        "logging": {"fsync": "never"}
+    }
+
+
+def create_senders(args, config, spool_dir):
+    """สร้าง ApiClient และ sender ของกล้องเสมือนแต่ละตัว"""
+    uploader = AsyncUploader(config) if args.uploader == "async" else None
+    senders = []
+    for index in range(args.cameras):
+        client = ApiClient(config)
+        client.camera_id = f"virtual-cam-{index:03d}"
+        spool_path = os.path.join(spool_dir, f"{client.camera_id}.db")
+        if uploader is not None:
+            senders.append(uploader.add_camera(client, spool_path))
+        else:
+            camera_config = copy.deepcopy(config)
+            camera_config["api"]["spool_path"] = spool_path
+            senders.append(ApiSender(camera_config, client))
+    return uploader, senders
+
+
+def generate(senders, rate, duration):
+    """
+    สร้างเหตุการณ์ด้วยอัตราคงที่ (rate ต่อวินาทีต่อกล้อง) สลับกันระหว่างกล้อง
+
+    Returns:
+        int: จำนวนเหตุการณ์ที่สร้าง
+    """
+    interval = 1.0 / (rate * len(senders))
+    totals = [0] * len(senders)
+    generated = 0
+    started = time.monotonic()
+    next_at = started
+    while next_at - started < duration:
+        now = time.monotonic()
+        if next_at > now:
+            time.sleep(next_at - now)
+
+        camera = generated % len(senders)
+        totals[camera] += 1
+        timestamp = datetime.now()
+        senders[camera].enqueue([{
+            "timestamp": timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+            "date": timestamp.strftime("%Y-%m-%d"),
+            "time": timestamp.strftime("%H:%M:%S"),
+            "location_id": "load-test",
+            "camera_id": f"virtual-cam-{camera:03d}",
+            "count": 1,
+            "total_count": totals[camera],
+            "emitted_at": time.time()
+        }])
+        generated += 1
+        next_at += interval
+    return generated
+
+
+def fetch_stats(server, endpoint):
+    if server is not None:
+        return server.get_stats()
+    return requests.get(f"{endpoint}/_stats", timeout=10).json()
+
+
+def format_seconds(value):
+    return "n/a" if value is None else f"{value * 1000:.1f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive the API uploader with synthetic count events")
+    parser.add_argument("--cameras", type=int, default=4, help="Number of virtual cameras")
+    parser.add_argument("--rate", type=float, default=2.0, help="Events per second per camera")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds of event generation")
+    parser.add_argument("--drain-timeout", type=float, default=30.0, help="Seconds allowed to drain spools")
+    parser.add_argument("--uploader", choices=["thread", "async"], default="thread", help="Uploader to test")
+    parser.add_argument("--endpoint", help="Use an external mock server instead of an in-process one")
+    parser.add_argument("--send-interval", type=float, default=1.0, help="api.send_interval")
+    parser.add_argument("--batch-size", type=int, default=100, help="api.batch_size")
+    parser.add_argument("--max-workers", type=int, default=1, help="api.max_workers")
+    parser.add_argument("--payload-format", default="auto", help="api.payload_format")
+    parser.add_argument("--compression", default="auto", help="api.compression")
+    parser.add_argument("--backoff-base", type=float, default=0.5, help="api.backoff_base")
+    parser.add_argument("--backoff-max", type=float, default=10.0, help="api.backoff_max")
+    parser.add_argument("--heartbeat-interval", type=float, default=10.0, help="api.heartbeat_interval (async)")
+    parser.add_argument("--probe-interval", type=float, default=30.0, help="api.probe_interval (async)")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="api.rate_limit (async)")
+    parser.add_argument("--timeout", type=float, default=10.0, help="api.timeout")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="ERROR")
+
+    server = None
+    endpoint = args.endpoint
+    if endpoint is None:
+        server = server_from_arguments(args).start()
+        endpoint = server.endpoint
+
+    with tempfile.TemporaryDirectory(prefix="load-generator-") as spool_dir:
+        config = make_config(args, endpoint, spool_dir)
+        uploader, senders = create_senders(args, config, spool_dir)
+
+        started = time.time()
+        generated = generate(senders, args.rate, args.duration)
+        generation_time = time.time() - started
+
+        # ส่งข้อมูลที่ค้าง แล้วหยุด sender
+        for sender in senders:
+            sender.close(args.drain_timeout)
+        if uploader is not None:
+            uploader.close()
+        elapsed = time.time() - started
+        metrics = [sender.get_metrics() for sender in senders]
+
+    stats = fetch_stats(server, endpoint)
+    if server is not None:
+        server.stop()
+
+    delivered = stats["events"]
+    # ข้อมูลที่ยังอยู่ใน spool ไม่นับว่าสูญหาย (จะถูกส่งเมื่อเริ่มครั้งถัดไป แต่ spool ชั่วคราวนี้ถูกลบแล้ว)
+    spooled = sum(m["queue_depth"] for m in metrics)
+    lost = generated - delivered - spooled
+    report = {
+        "uploader": args.uploader,
+        "cameras": args.cameras,
+        "generated": generated,
+        "generation_rate": generated / generation_time,
+        "delivered": delivered,
+        "still_spooled": spooled,
+        "lost": lost,
+        "loss_rate": lost / generated if generated else 0.0,
+        "duplicates": stats["duplicates"],
+        "requests": stats["requests"],
+        "bytes_per_event": stats["bytes_received"] / delivered if delivered else None,
+        "throughput": delivered / elapsed,
+        "latency_p50": stats["latency_p50"],
+        "latency_p99": stats["latency_p99"],
+        "latency_max": stats["latency_max"],
+        "send_failures": sum(m["failures"] for m in metrics),
+        "dropped_at_enqueue": sum(m["dropped"] for m in metrics),
+        "heartbeats": stats["heartbeats"],
+        "elapsed": elapsed
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+
+    print(f"uploader={args.uploader} cameras={args.cameras} rate={args.rate}/s/camera duration={args.duration}s")
+    print(f"generated        {generated} events ({report['generation_rate']:.1f}/s)")
+    print(f"delivered        {delivered} events in {stats['requests']} requests "
+          f"({report['throughput']:.1f} events/s over {elapsed:.1f}s)")
+    print(f"lost             {lost} ({report['loss_rate'] * 100:.2f}%), "
+          f"{report['dropped_at_enqueue']} dropped at enqueue, {spooled} still spooled after drain")
+    print(f"duplicates       {stats['duplicates']} (deduplicated by stream_id/seq)")
+    print(f"latency          p50 {format_seconds(stats['latency_p50'])}, "
+          f"p99 {format_seconds(stats['latency_p99'])}, max {format_seconds(stats['latency_max'])}")
+    if report["bytes_per_event"] is not None:
+        print(f"bytes/event      {report['bytes_per_event']:.1f}")
+    print(f"send failures    {report['send_failures']}, heartbeats {stats['heartbeats']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Local stand-in for the counting API endpoint
+server จำลองของ API สำหรับทดสอบ ApiClient/ApiSender/AsyncUploader แบบ offline
+
+Serves POST / (events), POST /health, GET /status and GET /_stats (delivery statistics).
+
+Usage:
+    python benchmarks/mock_api_server.py --port 8080 --latency-ms 20 --error-rate 0.05
+"""
+
+import sys
+import gzip
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def percentile(values, fraction):
+    """ค่า percentile แบบ nearest-rank ของรายการที่เรียงแล้ว"""
+    if not values:
+        return None
+    index = min(len(values) - 1, max(0, int(round(fraction * len(values))) - 1))
+    return values[index]
+
+
+def decode_records(payload):
+    """แปลง payload (rows หรือ columnar) กลับเป็นรายการ dict ต่อแถว"""
+    data = payload.get("data", [])
+    if payload.get("format") != "columnar":
+        return data
+
+    rows = data.get("rows", 0)
+    records = [dict(data.get("constants", {})) for _ in range(rows)]
+    for field, values in data.get("columns", {}).items():
+        for record, value in zip(records, values):
+            record[field] = value
+    return records
+
+
+class MockApiHandler(BaseHTTPRequestHandler):
+    """Request handler of MockApiServer"""
+
+    protocol_version = "HTTP/1.1"
+    # ตอบ header และ body แยกกัน ต้องปิด Nagle ไม่เช่นนั้น connection แบบ keep-alive จะติด delayed ACK
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/status":
+            self.server.delay()
+            self._reply(200, {"status": "ok", "formats": ["rows", "columnar"],
+                              "encodings": self.server.encodings})
+        elif self.path.rstrip("/") == "/_stats":
+            self._reply(200, self.server.get_stats())
+        else:
+            self._reply(404, {"error": "not found"})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.server.delay()
+
+        if self.server.should_fail():
+            self._reply(503, {"error": "injected failure"})
+            return
+
+        if self.path.rstrip("/") == "/health":
+            self.server.record_heartbeat()
+            self._reply(200, {"status": "ok"})
+            return
+
+        encoding = self.headers.get("Content-Encoding")
+        try:
+            if encoding == "gzip":
+                body = gzip.decompress(body)
+            elif encoding == "zstd":
+                import zstandard
+                body = zstandard.ZstdDecompressor().decompress(body)
+            payload = json.loads(body)
+        except (ValueError, OSError, ImportError) as e:
+            self._reply(400, {"error": str(e)})
+            return
+
+        self.server.record_events(payload, self.headers.get("Idempotency-Key"), len(body))
+
+        # จำลองกรณีที่ server บันทึกแล้วแต่ response หาย (client จะส่งซ้ำ)
+        if self.server.should_drop_response():
+            self._reply(504, {"error": "injected lost response"})
+            return
+        self._reply(200, {"status": "ok", "ack_seq": payload.get("last_seq")})
+
+    def _reply(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockApiServer(ThreadingHTTPServer):
+    """Mock counting API with configurable latency, error rate and slowdown windows"""
+
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0,
+                 drop_response_rate=0.0, slowdown_every=0.0, slowdown_duration=0.0,
+                 slowdown_latency_ms=0.0, encodings=("gzip", "zstd"), seed=None):
+        """
+        Initialize MockApiServer
+
+        Args:
+            host (str): ที่อยู่ที่ต้องการ bind
+            port (int): หมายเลข port (0 = สุ่ม)
+            latency_ms (float): เวลาตอบสนองพื้นฐาน (มิลลิวินาที)
+            jitter_ms (float): เวลาตอบสนองที่สุ่มเพิ่ม (0 ถึง jitter_ms)
+            error_rate (float): สัดส่วนของ request ที่ตอบ 503 โดยไม่บันทึกข้อมูล
+            drop_response_rate (float): สัดส่วนของ request ที่บันทึกแล้วแต่ตอบ 504
+            slowdown_every (float): ระยะห่าง (วินาที) ระหว่างช่วงที่ server ช้า (0 = ไม่มี)
+            slowdown_duration (float): ความยาว (วินาที) ของช่วงที่ server ช้า
+            slowdown_latency_ms (float): เวลาตอบสนองเพิ่มเติมในช่วงที่ server ช้า
+            encodings (tuple): การบีบอัดที่ประกาศใน /status
+            seed (int, optional): seed ของการสุ่ม
+        """
+        super().__init__((host, port), MockApiHandler)
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.error_rate = error_rate
+        self.drop_response_rate = drop_response_rate
+        self.slowdown_every = slowdown_every
+        self.slowdown_duration = slowdown_duration
+        self.slowdown_latency = slowdown_latency_ms / 1000
+        self.encodings = list(encodings)
+        self.started = time.monotonic()
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread = None
+        self.reset_stats()
+
+    @property
+    def endpoint(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def start(self):
+        """เริ่ม server ใน background thread"""
+        self._thread = threading.Thread(target=self.serve_forever, name="mock-api", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def reset_stats(self):
+        with self._lock:
+            self.requests = 0
+            self.bytes_received = 0
+            self.heartbeats = 0
+            self.duplicates = 0
+            self.duplicate_requests = 0
+            self._seen = set()
+            self._keys = set()
+            self._latencies = []
+            self._first_received = None
+            self._last_received = None
+
+    def delay(self):
+        latency = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if self.slowdown_every and (time.monotonic() - self.started) % self.slowdown_every < self.slowdown_duration:
+            latency += self.slowdown_latency
+        if latency:
+            time.sleep(latency)
+
+    def should_fail(self):
+        with self._lock:
+            return self.error_rate > 0 and self._random.random() < self.error_rate
+
+    def should_drop_response(self):
+        with self._lock:
+            return self.drop_response_rate > 0 and self._random.random() < self.drop_response_rate
+
+    def record_heartbeat(self):
+        with self._lock:
+            self.heartbeats += 1
+
+    def record_events(self, payload, idempotency_key, size):
+        """บันทึกเหตุการณ์ที่ได้รับ ตัดข้อมูลซ้ำด้วย (stream_id, seq) และวัด latency จาก emitted_at"""
+        now = time.time()
+        records = decode_records(payload)
+        stream_id = payload.get("stream_id", payload.get("camera_id"))
+        with self._lock:
+            self.requests += 1
+            self.bytes_received += size
+            if self._first_received is None:
+                self._first_received = now
+            self._last_received = now
+            if idempotency_key is not None:
+                if idempotency_key in self._keys:
+                    self.duplicate_requests += 1
+                self._keys.add(idempotency_key)
+
+            for record in records:
+                key = (stream_id, record.get("seq"))
+                if record.get("seq") is not None and key in self._seen:
+                    self.duplicates += 1
+                    continue
+                self._seen.add(key)
+                emitted_at = record.get("emitted_at")
+                if emitted_at is not None:
+                    self._latencies.append(now - emitted_at)
+
+    def get_stats(self):
+        """
+        Returns:
+            dict: สถิติการรับข้อมูล (จำนวนเหตุการณ์ที่ไม่ซ้ำ, ข้อมูลซ้ำ, latency p50/p99)
+        """
+        with self._lock:
+            latencies = sorted(self._latencies)
+            return {
+                "requests": self.requests,
+                "bytes_received": self.bytes_received,
+                "heartbeats": self.heartbeats,
+                "events": len(self._seen),
+                "duplicates": self.duplicates,
+                "duplicate_requests": self.duplicate_requests,
+                "first_received": self._first_received,
+                "last_received": self._last_received,
+                "latency_p50": percentile(latencies, 0.50),
+                "latency_p99": percentile(latencies, 0.99),
+                "latency_max": latencies[-1] if latencies else None
+            }
+
+
+def add_server_arguments(parser):
+    """เพิ่ม argument ของ server จำลอง (ใช้ร่วมกับ load_generator.py)"""
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Base response latency")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Random extra latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument("--drop-response-rate", type=float, default=0.0,
+                        help="Fraction of stored requests answered with 504 (forces duplicate sends)")
+    parser.add_argument("--slowdown-every", type=float, default=0.0, help="Seconds between slow windows")
+    parser.add_argument("--slowdown-duration", type=float, default=0.0, help="Length of each slow window")
+    parser.add_argument("--slowdown-latency-ms", type=float, default=0.0, help="Extra latency in slow windows")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed")
+
+
+def server_from_arguments(args, host="127.0.0.1", port=0):
+    return MockApiServer(
+        host, port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+        drop_response_rate=args.drop_response_rate, slowdown_every=args.slowdown_every,
+        slowdown_duration=args.slowdown_duration, slowdown_latency_ms=args.slowdown_latency_ms,
+        seed=args.seed
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local mock of the counting API endpoint")
+    parser.add_argument("--host", default="127.0.0.1", help="Bind address")
+    parser.add_argument("--port", type=int, default=8080, help="Port")
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    server = server_from_arguments(args, args.host, args.port)
+    print(f"Mock API listening on {server.endpoint} (GET /_stats for delivery statistics)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(server.get_stats(), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,11 +7,52 @@ API Client Module
 """
 
 import os
+import gzip
 import json
 import time
+import threading
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from loguru import logger
+from requests.adapters import HTTPAdapter
+
+# รูปแบบ payload และการบีบอัดที่รองรับ ("auto" = ตกลงกับ endpoint ผ่าน /status)
+PAYLOAD_FORMATS = ("auto", "rows", "columnar")
+COMPRESSIONS = ("auto", "none", "gzip", "zstd")
+
+# ฟิลด์ที่คำนวณได้จาก timestamp จึงไม่ส่งซ้ำในรูปแบบ columnar
+_DERIVED_FIELDS = ("date", "time")
+
+
+def encode_columnar(data):
+    """
+    แปลงรายการข้อมูลแบบแถวเป็นแบบคอลัมน์ ค่าที่เหมือนกันทุกแถว (เช่น location_id, camera_id)
+    จะถูกส่งเพียงครั้งเดียวใน "constants"
+
+    Args:
+        data (list): รายการข้อมูลแบบ dict ต่อแถว
+
+    Returns:
+        dict: {"rows": จำนวนแถว, "constants": {...}, "columns": {field: [values]}}
+    """
+    fields = []
+    for record in data:
+        for field in record:
+            if field not in fields and field not in _DERIVED_FIELDS:
+                fields.append(field)
+
+    constants = {}
+    columns = {}
+    for field in fields:
+        values = [record.get(field) for record in data]
+        if all(value == values[0] for value in values):
+            constants[field] = values[0]
+        else:
+            columns[field] = values
+
+    return {"rows": len(data), "constants": constants, "columns": columns}
+
 
 class ApiClient:
     """Class for sending data to external API"""
@@ -37,11 +78,56 @@ class ApiClient:
         self.location_id = os.getenv("LOCATION_ID", "unknown")
         self.camera_id = os.getenv("CAMERA_ID", "unknown")
         
+        # รูปแบบ payload และการบีบอัด
+        self.payload_format = config["api"].get("payload_format", "auto")
+        self.compression = config["api"].get("compression", "auto")
+        self.compress_min_bytes = config["api"].get("compress_min_bytes", 1024)
+        if self.payload_format not in PAYLOAD_FORMATS:
+            raise ValueError(f"Unsupported API payload format: {self.payload_format}")
+        if self.compression not in COMPRESSIONS:
+            raise ValueError(f"Unsupported API compression: {self.compression}")
+        self._zstandard = self._import_zstandard() if self.compression == "zstd" else None
+        # ZstdCompressor ใช้พร้อมกันหลาย thread ไม่ได้ (post_batches และ AsyncUploader บีบอัดใน thread pool)
+        # จึงสร้างแยกต่อ thread
+        self._thread_local = threading.local()
+        self._negotiated = None
+        # ถ้าตกลงกับ /status ไม่สำเร็จ ใช้รูปแบบเดิมไปจนถึงเวลานี้ (monotonic) แล้วจึงลองใหม่
+        self.negotiate_retry_interval = config["api"].get("negotiate_retry_interval", 300)
+        self._renegotiate_at = None
+        
+        # session แบบ keep-alive ใช้ connection ซ้ำแทนการ handshake TCP/TLS ทุกครั้ง
+        self.max_workers = max(1, int(config["api"].get("max_workers", 1)))
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.auth_headers = {
+            "X-API-Key": self.api_key,
+            "X-API-Secret": self.api_secret
+        }
+        self.session.headers.update(self.auth_headers)
+        self._executor = None
+        
+        # สถานะของกล้องที่ส่งใน health check (อัปเดตจากลูปหลัก เช่น stale เมื่อภาพค้าง)
+        self.camera_status = {"status": "running"}
+        
         if self.api_enabled:
             logger.info(f"ApiClient initialized to send data to {self.api_endpoint}")
         else:
             logger.info("ApiClient initialized but API is disabled")
     
+    def apply_config(self, config):
+        """
+        นำการตั้งค่าที่โหลดใหม่ (hot reload) มาใช้ (endpoint และรูปแบบ payload ต้องเริ่มโปรแกรมใหม่)
+        
+        Args:
+            config (dict): Configuration dictionary
+        """
+        self.config = config
+        self.retry_attempts = config["api"]["retry_attempts"]
+        self.timeout = config["api"]["timeout"]
+        self.compress_min_bytes = config["api"].get("compress_min_bytes", 1024)
+    
     def send_data(self, data):
         """
         ส่งข้อมูลไปยัง API ภายนอก
@@ -55,40 +141,11 @@ class ApiClient:
         if not self.api_enabled or not data:
             return False
         
-        # เตรียมข้อมูลที่จะส่ง
-        payload = {
-            "location_id": self.location_id,
-            "camera_id": self.camera_id,
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "data": data
-        }
-        
         # ส่งข้อมูลไปยัง API
         for attempt in range(self.retry_attempts):
-            try:
-                logger.debug(f"Sending data to API (attempt {attempt+1}/{self.retry_attempts})")
-                
-                # ส่งข้อมูลโดยใช้ POST request
-                response = requests.post(
-                    self.api_endpoint,
-                    headers={
-                        "Content-Type": "application/json",
-                        "X-API-Key": self.api_key,
-                        "X-API-Secret": self.api_secret
-                    },
-                    data=json.dumps(payload),
-                    timeout=self.timeout
-                )
-                
-                # ตรวจสอบสถานะการตอบกลับ
-                if response.status_code == 200:
-                    logger.info(f"Data sent successfully: {len(data)} records")
-                    return True
-                else:
-                    logger.warning(f"API returned status code {response.status_code}: {response.text}")
-            
-            except requests.RequestException as e:
-                logger.error(f"Error sending data to API: {e}")
+            logger.debug(f"Sending data to API (attempt {attempt+1}/{self.retry_attempts})")
+            if self.post_data(data):
+                return True
             
             # รออีกครั้งก่อนลองใหม่ (ยกเว้นครั้งสุดท้าย)
             if attempt < self.retry_attempts - 1:
@@ -99,33 +156,298 @@ class ApiClient:
         logger.error(f"Failed to send data to API after {self.retry_attempts} attempts")
         return False
     
-    def send_health_check(self):
+    def post_data(self, data):
         """
-        ส่งข้อมูลการตรวจสอบสถานะไปยัง API
+        ส่งข้อมูลไปยัง API หนึ่งครั้งโดยไม่ลองใหม่และไม่รอ
+        (การลองใหม่และ backoff เป็นหน้าที่ของผู้เรียก เช่น ApiSender)
+        
+        Args:
+            data (list): รายการข้อมูลที่ต้องการส่ง
         
         Returns:
             bool: True ถ้าส่งสำเร็จ, False ถ้าล้มเหลว
         """
-        if not self.api_enabled:
-            return False
+        return self._post(data) is not None
+    
+    def post_events(self, stream_id, events):
+        """
+        ส่งเหตุการณ์ที่มีหมายเลขลำดับหนึ่งครั้ง พร้อม Idempotency-Key ที่ได้จากช่วงหมายเลขลำดับ
+        การส่งซ้ำของช่วงเดิมจึงใช้ key เดิมและ server สามารถตัดข้อมูลซ้ำได้
+        
+        Args:
+            stream_id (str): รหัสของลำดับเหตุการณ์ (คงที่ตลอดอายุของ spool)
+            events (list): [(seq, record), ...] เรียงตาม seq
+        
+        Returns:
+            int: หมายเลขลำดับสุดท้ายที่ server ยืนยัน หรือ None ถ้าส่งไม่สำเร็จ
+        """
+        body, headers, last_seq = self.build_event_request(stream_id, events)
+        response = self._send(body, headers, len(events))
+        if response is None:
+            return None
+        
+        try:
+            response_payload = response.json()
+        except ValueError:
+            response_payload = None
+        return self.ack_from_response(response_payload, last_seq)
+    
+    def build_event_request(self, stream_id, events):
+        """
+        สร้าง body และ headers สำหรับส่งเหตุการณ์ที่มีหมายเลขลำดับ (ใช้ร่วมกับ uploader แบบ asyncio)
+        
+        Args:
+            stream_id (str): รหัสของลำดับเหตุการณ์
+            events (list): [(seq, record), ...] เรียงตาม seq
+        
+        Returns:
+            tuple: (body, headers, last_seq)
+        """
+        first_seq = events[0][0]
+        last_seq = events[-1][0]
+        body, headers = self.build_request(
+            [dict(record, seq=seq) for seq, record in events],
+            {"stream_id": stream_id, "first_seq": first_seq, "last_seq": last_seq},
+            {"Idempotency-Key": f"{stream_id}:{first_seq}-{last_seq}"}
+        )
+        return body, headers, last_seq
+    
+    @staticmethod
+    def ack_from_response(response_payload, last_seq):
+        """
+        อ่านหมายเลขลำดับที่ server ยืนยันจาก response
+        server อาจยืนยันเพียงบางส่วนด้วย {"ack_seq": N} ถ้าไม่ระบุถือว่ารับครบทั้ง batch
+        
+        Args:
+            response_payload: JSON ของ response (หรือ None)
+            last_seq (int): หมายเลขลำดับสุดท้ายของ batch
+        
+        Returns:
+            int: หมายเลขลำดับที่ server ยืนยัน
+        """
+        try:
+            ack_seq = int(response_payload.get("ack_seq", last_seq))
+        except (ValueError, TypeError, AttributeError):
+            ack_seq = last_seq
+        return min(ack_seq, last_seq)
+    
+    def post_batches(self, stream_id, batches):
+        """
+        ส่งหลาย batch พร้อมกันตามจำนวน api.max_workers
+        
+        Args:
+            stream_id (str): รหัสของลำดับเหตุการณ์
+            batches (list): รายการของ batch (แต่ละ batch เป็น [(seq, record), ...])
+        
+        Returns:
+            list: หมายเลขลำดับที่ server ยืนยันของแต่ละ batch (None ถ้าส่งไม่สำเร็จ) ตามลำดับเดิม
+        """
+        if self.max_workers == 1 or len(batches) <= 1:
+            return [self.post_events(stream_id, batch) for batch in batches]
+        
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="api-upload")
+        return list(self._executor.map(lambda batch: self.post_events(stream_id, batch), batches))
+    
+    def negotiate(self):
+        """
+        สอบถามรูปแบบ payload และการบีบอัดที่ endpoint รองรับผ่าน /status
+        endpoint ประกาศได้ด้วย JSON {"formats": [...], "encodings": [...]}
+        ถ้าไม่ได้ประกาศจะใช้รูปแบบเดิม (rows, ไม่บีบอัด)
+        
+        Returns:
+            tuple: (payload_format, compression) หรือ None ถ้าติดต่อ endpoint ไม่ได้
+        """
+        try:
+            response = self.session.get(f"{self.api_endpoint}/status", timeout=self.timeout)
+        except requests.RequestException as e:
+            logger.warning(f"API negotiation failed: {e}")
+            return None
+        if response.status_code != 200:
+            logger.warning(f"API negotiation returned status code {response.status_code}")
+            return None
+        
+        try:
+            capabilities = response.json()
+        except ValueError:
+            capabilities = {}
+        if not isinstance(capabilities, dict):
+            capabilities = {}
+        formats = capabilities.get("formats", [])
+        encodings = capabilities.get("encodings", [])
+        
+        payload_format = self.payload_format
+        if payload_format == "auto":
+            payload_format = "columnar" if "columnar" in formats else "rows"
+        
+        compression = self.compression
+        if compression == "auto":
+            compression = "none"
+            if "zstd" in encodings:
+                self._zstandard = self._import_zstandard(required=False)
+                if self._zstandard is not None:
+                    compression = "zstd"
+            if compression == "none" and "gzip" in encodings:
+                compression = "gzip"
+        
+        self._negotiated = (payload_format, compression)
+        self._renegotiate_at = None
+        logger.info(f"API payload format: {payload_format}, compression: {compression}")
+        return self._negotiated
+    
+    def close(self):
+        """ปิด connection pool และ thread ที่ใช้ส่งข้อมูล"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self.session.close()
+    
+    def build_request(self, data, fields=None, extra_headers=None):
+        """
+        สร้าง body (บีบอัดแล้วถ้าตั้งค่าไว้) และ headers ของการส่งข้อมูล
+        
+        Args:
+            data (list): รายการข้อมูลที่ต้องการส่ง
+            fields (dict, optional): ฟิลด์เพิ่มเติมใน payload
+            extra_headers (dict, optional): headers เพิ่มเติม
+        
+        Returns:
+            tuple: (body (bytes), headers (dict))
+        """
+        payload_format, compression = self._resolve_encoding()
         
         # เตรียมข้อมูลที่จะส่ง
         payload = {
             "location_id": self.location_id,
             "camera_id": self.camera_id,
             "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "status": "running"
         }
+        if fields:
+            payload.update(fields)
+        headers = {"Content-Type": "application/json"}
+        if extra_headers:
+            headers.update(extra_headers)
+        if payload_format == "columnar":
+            payload["format"] = "columnar"
+            payload["data"] = encode_columnar(data)
+            headers["X-Payload-Format"] = "columnar"
+        else:
+            payload["data"] = data
+        
+        body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+        if compression != "none" and len(body) >= self.compress_min_bytes:
+            body = self._compress(body, compression)
+            headers["Content-Encoding"] = compression
+        return body, headers
+    
+    def build_health_payload(self):
+        """
+        Returns:
+            dict: ข้อมูลการตรวจสอบสถานะที่ส่งไปยัง {endpoint}/health
+        """
+        return {
+            "location_id": self.location_id,
+            "camera_id": self.camera_id,
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            **self.camera_status
+        }
+    
+    def set_camera_status(self, camera_status):
+        """
+        กำหนดสถานะของกล้องสำหรับ health check ครั้งถัดไป
+        
+        Args:
+            camera_status (dict): {"status": "running" | "stale", ...} จาก VideoProcessor.get_camera_status()
+        """
+        if camera_status["status"] != self.camera_status.get("status"):
+            logger.info(f"Camera health status changed to {camera_status['status']}")
+        self.camera_status = dict(camera_status)
+    
+    def _post(self, data, fields=None, extra_headers=None):
+        body, headers = self.build_request(data, fields, extra_headers)
+        return self._send(body, headers, len(data))
+    
+    def _send(self, body, headers, record_count):
+        """
+        ส่ง POST หนึ่งครั้ง
+        
+        Returns:
+            requests.Response: response ถ้าสำเร็จ (status 200) หรือ None
+        """
+        try:
+            # ส่งข้อมูลโดยใช้ POST request ผ่าน session ที่เปิด connection ค้างไว้
+            response = self.session.post(
+                self.api_endpoint,
+                headers=headers,
+                data=body,
+                timeout=self.timeout
+            )
+            
+            # ตรวจสอบสถานะการตอบกลับ
+            if response.status_code == 200:
+                logger.info(f"Data sent successfully: {record_count} records")
+                return response
+            else:
+                logger.warning(f"API returned status code {response.status_code}: {response.text}")
+        
+        except requests.RequestException as e:
+            logger.error(f"Error sending data to API: {e}")
+        
+        return None
+    
+    def _resolve_encoding(self):
+        """เลือกรูปแบบ payload และการบีบอัด (ตกลงกับ endpoint ครั้งแรกที่ส่ง ถ้าตั้งเป็น auto)"""
+        if self.payload_format != "auto" and self.compression != "auto":
+            return self.payload_format, self.compression
+        retry_due = self._renegotiate_at is not None and time.monotonic() >= self._renegotiate_at
+        if (self._negotiated is None or retry_due) and self.negotiate() is None:
+            # ติดต่อ /status ไม่ได้: เก็บรูปแบบเดิมไว้ใช้ (ไม่เรียก /status ทุกครั้งที่ส่ง)
+            # และลองตกลงใหม่หลัง negotiate_retry_interval วินาที
+            self._negotiated = (
+                "rows" if self.payload_format == "auto" else self.payload_format,
+                "none" if self.compression == "auto" else self.compression
+            )
+            self._renegotiate_at = time.monotonic() + self.negotiate_retry_interval
+        return self._negotiated
+    
+    def _compress(self, body, compression):
+        if compression == "zstd":
+            compressor = getattr(self._thread_local, "zstd_compressor", None)
+            if compressor is None:
+                compressor = self._zstandard.ZstdCompressor(level=3)
+                self._thread_local.zstd_compressor = compressor
+            return compressor.compress(body)
+        return gzip.compress(body, compresslevel=6)
+    
+    @staticmethod
+    def _import_zstandard(required=True):
+        try:
+            import zstandard
+        except ImportError:
+            if not required:
+                return None
+            logger.error("zstandard not installed. Please install it with: pip install zstandard")
+            raise ImportError("zstandard not installed")
+        return zstandard
+    
+    def send_health_check(self):
+        """
+        ส่งข้อมูลการตรวจสอบสถานะไปยัง API
+        
+        Returns:
+            bool: True ถ้าส่งสำเร็จ, False ถ้าล้มเหลว
+        """
+        if not self.api_enabled:
+            return False
+        
+        # เตรียมข้อมูลที่จะส่ง
+        payload = self.build_health_payload()
         
         try:
             # ส่งข้อมูลโดยใช้ POST request
-            response = requests.post(
+            response = self.session.post(
                 f"{self.api_endpoint}/health",
-                headers={
-                    "Content-Type": "application/json",
-                    "X-API-Key": self.api_key,
-                    "X-API-Secret": self.api_secret
-                },
+                headers={"Content-Type": "application/json"},
                 data=json.dumps(payload),
                 timeout=self.timeout
             )
@@ -155,12 +477,8 @@ class ApiClient:
         
         try:
             # ส่ง request ไปยัง API เพื่อทดสอบการเชื่อมต่อ
-            response = requests.get(
+            response = self.session.get(
                 f"{self.api_endpoint}/status",
-                headers={
-                    "X-API-Key": self.api_key,
-                    "X-API-Secret": self.api_secret
-                },
                 timeout=self.timeout
             )
             
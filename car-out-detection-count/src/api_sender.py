@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+API Sender Module
+โมดูลสำหรับส่งข้อมูลจาก spool ไปยัง API ใน background thread
+"""
+
+import time
+import random
+import threading
+from loguru import logger
+
+from src.api_spool import create_api_spool
+
+
+def acked_prefix(batches, results):
+    """
+    หาหมายเลขลำดับสุดท้ายของช่วงต้นที่ server ยืนยันต่อเนื่องกัน
+    ข้อมูลหลังจากนั้นจะถูกส่งใหม่ (ด้วย Idempotency-Key เดิมถ้าแบ่ง batch เหมือนเดิม)
+
+    Args:
+        batches (list): batch ที่ส่ง (แต่ละ batch เป็น [(seq, record), ...])
+        results (list): หมายเลขลำดับที่ server ยืนยันของแต่ละ batch (None ถ้าส่งไม่สำเร็จ)
+
+    Returns:
+        int: หมายเลขลำดับที่เลื่อน cursor ไปได้ หรือ None
+    """
+    acked_seq = None
+    for batch, batch_acked in zip(batches, results):
+        if batch_acked is None:
+            break
+        acked_seq = batch_acked
+        if batch_acked < batch[-1][0]:
+            break
+    return acked_seq
+
+
+class ApiSender:
+    """Background sender that drains the durable API spool in batches"""
+
+    def __init__(self, config, api_client):
+        """
+        Initialize ApiSender
+
+        Args:
+            config (dict): Configuration dictionary
+            api_client (ApiClient): client ที่ใช้ส่งข้อมูล
+        """
+        api_config = config["api"]
+        self.api_client = api_client
+        self.send_interval = api_config.get("send_interval", 60)
+        self.batch_size = max(1, int(api_config.get("batch_size", 100)))
+        self.backoff_base = api_config.get("backoff_base", 1.0)
+        self.backoff_max = api_config.get("backoff_max", 300.0)
+
+        self.spool = create_api_spool(config)
+
+        # สถิติการส่ง
+        self.sent = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self._spool_stats = {"queue_depth": 0, "oldest_unsent_age": 0.0}
+
+        self._drain_deadline = None
+        self._stop_event = threading.Event()
+        self._wake_event = threading.Event()
+        self._thread = threading.Thread(target=self._sender_loop, name="api-sender", daemon=True)
+        self._thread.start()
+
+        logger.info(f"ApiSender started (batch size {self.batch_size}, interval {self.send_interval}s)")
+
+    def apply_config(self, config):
+        """
+        นำการตั้งค่าที่โหลดใหม่ (hot reload) มาใช้ มีผลตั้งแต่รอบการส่งถัดไป
+
+        Args:
+            config (dict): Configuration dictionary
+        """
+        api_config = config["api"]
+        self.send_interval = api_config.get("send_interval", 60)
+        self.batch_size = max(1, int(api_config.get("batch_size", 100)))
+        self.backoff_base = api_config.get("backoff_base", 1.0)
+        self.backoff_max = api_config.get("backoff_max", 300.0)
+
+    def enqueue(self, records):
+        """
+        เพิ่มข้อมูลเข้า spool เพื่อรอส่ง (ไม่บล็อก ไม่รอเครือข่ายหรือดิสก์)
+
+        Args:
+            records (list): รายการข้อมูลที่ต้องการส่ง
+        """
+        for record in records:
+            self.spool.enqueue(record)
+
+    def get_metrics(self):
+        """
+        ดึงสถิติของการส่งข้อมูล
+
+        Returns:
+            dict: queue_depth, oldest_unsent_age (วินาที), sent, failures, dropped
+        """
+        # สถิติของ spool คำนวณใน sender thread จึงไม่มีการอ่านฐานข้อมูลใน thread ที่เรียก
+        metrics = dict(self._spool_stats)
+        metrics.update({
+            "sent": self.sent,
+            "failures": self.failures,
+            "dropped": self.spool.dropped
+        })
+        return metrics
+
+    def close(self, drain_timeout=10):
+        """
+        หยุดการส่ง โดยพยายามส่งข้อมูลที่ค้างอยู่ภายในเวลาที่กำหนด
+        ข้อมูลที่ยังส่งไม่สำเร็จจะอยู่ใน spool และถูกส่งเมื่อเริ่มโปรแกรมครั้งถัดไป
+
+        Args:
+            drain_timeout (float): เวลาสูงสุด (วินาที) ที่ใช้ส่งข้อมูลที่ค้าง
+        """
+        self.spool.flush(drain_timeout)
+        self._drain_deadline = time.monotonic() + drain_timeout
+        self._stop_event.set()
+        self._wake_event.set()
+        self._thread.join(drain_timeout)
+        self.spool.close()
+        self.api_client.close()
+
+    def _backoff_delay(self):
+        """exponential backoff แบบ full jitter เพื่อไม่ให้หลายกล้องส่งซ้ำพร้อมกัน"""
+        ceiling = min(self.backoff_max, self.backoff_base * (2 ** min(self.consecutive_failures, 16)))
+        return random.uniform(0, ceiling)
+
+    def _send_pending(self):
+        """
+        ส่งข้อมูลที่ค้างใน spool ทีละ batch จนหมดหรือส่งไม่สำเร็จ
+
+        Returns:
+            bool: True ถ้าส่งครบ, False ถ้าส่งไม่สำเร็จ
+        """
+        # ดึงข้อมูลครั้งละหลาย batch เพื่อส่งพร้อมกันตาม api.max_workers
+        window = self.batch_size * self.api_client.max_workers
+        while True:
+            pending = self.spool.peek(window)
+            if not pending:
+                return True
+
+            batches = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+            results = self.api_client.post_batches(self.spool.stream_id, batches)
+
+            acked_seq = acked_prefix(batches, results)
+            if acked_seq is not None:
+                self.spool.ack(acked_seq)
+                self.sent += sum(1 for seq, _ in pending if seq <= acked_seq)
+            if acked_seq is None or acked_seq < pending[-1][0]:
+                return False
+
+    def _sender_loop(self):
+        """Background loop ที่ส่งข้อมูลทุก send_interval และ backoff เมื่อส่งไม่สำเร็จ"""
+        while True:
+            try:
+                success = self._send_pending()
+            except Exception as e:
+                logger.error(f"Error sending spooled data: {e}")
+                success = False
+
+            if success:
+                self.consecutive_failures = 0
+                delay = self.send_interval
+            else:
+                self.failures += 1
+                self.consecutive_failures += 1
+                delay = self._backoff_delay()
+                logger.warning(f"API send failed, retrying in {delay:.1f} seconds")
+
+            try:
+                self._spool_stats = self.spool.stats()
+            except Exception as e:
+                logger.error(f"Error reading spool stats: {e}")
+
+            # ระหว่างปิดโปรแกรมจะลองส่งต่อจนหมดหรือครบเวลา drain_timeout
+            if self._stop_event.is_set():
+                remaining = self._drain_deadline - time.monotonic()
+                if success or remaining <= 0:
+                    break
+                delay = min(delay, remaining)
+            self._wake_event.wait(delay)
+            self._wake_event.clear()
+
+        self.spool.close_reader()
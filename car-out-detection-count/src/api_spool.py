@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+API Spool Module
+โมดูลคิวถาวรบนดิสก์ (SQLite) สำหรับข้อมูลที่รอส่งไปยัง API
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+
+from src.event_store import BackgroundWriter, _SQLITE_SYNCHRONOUS
+
+
+class ApiSpool(BackgroundWriter):
+    """Durable SQLite-backed queue of records waiting to be sent to the API"""
+
+    _SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS spool ("
+        " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+        " created REAL NOT NULL,"
+        " record TEXT NOT NULL)",
+        # cursor ของหมายเลขลำดับสุดท้ายที่ server ยืนยันแล้ว และรหัสของลำดับเหตุการณ์
+        "CREATE TABLE IF NOT EXISTS cursor ("
+        " id INTEGER PRIMARY KEY CHECK (id = 0),"
+        " stream_id TEXT NOT NULL,"
+        " acked_seq INTEGER NOT NULL)",
+    )
+
+    def __init__(self, path, **kwargs):
+        """
+        Initialize ApiSpool
+
+        Args:
+            path (str): Path ของไฟล์ฐานข้อมูล spool
+            **kwargs: พารามิเตอร์ของ BackgroundWriter
+        """
+        self.path = path
+        self._conn = None
+        self._local = threading.local()
+        self._ready = threading.Event()
+        self._stream_id = None
+        super().__init__(name="api-spool-writer", **kwargs)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _reader(self):
+        """connection สำหรับ thread ที่อ่าน/ลบข้อมูล (แต่ละ thread มี connection ของตัวเอง)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self._ready.wait()
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        try:
+            self._conn = self._connect()
+            self._conn.execute(f"PRAGMA synchronous={_SQLITE_SYNCHRONOUS[self.fsync_policy]}")
+            with self._conn:
+                for statement in self._SCHEMA:
+                    self._conn.execute(statement)
+                # seq ใช้ AUTOINCREMENT จึงไม่ย้อนกลับแม้ข้อมูลถูกลบ ส่วน stream_id ใหม่จะถูกสร้าง
+                # เมื่อ spool ถูกสร้างใหม่ เพื่อไม่ให้ server ตัดข้อมูลที่ seq ซ้ำกับลำดับเดิมทิ้ง
+                self._conn.execute("INSERT OR IGNORE INTO cursor (id, stream_id, acked_seq) VALUES (0, ?, 0)",
+                                   (uuid.uuid4().hex,))
+        finally:
+            self._ready.set()
+
+    def _write_batch(self, batch):
+        with self._conn:
+            self._conn.executemany("INSERT INTO spool (created, record) VALUES (?, ?)", [
+                (created, json.dumps(record, separators=(",", ":"))) for created, record in batch
+            ])
+
+    def _sync(self):
+        self._conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def _close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def enqueue(self, record):
+        """
+        เพิ่มข้อมูลเข้าคิวส่ง (ไม่บล็อก)
+
+        Args:
+            record (dict): ข้อมูลหนึ่งรายการ
+
+        Returns:
+            bool: True ถ้าเข้าคิวได้
+        """
+        return self.append((time.time(), record))
+
+    @property
+    def stream_id(self):
+        """รหัสของลำดับเหตุการณ์ใน spool นี้"""
+        if self._stream_id is None:
+            (self._stream_id,) = self._reader().execute("SELECT stream_id FROM cursor WHERE id = 0").fetchone()
+        return self._stream_id
+
+    def acked_seq(self):
+        """
+        Returns:
+            int: หมายเลขลำดับสุดท้ายที่ server ยืนยันแล้ว
+        """
+        (acked_seq,) = self._reader().execute("SELECT acked_seq FROM cursor WHERE id = 0").fetchone()
+        return acked_seq
+
+    def peek(self, limit):
+        """
+        ดึงข้อมูลที่ server ยังไม่ยืนยันตามลำดับ (ไม่ลบออกจากคิว)
+
+        Args:
+            limit (int): จำนวนรายการสูงสุด
+
+        Returns:
+            list: [(seq, record), ...]
+        """
+        rows = self._reader().execute(
+            "SELECT seq, record FROM spool WHERE seq > (SELECT acked_seq FROM cursor WHERE id = 0)"
+            " ORDER BY seq LIMIT ?", (limit,)
+        ).fetchall()
+        return [(seq, json.loads(record)) for seq, record in rows]
+
+    def ack(self, seq):
+        """
+        เลื่อน cursor ไปยังหมายเลขลำดับที่ server ยืนยัน และลบข้อมูลที่ยืนยันแล้ว (ใน transaction เดียวกัน)
+
+        Args:
+            seq (int): หมายเลขลำดับสุดท้ายที่ server ยืนยัน
+        """
+        conn = self._reader()
+        with conn:
+            conn.execute("UPDATE cursor SET acked_seq = MAX(acked_seq, ?) WHERE id = 0", (seq,))
+            conn.execute("DELETE FROM spool WHERE seq <= ?", (seq,))
+
+    def stats(self):
+        """
+        ดึงสถิติของคิว
+
+        Returns:
+            dict: {"queue_depth": int, "oldest_unsent_age": float}
+        """
+        # ลบข้อมูลเฉพาะจากต้นคิวเสมอ seq จึงต่อเนื่องและคำนวณจำนวนได้จาก primary key โดยไม่ต้อง COUNT(*)
+        conn = self._reader()
+        oldest = conn.execute("SELECT seq, created FROM spool ORDER BY seq LIMIT 1").fetchone()
+        if oldest is None:
+            return {"queue_depth": self._queue.qsize(), "oldest_unsent_age": 0.0}
+        (last_seq,) = conn.execute("SELECT MAX(seq) FROM spool").fetchone()
+        return {
+            "queue_depth": last_seq - oldest[0] + 1 + self._queue.qsize(),
+            "oldest_unsent_age": time.time() - oldest[1]
+        }
+
+    def close_reader(self):
+        """ปิด connection ของ thread ปัจจุบัน"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def create_api_spool(config, path=None):
+    """
+    สร้าง ApiSpool ตามการตั้งค่า
+
+    Args:
+        config (dict): Configuration dictionary
+        path (str, optional): Path ของ spool (ค่าเริ่มต้นคือ api.spool_path)
+
+    Returns:
+        ApiSpool: spool ที่พร้อมใช้งาน
+    """
+    api_config = config["api"]
+    return ApiSpool(
+        path or api_config.get("spool_path", "./logs/api_spool.db"),
+        buffer_size=api_config.get("spool_buffer_size", 64),
+        flush_interval=api_config.get("spool_flush_interval", 1.0),
+        fsync_policy=config["logging"].get("fsync", "interval"),
+        fsync_interval=config["logging"].get("fsync_interval", 5.0),
+        max_queue=api_config.get("spool_max_queue", 10000)
+    )
@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Async Uploader Module
+โมดูลส่งข้อมูล, heartbeat และตรวจสอบการเชื่อมต่อของหลายกล้องพร้อมกันด้วย asyncio
+"""
+
+import random
+import asyncio
+import threading
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+from loguru import logger
+
+from src.api_spool import create_api_spool
+from src.api_sender import acked_prefix
+
+
+def _load_aiohttp():
+    """โหลด aiohttp ถ้ามี ถ้าไม่มีจะส่งผ่าน ApiClient (requests) บน thread pool ขนาดคงที่แทน"""
+    try:
+        import aiohttp
+    except ImportError:
+        logger.info("aiohttp not installed, uploads run on a fixed thread pool. "
+                    "Install it with: pip install aiohttp")
+        return None
+    return aiohttp
+
+
+class TokenBucket:
+    """Token bucket that limits the request rate to one endpoint"""
+
+    def __init__(self, rate, burst):
+        """
+        Initialize TokenBucket
+
+        Args:
+            rate (float): จำนวน request ต่อวินาที (0 = ไม่จำกัด)
+            burst (int): จำนวน request สูงสุดที่ส่งติดกันได้
+        """
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = None
+
+    async def acquire(self):
+        """รอจนกว่าจะส่ง request ได้"""
+        if self.rate <= 0:
+            return
+
+        loop = asyncio.get_running_loop()
+        while True:
+            now = loop.time()
+            if self.updated is not None:
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class UploadChannel:
+    """Upload, heartbeat and probe state of one camera in the AsyncUploader"""
+
+    def __init__(self, uploader, api_client, spool):
+        self.uploader = uploader
+        self.api_client = api_client
+        self.spool = spool
+        self.stream_id = None
+        self.tasks = []
+        self.wake = None
+        self.stopping = False
+        self.drain_deadline = None
+
+        # สถิติการส่ง
+        self.sent = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.reachable = None
+        self.last_heartbeat_ok = None
+        self.spool_stats = {"queue_depth": 0, "oldest_unsent_age": 0.0}
+
+    def enqueue(self, records):
+        """
+        เพิ่มข้อมูลเข้า spool เพื่อรอส่ง (ไม่บล็อก)
+
+        Args:
+            records (list): รายการข้อมูลที่ต้องการส่ง
+        """
+        for record in records:
+            self.spool.enqueue(record)
+
+    def get_metrics(self):
+        """
+        ดึงสถิติของการส่งข้อมูลของกล้องนี้
+
+        Returns:
+            dict: queue_depth, oldest_unsent_age, sent, failures, dropped, reachable, last_heartbeat_ok
+        """
+        metrics = dict(self.spool_stats)
+        metrics.update({
+            "sent": self.sent,
+            "failures": self.failures,
+            "dropped": self.spool.dropped,
+            "reachable": self.reachable,
+            "last_heartbeat_ok": self.last_heartbeat_ok
+        })
+        return metrics
+
+    def close(self, drain_timeout=10):
+        """
+        หยุดการส่งของกล้องนี้ โดยพยายามส่งข้อมูลที่ค้างภายในเวลาที่กำหนด
+
+        Args:
+            drain_timeout (float): เวลาสูงสุด (วินาที) ที่ใช้ส่งข้อมูลที่ค้าง
+        """
+        self.uploader.remove_camera(self, drain_timeout)
+
+
+class AsyncUploader:
+    """Single asyncio service that uploads events, heartbeats and probes for many cameras"""
+
+    def __init__(self, config):
+        """
+        Initialize AsyncUploader
+
+        Args:
+            config (dict): Configuration dictionary
+        """
+        api_config = config["api"]
+        self.config = config
+        self.send_interval = api_config.get("send_interval", 60)
+        self.batch_size = max(1, int(api_config.get("batch_size", 100)))
+        self.backoff_base = api_config.get("backoff_base", 1.0)
+        self.backoff_max = api_config.get("backoff_max", 300.0)
+        self.heartbeat_interval = api_config.get("heartbeat_interval", 60)
+        self.probe_interval = api_config.get("probe_interval", 300)
+        self.rate_limit = api_config.get("rate_limit", 0)
+        self.rate_burst = api_config.get("rate_burst", 5)
+        self.max_workers = max(1, int(api_config.get("max_workers", 1)))
+
+        self.channels = []
+        self._buckets = {}
+        self._http = None
+        self._aiohttp = _load_aiohttp()
+
+        # จำนวน thread คงที่: event loop หนึ่ง thread และ pool สำหรับงานดิสก์/บีบอัด (และ HTTP ถ้าไม่มี aiohttp)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="api-async")
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, name="api-async-loop", daemon=True)
+        self._thread.start()
+        if self._aiohttp is not None:
+            self._call(self._open_http())
+
+        logger.info(f"AsyncUploader started ({'aiohttp' if self._aiohttp else 'thread pool'} transport, "
+                    f"{self.max_workers} worker(s))")
+
+    def apply_config(self, config):
+        """
+        นำการตั้งค่าที่โหลดใหม่ (hot reload) มาใช้ มีผลตั้งแต่รอบถัดไปของแต่ละงาน
+        (การเปิดหรือปิด heartbeat และ probe ต้องเริ่มโปรแกรมใหม่)
+
+        Args:
+            config (dict): Configuration dictionary
+        """
+        api_config = config["api"]
+        self.send_interval = api_config.get("send_interval", 60)
+        self.batch_size = max(1, int(api_config.get("batch_size", 100)))
+        self.backoff_base = api_config.get("backoff_base", 1.0)
+        self.backoff_max = api_config.get("backoff_max", 300.0)
+        self.heartbeat_interval = api_config.get("heartbeat_interval", 60) or self.heartbeat_interval
+        self.probe_interval = api_config.get("probe_interval", 300) or self.probe_interval
+        self.rate_limit = api_config.get("rate_limit", 0)
+        self.rate_burst = api_config.get("rate_burst", 5)
+
+        def update_buckets():
+            for bucket in self._buckets.values():
+                bucket.rate = self.rate_limit
+                bucket.burst = max(1, self.rate_burst)
+        self._loop.call_soon_threadsafe(update_buckets)
+
+    def add_camera(self, api_client, spool_path=None):
+        """
+        เพิ่มกล้องเข้าในบริการ
+
+        Args:
+            api_client (ApiClient): client ของกล้อง (endpoint, รหัสกล้อง, การบีบอัด)
+            spool_path (str, optional): Path ของ spool ของกล้องนี้ (ค่าเริ่มต้นคือ api.spool_path)
+
+        Returns:
+            UploadChannel: channel สำหรับ enqueue ข้อมูลและอ่านสถิติ
+        """
+        channel = UploadChannel(self, api_client, create_api_spool(self.config, spool_path))
+        self._call(self._start_channel(channel))
+        self.channels.append(channel)
+        return channel
+
+    def remove_camera(self, channel, drain_timeout=10):
+        """
+        หยุดการส่งของกล้อง ข้อมูลที่ยังส่งไม่สำเร็จจะอยู่ใน spool
+
+        Args:
+            channel (UploadChannel): channel ที่ได้จาก add_camera
+            drain_timeout (float): เวลาสูงสุด (วินาที) ที่ใช้ส่งข้อมูลที่ค้าง
+        """
+        if channel not in self.channels:
+            return
+        self.channels.remove(channel)
+        channel.spool.flush(drain_timeout)
+        self._call(self._stop_channel(channel, drain_timeout))
+        channel.spool.close()
+
+    def close(self, drain_timeout=10):
+        """
+        หยุดบริการทั้งหมด
+
+        Args:
+            drain_timeout (float): เวลาสูงสุด (วินาที) ที่ใช้ส่งข้อมูลที่ค้างของแต่ละกล้อง
+        """
+        for channel in list(self.channels):
+            self.remove_camera(channel, drain_timeout)
+        if self._http is not None:
+            self._call(self._http.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(drain_timeout)
+        self._executor.shutdown(wait=True)
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def _call(self, coroutine):
+        """เรียก coroutine บน event loop จาก thread อื่นและรอผล"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    async def _in_executor(self, function, *args):
+        return await self._loop.run_in_executor(self._executor, function, *args)
+
+    def _bucket(self, endpoint):
+        """token bucket ของแต่ละ endpoint (host) ใช้ร่วมกันทุกกล้องที่ส่งไปยัง host เดียวกัน"""
+        host = urlsplit(endpoint).netloc
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = self._buckets[host] = TokenBucket(self.rate_limit, self.rate_burst)
+        return bucket
+
+    async def _open_http(self):
+        connector = self._aiohttp.TCPConnector(limit_per_host=self.max_workers)
+        self._http = self._aiohttp.ClientSession(connector=connector)
+
+    async def _start_channel(self, channel):
+        channel.wake = asyncio.Event()
+        channel.stream_id = await self._in_executor(lambda: channel.spool.stream_id)
+        channel.tasks.append(asyncio.ensure_future(self._upload_loop(channel)))
+        if self.heartbeat_interval:
+            channel.tasks.append(asyncio.ensure_future(self._heartbeat_loop(channel)))
+        if self.probe_interval:
+            channel.tasks.append(asyncio.ensure_future(self._probe_loop(channel)))
+
+    async def _stop_channel(self, channel, drain_timeout):
+        channel.drain_deadline = self._loop.time() + drain_timeout
+        channel.stopping = True
+        channel.wake.set()
+        upload_task, other_tasks = channel.tasks[0], channel.tasks[1:]
+        for task in other_tasks:
+            task.cancel()
+        try:
+            await asyncio.wait_for(upload_task, drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Timed out draining API spool, remaining data stays queued")
+        await asyncio.gather(*other_tasks, return_exceptions=True)
+
+    async def _upload_loop(self, channel):
+        """ส่งข้อมูลทุก send_interval และ backoff แบบ full jitter เมื่อส่งไม่สำเร็จ"""
+        while True:
+            try:
+                success = await self._send_pending(channel)
+            except Exception as e:
+                logger.error(f"Error sending spooled data: {e}")
+                success = False
+
+            if success:
+                channel.consecutive_failures = 0
+                delay = self.send_interval
+            else:
+                channel.failures += 1
+                channel.consecutive_failures += 1
+                ceiling = min(self.backoff_max, self.backoff_base * (2 ** min(channel.consecutive_failures, 16)))
+                delay = random.uniform(0, ceiling)
+                logger.warning(f"API send failed for camera {channel.api_client.camera_id}, "
+                               f"retrying in {delay:.1f} seconds")
+
+            try:
+                channel.spool_stats = await self._in_executor(channel.spool.stats)
+            except Exception as e:
+                logger.error(f"Error reading spool stats: {e}")
+
+            # ระหว่างปิดจะลองส่งต่อจนหมดหรือครบเวลา drain_timeout
+            if channel.stopping:
+                remaining = channel.drain_deadline - self._loop.time()
+                if success or remaining <= 0:
+                    break
+                delay = min(delay, remaining)
+            channel.wake.clear()
+            try:
+                await asyncio.wait_for(channel.wake.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _send_pending(self, channel):
+        """ส่งข้อมูลที่ค้างใน spool จนหมดหรือส่งไม่สำเร็จ (หลาย batch พร้อมกันตาม api.max_workers)"""
+        window = self.batch_size * self.max_workers
+        while True:
+            pending = await self._in_executor(channel.spool.peek, window)
+            if not pending:
+                return True
+
+            batches = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+            results = await asyncio.gather(*[self._post_events(channel, batch) for batch in batches])
+
+            acked_seq = acked_prefix(batches, results)
+            if acked_seq is not None:
+                await self._in_executor(channel.spool.ack, acked_seq)
+                channel.sent += sum(1 for seq, _ in pending if seq <= acked_seq)
+            if acked_seq is None or acked_seq < pending[-1][0]:
+                return False
+
+    async def _post_events(self, channel, batch):
+        client = channel.api_client
+        await self._bucket(client.api_endpoint).acquire()
+        if self._http is None:
+            return await self._in_executor(client.post_events, channel.stream_id, batch)
+
+        # สร้าง body (json + บีบอัด) ใน thread pool เพื่อไม่ให้บล็อก event loop
+        body, headers, last_seq = await self._in_executor(client.build_event_request, channel.stream_id, batch)
+        headers.update(client.auth_headers)
+        try:
+            async with self._http.post(client.api_endpoint, data=body, headers=headers,
+                                       timeout=self._aiohttp.ClientTimeout(total=client.timeout)) as response:
+                if response.status != 200:
+                    logger.warning(f"API returned status code {response.status}: {await response.text()}")
+                    return None
+                try:
+                    response_payload = await response.json(content_type=None)
+                except ValueError:
+                    response_payload = None
+        except (self._aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"Error sending data to API: {e}")
+            return None
+
+        logger.info(f"Data sent successfully: {len(batch)} records")
+        return client.ack_from_response(response_payload, last_seq)
+
+    async def _heartbeat_loop(self, channel):
+        """ส่ง health check ของกล้องทุก heartbeat_interval"""
+        while True:
+            await self._bucket(channel.api_client.api_endpoint).acquire()
+            channel.last_heartbeat_ok = await self._heartbeat(channel.api_client)
+            await asyncio.sleep(self.heartbeat_interval)
+
+    async def _heartbeat(self, client):
+        if self._http is None:
+            return await self._in_executor(client.send_health_check)
+        try:
+            async with self._http.post(f"{client.api_endpoint}/health", json=client.build_health_payload(),
+                                       headers=client.auth_headers,
+                                       timeout=self._aiohttp.ClientTimeout(total=client.timeout)) as response:
+                if response.status == 200:
+                    logger.debug("Health check sent successfully")
+                    return True
+                logger.warning(f"Health check API returned status code {response.status}")
+        except (self._aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"Error sending health check to API: {e}")
+        return False
+
+    async def _probe_loop(self, channel):
+        """ตรวจสอบการเชื่อมต่อทุก probe_interval เมื่อ endpoint กลับมาใช้งานได้จะส่งข้อมูลที่ค้างทันที"""
+        while True:
+            await self._bucket(channel.api_client.api_endpoint).acquire()
+            reachable = await self._probe(channel.api_client)
+            if reachable and channel.reachable is False and channel.consecutive_failures:
+                channel.consecutive_failures = 0
+                channel.wake.set()
+            channel.reachable = reachable
+            await asyncio.sleep(self.probe_interval)
+
+    async def _probe(self, client):
+        if self._http is None:
+            return await self._in_executor(client.test_connection)
+        try:
+            async with self._http.get(f"{client.api_endpoint}/status", headers=client.auth_headers,
+                                      timeout=self._aiohttp.ClientTimeout(total=client.timeout)) as response:
+                return response.status == 200
+        except (self._aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"API connection test failed: {e}")
+            return False
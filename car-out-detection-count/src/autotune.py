@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Autotune Module
+โมดูลเลือกการตั้งค่าที่เหมาะกับเครื่อง (ขนาดภาพ, จำนวน thread, format ของโมเดล, frame stride)
+โดยรัน VehicleDetector กับคลิปจากกล้องจริง แล้วเทียบยอดนับกับการตั้งค่าที่แม่นยำที่สุด
+"""
+
+import os
+import copy
+from loguru import logger
+
+from src.cpu_tuning import apply_cpu_settings
+from src.model_registry import ModelRegistry
+from src.quantization import compare_runs, run_clip
+from src.runtime_config import get_runtime_config
+
+
+def _clip(config):
+    """คลิปที่ใช้ (autotune.clip หรือ video_source.test_video)"""
+    clip = config.get("autotune", {}).get("clip") or config["video_source"]["test_video"]
+    if not os.path.exists(clip):
+        raise FileNotFoundError(f"Autotune clip not found: {clip}")
+    return clip
+
+
+def _set_torch_threads(threads):
+    try:
+        import torch
+    except ImportError:
+        return False
+    torch.set_num_threads(threads)
+    return True
+
+
+def candidate_grid(settings, cores):
+    """
+    ค่าที่จะทดลอง และการตั้งค่าอ้างอิง (แม่นยำที่สุด: pytorch, ภาพใหญ่สุด, ทุกเฟรม)
+
+    Args:
+        settings (dict): ส่วน autotune ของการตั้งค่า
+        cores (int): จำนวน core ที่ใช้ได้
+
+    Returns:
+        tuple: (formats, imgsz, threads, strides, reference)
+    """
+    formats = settings.get("formats", ["pytorch"])
+    imgsz = sorted(settings.get("imgsz", [320, 416, 512, 640]))
+    threads = sorted(settings.get("threads") or {max(1, cores // 2), cores})
+    strides = sorted(settings.get("strides", [1, 2, 3]))
+    reference = {"format": "pytorch", "imgsz": imgsz[-1], "threads": threads[-1], "stride": 1}
+    return formats, imgsz, threads, strides, reference
+
+
+def _load_detector(config, model_format, imgsz):
+    """โหลดโมเดลตาม format/imgsz (export ผ่าน registry ถ้ายังไม่มี) คืน None ถ้าใช้ไม่ได้"""
+    from src.vehicle_detector import VehicleDetector
+
+    candidate_config = copy.deepcopy(config)
+    candidate_config["model"]["format"] = model_format
+    candidate_config["model"]["imgsz"] = imgsz
+    model_config = get_runtime_config(candidate_config).model
+    try:
+        model = ModelRegistry(candidate_config).load(model_config)
+    except Exception as e:
+        logger.warning(f"Skipping {model_format} at imgsz {imgsz}: {e}")
+        return None
+    return VehicleDetector(candidate_config, model=model)
+
+
+def autotune(config):
+    """
+    ทดลองทุกชุดของ format x imgsz x threads x stride บนคลิปเดียวกัน
+
+    Args:
+        config (dict): Configuration dictionary
+
+    Returns:
+        dict: {"reference", "results", "best"} โดย best คือชุดที่เร็วที่สุดที่ผ่าน
+            autotune.target_fps และ autotune.min_accuracy (None ถ้าไม่มีชุดใดผ่าน)
+    """
+    settings = config.get("autotune", {})
+    clip = _clip(config)
+    frames = settings.get("frames", 300)
+    target_fps = settings.get("target_fps", 10.0)
+    min_accuracy = settings.get("min_accuracy", 0.98)
+
+    # ผูก core ตาม model.cpu ก่อน แล้วทดลองจำนวน thread ภายใน core ที่ได้รับ
+    cores = len(apply_cpu_settings(config)["cores"])
+    formats, imgsz_values, thread_values, strides, reference_setting = candidate_grid(settings, cores)
+    logger.info(f"Autotuning on {clip} ({frames} frames): formats {formats}, imgsz {imgsz_values}, "
+                f"threads {thread_values}, strides {strides}")
+
+    detector = _load_detector(config, reference_setting["format"], reference_setting["imgsz"])
+    if detector is None:
+        raise RuntimeError("Reference model could not be loaded")
+    _set_torch_threads(reference_setting["threads"])
+    reference = run_clip(detector, clip, frames, detector.config)
+    logger.info(f"Reference {reference_setting}: {reference['fps']:.1f} FPS, count {reference['count']}")
+
+    results = []
+    for model_format in formats:
+        for imgsz in imgsz_values:
+            detector = _load_detector(config, model_format, imgsz)
+            if detector is None:
+                continue
+            for threads in thread_values:
+                _set_torch_threads(threads)
+                for stride in strides:
+                    run = run_clip(detector, clip, frames, detector.config, stride)
+                    comparison = compare_runs(reference, run)
+                    result = {
+                        "format": model_format,
+                        "imgsz": imgsz,
+                        "threads": threads,
+                        "stride": stride,
+                        "fps": run["fps"],
+                        "count": run["count"],
+                        "count_accuracy": max(0.0, 1.0 - comparison["count_delta"]),
+                        "agreement": comparison["agreement"]
+                    }
+                    result["passed"] = result["fps"] >= target_fps and result["count_accuracy"] >= min_accuracy
+                    results.append(result)
+                    logger.info(f"{model_format} imgsz={imgsz} threads={threads} stride={stride}: "
+                                f"{run['fps']:.1f} FPS, count {run['count']}/{reference['count']}"
+                                f"{'' if result['passed'] else ' (fails target)'}")
+
+    passed = [result for result in results if result["passed"]]
+    best = max(passed, key=lambda result: result["fps"]) if passed else None
+    return {
+        "clip": clip,
+        "target_fps": target_fps,
+        "min_accuracy": min_accuracy,
+        "reference": dict(reference_setting, fps=reference["fps"], count=reference["count"]),
+        "results": results,
+        "best": best
+    }
+
+
+def apply_best(config_manager, best):
+    """
+    บันทึกชุดที่เลือกลงไฟล์การตั้งค่าของกล้อง (แก้เฉพาะ key ที่ปรับ ส่วนอื่นของไฟล์คงเดิม)
+
+    Args:
+        config_manager (ConfigManager): ตัวจัดการไฟล์การตั้งค่า
+        best (dict): ผลของชุดที่เลือกจาก autotune()
+
+    Returns:
+        bool: True ถ้าบันทึกสำเร็จ
+    """
+    return config_manager.patch_config({
+        "model": {
+            "format": best["format"],
+            "imgsz": best["imgsz"],
+            "cpu": {"intra_op_threads": best["threads"]}
+        },
+        "detection": {"frame_stride": best["stride"]}
+    })
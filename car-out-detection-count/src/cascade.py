@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Cascade Module
+โมดูลตรวจจับสองขั้น: โมเดลเล็ก (proposal) รันทุกเฟรม แล้วใช้โมเดลหลักยืนยันเฉพาะภาพตัด (crop)
+รอบวัตถุที่ confidence ต่ำหรือเพิ่งปรากฏใกล้เส้นนับ พร้อมสถิติของแต่ละขั้น
+"""
+
+from collections import deque
+import numpy as np
+from loguru import logger
+
+from src.runtime_config import build_model_config
+from src.model_registry import ModelRegistry
+from src.tiling import non_max_suppression
+
+
+def iou_matrix(a, b):
+    """
+    IoU ระหว่างกล่องทุกคู่
+
+    Args:
+        a (numpy.ndarray): กล่อง N x 4 [x1, y1, x2, y2]
+        b (numpy.ndarray): กล่อง M x 4
+
+    Returns:
+        numpy.ndarray: N x M
+    """
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return intersection / np.maximum(area_a[:, None] + area_b[None, :] - intersection, 1e-9)
+
+
+def _boxes_array(detections):
+    return np.array([det[:4] for det in detections], dtype=np.float64).reshape(-1, 4)
+
+
+def proposal_model_config(config):
+    """
+    ModelConfig ของโมเดล proposal (ค่าใน model.cascade.proposal แทนค่าในส่วน model)
+
+    Args:
+        config (dict): Configuration dictionary
+
+    Returns:
+        ModelConfig: การตั้งค่าของโมเดล proposal
+    """
+    model_section = dict(config["model"])
+    model_section.pop("cascade", None)
+    model_section.update(config["model"].get("cascade", {}).get("proposal", {}))
+    return build_model_config(model_section)
+
+
+class CascadeStats:
+    """Per-stage counters and latencies of the detection cascade"""
+
+    def __init__(self, window=1000):
+        self.frames = 0
+        self.confirm_frames = 0
+        self.proposals = 0
+        self.accepted = 0
+        self.dropped = 0
+        self.confirm_requests = 0
+        self.confirmed = 0
+        self.proposal_latencies = deque(maxlen=window)
+        self.confirm_latencies = deque(maxlen=window)
+
+    @staticmethod
+    def _percentile(values, fraction):
+        if not values:
+            return None
+        values = sorted(values)
+        return values[min(len(values) - 1, int(len(values) * fraction))] * 1000
+
+    def as_dict(self):
+        """
+        Returns:
+            dict: อัตราการผ่านของแต่ละขั้นและ latency (ms) ของช่วงล่าสุด
+        """
+        return {
+            "frames": self.frames,
+            "proposals": self.proposals,
+            "accepted_by_proposal": self.accepted,
+            "dropped_by_proposal": self.dropped,
+            "confirm_requests": self.confirm_requests,
+            "confirmed": self.confirmed,
+            # สัดส่วนเฟรมที่ต้องรันโมเดลหลัก และสัดส่วน crop ที่โมเดลหลักยืนยันว่าเป็นรถ
+            "confirm_frame_rate": self.confirm_frames / self.frames if self.frames else 0.0,
+            "confirm_hit_rate": self.confirmed / self.confirm_requests if self.confirm_requests else None,
+            "proposal_p50_ms": self._percentile(self.proposal_latencies, 0.50),
+            "proposal_p95_ms": self._percentile(self.proposal_latencies, 0.95),
+            "confirm_p50_ms": self._percentile(self.confirm_latencies, 0.50),
+            "confirm_p95_ms": self._percentile(self.confirm_latencies, 0.95)
+        }
+
+
+class DetectionCascade:
+    """Decides which proposals from the small model need the main model to confirm them"""
+
+    def __init__(self, config, runtime):
+        """
+        โหลดโมเดล proposal (จาก registry เช่นเดียวกับโมเดลหลัก)
+
+        Args:
+            config (dict): Configuration dictionary
+            runtime (RuntimeConfig): การตั้งค่าแบบ frozen (เส้นนับ)
+        """
+        settings = config["model"].get("cascade", {})
+        self.line_enabled = runtime.line.enabled
+        self.confirm_below = settings.get("confirm_below", 0.6)
+        self.line_margin = settings.get("line_margin", 150)
+        self.new_object_iou = settings.get("new_object_iou", 0.3)
+        self.match_iou = settings.get("match_iou", 0.3)
+        self.crop_padding = settings.get("crop_padding", 0.25)
+        self.confirm_imgsz = settings.get("confirm_imgsz", 320)
+        self.report_interval = settings.get("report_interval", 1000)
+
+        self.model_config = proposal_model_config(config)
+        logger.info(f"Loading cascade proposal model from {self.model_config.model_path} "
+                    f"(imgsz={self.model_config.imgsz})...")
+        self.model = ModelRegistry(config).load(self.model_config)
+        self.stats = CascadeStats()
+        self._previous = np.zeros((0, 4))
+
+    def _near_line(self, boxes, pixels):
+        if not self.line_enabled:
+            return np.ones(len(boxes), dtype=bool)
+        centers = (boxes[:, :2] + boxes[:, 2:]) / 2
+        return np.abs(pixels.distances(centers)) <= self.line_margin
+
+    def plan(self, proposals, conf_threshold, pixels):
+        """
+        แบ่ง proposal เป็นกลุ่มที่รับได้ทันที และกลุ่มที่ต้องให้โมเดลหลักยืนยัน
+
+        Args:
+            proposals (list): detections จากโมเดล proposal
+            conf_threshold (float): model.confidence_threshold ของโมเดลหลัก
+            pixels (PixelGeometry): เส้นนับที่ขนาดของเฟรมนี้
+
+        Returns:
+            tuple: (accepted, to_confirm)
+        """
+        if not proposals:
+            return [], []
+        boxes = _boxes_array(proposals)
+        confidences = np.array([det[4] for det in proposals])
+        if len(self._previous):
+            is_new = iou_matrix(boxes, self._previous).max(axis=1) < self.new_object_iou
+        else:
+            is_new = np.ones(len(proposals), dtype=bool)
+
+        # ใกล้เส้นนับและ (confidence ต่ำหรือเพิ่งปรากฏ) -> ยืนยันด้วยโมเดลหลัก
+        confirm = self._near_line(boxes, pixels) & ((confidences < self.confirm_below) | is_new)
+        accepted, to_confirm = [], []
+        for det, needs_confirm, confidence in zip(proposals, confirm.tolist(), confidences.tolist()):
+            if needs_confirm:
+                to_confirm.append(det)
+            elif confidence >= conf_threshold:
+                accepted.append(det)
+        return accepted, to_confirm
+
+    def crop_regions(self, proposals, width, height):
+        """
+        Returns:
+            list: พื้นที่ (x1, y1, x2, y2) รอบ proposal แต่ละตัว ขยายด้วย crop_padding
+        """
+        regions = []
+        for x1, y1, x2, y2, _, _ in proposals:
+            pad_x = int((x2 - x1) * self.crop_padding) + 16
+            pad_y = int((y2 - y1) * self.crop_padding) + 16
+            regions.append((max(0, x1 - pad_x), max(0, y1 - pad_y), min(width, x2 + pad_x), min(height, y2 + pad_y)))
+        return regions
+
+    def resolve(self, accepted, proposals, regions, region_detections):
+        """
+        รวม detection ที่รับทันทีกับผลการยืนยันของโมเดลหลัก
+
+        Args:
+            accepted (list): proposal ที่รับได้ทันที
+            proposals (list): proposal ที่ส่งไปยืนยัน
+            regions (list): พื้นที่ crop ของ proposal แต่ละตัว
+            region_detections (list): detections ของโมเดลหลักในแต่ละ crop (พิกัดของ crop)
+
+        Returns:
+            list: detections สุดท้ายของเฟรม
+        """
+        confirmed = []
+        for proposal, (rx, ry, _, _), detections in zip(proposals, regions, region_detections):
+            shifted = [[x1 + rx, y1 + ry, x2 + rx, y2 + ry, conf, cls] for x1, y1, x2, y2, conf, cls in detections]
+            if not shifted:
+                continue
+            # เก็บเฉพาะกล่องที่ตรงกับ proposal (ไม่ใช่รถคันอื่นที่ติดขอบ crop)
+            overlaps = iou_matrix(_boxes_array(shifted), _boxes_array([proposal]))[:, 0]
+            matched = [det for det, iou in zip(shifted, overlaps.tolist()) if iou >= self.match_iou]
+            if matched:
+                self.stats.confirmed += 1
+                confirmed.extend(matched)
+
+        detections = non_max_suppression(accepted + confirmed, 0.5, 0.8) if confirmed else accepted
+        self._previous = _boxes_array(detections)
+        return detections
+
+    def record(self, proposals, accepted, to_confirm, proposal_latency, confirm_latency):
+        """บันทึกสถิติของเฟรม และแสดงสรุปทุก report_interval เฟรม"""
+        stats = self.stats
+        stats.frames += 1
+        stats.proposals += len(proposals)
+        stats.accepted += len(accepted)
+        stats.dropped += len(proposals) - len(accepted) - len(to_confirm)
+        stats.confirm_requests += len(to_confirm)
+        stats.proposal_latencies.append(proposal_latency)
+        if to_confirm:
+            stats.confirm_frames += 1
+            stats.confirm_latencies.append(confirm_latency)
+
+        if self.report_interval and stats.frames % self.report_interval == 0:
+            report = stats.as_dict()
+            hit_rate = report["confirm_hit_rate"]
+            logger.info(f"Cascade after {stats.frames} frames: proposal p95 {report['proposal_p95_ms']:.1f} ms, "
+                        f"confirm stage on {report['confirm_frame_rate']:.1%} of frames "
+                        f"(p95 {report['confirm_p95_ms'] or 0:.1f} ms), "
+                        f"{stats.confirm_requests} crops, hit rate "
+                        f"{'n/a' if hit_rate is None else format(hit_rate, '.1%')}")
+
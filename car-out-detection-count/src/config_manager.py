@@ -8,9 +8,154 @@ Config Manager Module
 
 import os
 import re
+import copy
+import time
 import yaml
 import json
+import shutil
 from dotenv import load_dotenv
+from loguru import logger
+
+from src.runtime_config import ConfigError, build_runtime_config, get_runtime_config
+
+# การตั้งค่าที่ต้องเริ่มโปรแกรมใหม่จึงจะมีผล (ไม่ถูกนำไปใช้ตอน hot reload)
+RESTART_REQUIRED = (
+    "general.test_mode", "general.save_output_video", "general.output_path",
+    "video_source", "logging", "rollups", "checkpoint", "gui", "config_reload", "control",
+    "model.cpu", "model.cascade",
+    "api.enabled", "api.endpoint", "api.spool_path", "api.uploader", "api.max_workers",
+    "api.payload_format", "api.compression"
+)
+
+_MISSING = object()
+
+
+def requires_restart(path):
+    """
+    Args:
+        path (str): ชื่อการตั้งค่าแบบจุด เช่น "model.device"
+
+    Returns:
+        bool: True ถ้าการตั้งค่านี้ต้องเริ่มโปรแกรมใหม่จึงจะมีผล
+    """
+    return any(path == prefix or path.startswith(prefix + ".") for prefix in RESTART_REQUIRED)
+
+
+def diff_config(old, new, prefix=""):
+    """
+    เปรียบเทียบการตั้งค่าสองชุด
+
+    Args:
+        old (dict): การตั้งค่าเดิม
+        new (dict): การตั้งค่าใหม่
+        prefix (str): ชื่อของ section ที่กำลังเปรียบเทียบ
+
+    Returns:
+        dict: {"section.key": (ค่าเดิม, ค่าใหม่)} เฉพาะค่าที่เปลี่ยน
+    """
+    changes = {}
+    for key in list(old) + [key for key in new if key not in old]:
+        path = f"{prefix}{key}"
+        old_value = old.get(key, _MISSING)
+        new_value = new.get(key, _MISSING)
+        if isinstance(old_value, dict) and isinstance(new_value, dict):
+            changes.update(diff_config(old_value, new_value, path + "."))
+        elif old_value != new_value:
+            changes[path] = (None if old_value is _MISSING else old_value,
+                             None if new_value is _MISSING else new_value)
+    return changes
+
+
+def _get_path(config, path):
+    for key in path.split("."):
+        if not isinstance(config, dict) or key not in config:
+            return _MISSING
+        config = config[key]
+    return config
+
+
+def _set_path(config, path, value):
+    keys = path.split(".")
+    for key in keys[:-1]:
+        config = config.setdefault(key, {})
+    if value is _MISSING:
+        config.pop(keys[-1], None)
+    else:
+        config[keys[-1]] = copy.deepcopy(value)
+
+
+def _is_point(value):
+    return (isinstance(value, (list, tuple)) and len(value) == 2
+            and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in value))
+
+
+def validate_config(config):
+    """
+    ตรวจสอบความถูกต้องของการตั้งค่าที่ใช้ขณะทำงาน
+
+    Args:
+        config (dict): การตั้งค่าที่ต้องการตรวจสอบ
+
+    Returns:
+        list: รายการข้อผิดพลาด (ว่างถ้าถูกต้อง)
+    """
+    if not isinstance(config, dict):
+        return ["configuration must be a mapping"]
+
+    errors = []
+    for section in ("general", "model", "detection", "api"):
+        if not isinstance(config.get(section), dict):
+            errors.append(f"missing section '{section}'")
+    if errors:
+        return errors
+
+    line_config = config["detection"].get("line_crossing", {})
+    line_position = line_config.get("line_position")
+    if not (isinstance(line_position, (list, tuple)) and len(line_position) == 2
+            and all(_is_point(point) for point in line_position)):
+        errors.append("detection.line_crossing.line_position must be two [x, y] points")
+    elif list(line_position[0]) == list(line_position[1]):
+        errors.append("detection.line_crossing.line_position points must differ")
+    line_percent = line_config.get("line_position_percent")
+    if line_percent is not None and not (
+            isinstance(line_percent, (list, tuple)) and len(line_percent) == 2
+            and all(_is_point(point) and all(0 <= v <= 1 for v in point) for point in line_percent)):
+        errors.append("detection.line_crossing.line_position_percent must be two [x, y] points in 0-1")
+    if line_config.get("direction") not in ("up", "down", "both"):
+        errors.append("detection.line_crossing.direction must be 'up', 'down' or 'both'")
+
+    roi_config = config["detection"].get("region_of_interest", {})
+    if roi_config.get("enabled"):
+        points = roi_config.get("points")
+        if not (isinstance(points, (list, tuple)) and len(points) >= 3 and all(_is_point(p) for p in points)):
+            errors.append("detection.region_of_interest.points must be at least three [x, y] points")
+        points_percent = roi_config.get("points_percent")
+        if points_percent is not None and not (
+                isinstance(points_percent, (list, tuple)) and len(points_percent) >= 3
+                and all(_is_point(point) and all(0 <= v <= 1 for v in point) for point in points_percent)):
+            errors.append("detection.region_of_interest.points_percent must be at least three [x, y] points in 0-1")
+    reference_size = config["detection"].get("reference_size", [1280, 720])
+    if not (_is_point(reference_size) and all(v > 0 for v in reference_size)):
+        errors.append("detection.reference_size must be [width, height] in pixels")
+
+    confidence = config["model"].get("confidence_threshold")
+    if not isinstance(confidence, (int, float)) or not 0 <= confidence <= 1:
+        errors.append("model.confidence_threshold must be a number between 0 and 1")
+    classes = config["model"].get("classes")
+    if classes is not None and not (isinstance(classes, list)
+                                    and all(isinstance(c, int) and not isinstance(c, bool) for c in classes)):
+        errors.append("model.classes must be a list of class ids")
+
+    for key in ("send_interval", "timeout"):
+        value = config["api"].get(key)
+        if not isinstance(value, (int, float)) or value <= 0:
+            errors.append(f"api.{key} must be a positive number")
+    retry_attempts = config["api"].get("retry_attempts")
+    if not isinstance(retry_attempts, int) or retry_attempts < 1:
+        errors.append("api.retry_attempts must be a positive integer")
+
+    return errors
+
 
 class ConfigManager:
     """Class for managing configuration from YAML file and .env file"""
@@ -25,29 +170,132 @@ class ConfigManager:
         self.config_path = config_path
         self.config = {}
         
+        # สถานะของการ hot reload (ตรวจ mtime ของไฟล์เป็นระยะ)
+        self._file_signature = None
+        self._last_check = time.monotonic()
+        
         # Load environment variables from .env file
         load_dotenv()
         
         # Load configuration
         self.load_config()
+        
+        reload_config = self.config.get("config_reload", {})
+        self.reload_enabled = reload_config.get("enabled", True)
+        self.reload_interval = reload_config.get("interval", 2.0)
     
     def load_config(self):
-        """Load configuration from YAML file"""
+        """
+        Load configuration from YAML file
+        
+        ใช้การตั้งค่าเริ่มต้นเฉพาะเมื่อไม่พบไฟล์ ถ้าไฟล์มีรูปแบบผิดจะหยุดทันที
+        
+        Raises:
+            ConfigError: ถ้าไฟล์การตั้งค่าอ่านไม่ได้หรือไม่ถูกต้อง
+        """
         try:
-            with open(self.config_path, 'r', encoding='utf-8') as file:
-                self.config = yaml.safe_load(file)
-            
-            # Replace environment variables in config
-            self.replace_env_vars(self.config)
-        except Exception as e:
+            self._file_signature = self._get_file_signature()
+            config = self._read_config_file()
+        except FileNotFoundError as e:
             print(f"Error loading configuration: {e}")
             # Use default configuration
-            self.config = self._get_default_config()
+            config = self._get_default_config()
+        except (OSError, yaml.YAMLError) as e:
+            raise ConfigError(f"Cannot read {self.config_path}: {e}") from e
+        
+        errors = validate_config(config)
+        if errors:
+            raise ConfigError(f"Invalid configuration in {self.config_path}: {'; '.join(errors)}")
+        
+        # สร้าง RuntimeConfig ตั้งแต่ตอนโหลดเพื่อให้ข้อผิดพลาดแสดงตั้งแต่เริ่มโปรแกรม
+        build_runtime_config(config)
+        self.config = config
     
     def get_config(self):
         """Get the current configuration"""
         return self.config
     
+    def get_runtime_config(self):
+        """
+        Get the current configuration as a frozen RuntimeConfig
+        
+        Returns:
+            RuntimeConfig: การตั้งค่าที่ตรวจสอบแล้วและคำนวณค่าที่ใช้ทุกเฟรมไว้ล่วงหน้า
+        """
+        return get_runtime_config(self.config)
+    
+    def check_for_changes(self):
+        """
+        ตรวจสอบว่าไฟล์การตั้งค่าถูกแก้ไขหรือไม่ (ตรวจ mtime ทุก config_reload.interval วินาที)
+        ถ้าถูกแก้ไขจะโหลดและตรวจสอบความถูกต้อง แล้วแทนที่การตั้งค่าปัจจุบันทั้งชุด
+        การตั้งค่าที่ต้องเริ่มโปรแกรมใหม่ (RESTART_REQUIRED) จะคงค่าเดิมไว้
+        
+        เรียกได้ทุกเฟรม เพราะจะอ่านไฟล์เฉพาะเมื่อ mtime หรือขนาดเปลี่ยน
+        
+        Returns:
+            dict: {"section.key": (ค่าเดิม, ค่าใหม่)} ของค่าที่นำไปใช้ หรือ None ถ้าไม่มีการเปลี่ยนแปลง
+        """
+        if not self.reload_enabled:
+            return None
+        
+        now = time.monotonic()
+        if now - self._last_check < self.reload_interval:
+            return None
+        self._last_check = now
+        
+        signature = self._get_file_signature()
+        if signature is None or signature == self._file_signature:
+            return None
+        self._file_signature = signature
+        
+        try:
+            new_config = self._read_config_file()
+        except Exception as e:
+            logger.error(f"Config reload failed, keeping current configuration: {e}")
+            return None
+        
+        errors = validate_config(new_config)
+        if errors:
+            logger.error(f"Config reload rejected, keeping current configuration: {'; '.join(errors)}")
+            return None
+        
+        changes = diff_config(self.config, new_config)
+        restart_required = [path for path in changes if requires_restart(path)]
+        if restart_required:
+            logger.warning(f"Config changes need a restart and were not applied: {', '.join(restart_required)}")
+            for path in restart_required:
+                _set_path(new_config, path, _get_path(self.config, path))
+        
+        applied = {path: change for path, change in changes.items() if path not in restart_required}
+        if not applied:
+            return None
+        
+        try:
+            build_runtime_config(new_config)
+        except ConfigError as e:
+            logger.error(f"Config reload rejected, keeping current configuration: {e}")
+            return None
+        
+        self.config = new_config
+        for path, (old_value, new_value) in applied.items():
+            logger.info(f"Config reloaded: {path}: {old_value!r} -> {new_value!r}")
+        return applied
+    
+    def _get_file_signature(self):
+        try:
+            stat = os.stat(self.config_path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+    
+    def _read_config_file(self):
+        with open(self.config_path, 'r', encoding='utf-8') as file:
+            config = yaml.safe_load(file)
+        
+        # Replace environment variables in config
+        self.replace_env_vars(config)
+        return config
+    
     def save_config(self, config=None):
         """
         Save configuration to YAML file
@@ -56,45 +304,96 @@ class ConfigManager:
             config (dict, optional): Configuration to save. If None, use current config.
         
         Returns:
-            bool: True if successful, False otherwise
+            bool: True if successful, False otherwise (รวมถึงเมื่อการตั้งค่าไม่ถูกต้อง ซึ่งจะไม่เขียนไฟล์)
         """
-        if config:
-            self.config = config
+        config = config or self.config
         
+        if not self._check_before_save(config):
+            return False
+        self.config = config
+        return self._write_config_file(self.config)
+    
+    def update_config(self, updates):
+        """
+        Update configuration with new values
+        
+        Args:
+            updates (dict): Dictionary with configuration updates
+        
+        Returns:
+            bool: True if successful, False otherwise (การตั้งค่าที่ไม่ถูกต้องจะไม่ถูกนำมาใช้)
+        """
+        # Deep update the config (สร้าง dict ใหม่ เพื่อให้ RuntimeConfig ถูกสร้างใหม่ด้วย)
+        config = copy.deepcopy(self.config)
+        self._deep_update(config, updates)
+        
+        # Save the updated config (self.config เปลี่ยนเฉพาะเมื่อผ่านการตรวจสอบ)
+        return self.save_config(config)
+    
+    def patch_config(self, updates):
+        """
+        Update only the given keys in the YAML file
+        
+        ต่างจาก update_config ตรงที่เขียนกลับเฉพาะเนื้อหาเดิมของไฟล์ที่แก้เฉพาะ key ใน updates
+        ค่า ${ENV_VAR} จะไม่ถูกแทนด้วยค่าจริง และค่าเริ่มต้นที่ไฟล์ไม่ได้กำหนดจะไม่ถูกเพิ่มลงไฟล์
+        
+        Args:
+            updates (dict): Dictionary with configuration updates
+        
+        Returns:
+            bool: True if successful, False otherwise (การตั้งค่าที่ไม่ถูกต้องจะไม่ถูกนำมาใช้)
+        """
+        try:
+            with open(self.config_path, 'r', encoding='utf-8') as file:
+                raw_config = yaml.safe_load(file)
+        except FileNotFoundError:
+            raw_config = self._get_default_config()
+        except (OSError, yaml.YAMLError) as e:
+            logger.error(f"Cannot read {self.config_path}: {e}")
+            return False
+        self._deep_update(raw_config, updates)
+        
+        config = self.replace_env_vars(copy.deepcopy(raw_config))
+        if not self._check_before_save(config):
+            return False
+        if not self._write_config_file(raw_config):
+            return False
+        self.config = config
+        return True
+    
+    def _check_before_save(self, config):
+        """ตรวจสอบก่อนเขียน: ไฟล์ที่ไม่ถูกต้องจะทำให้ load_config ล้มเหลวตอนเริ่มโปรแกรมครั้งถัดไป"""
+        errors = validate_config(config)
+        if not errors:
+            try:
+                build_runtime_config(config)
+            except ConfigError as e:
+                errors = [str(e)]
+        if errors:
+            logger.error(f"Refusing to save invalid configuration: {'; '.join(errors)}")
+            return False
+        return True
+    
+    def _write_config_file(self, config):
         try:
-            # Create backup of existing config
+            # Create backup of existing config (คัดลอกแทน rename เพื่อให้ไฟล์เดิมยังอยู่ตลอด)
             if os.path.exists(self.config_path):
                 backup_path = f"{self.config_path}.bak"
                 try:
-                    os.replace(self.config_path, backup_path)
+                    shutil.copy2(self.config_path, backup_path)
                 except Exception as e:
                     print(f"Warning: Failed to create backup of config file: {e}")
             
-            # Save new config
+            # Save new config (เขียนทับไฟล์เดิม ไม่ใช้ rename เพราะ config.yaml ถูก bind-mount เป็นไฟล์เดี่ยว
+            # ใน docker-compose ถ้า hot reload อ่านระหว่างเขียน การตรวจสอบจะปฏิเสธไฟล์ที่ไม่ครบ)
             with open(self.config_path, 'w', encoding='utf-8') as file:
-                yaml.dump(self.config, file, default_flow_style=False, sort_keys=False)
+                yaml.dump(config, file, default_flow_style=False, sort_keys=False)
             
             return True
         except Exception as e:
             print(f"Error saving configuration: {e}")
             return False
     
-    def update_config(self, updates):
-        """
-        Update configuration with new values
-        
-        Args:
-            updates (dict): Dictionary with configuration updates
-        
-        Returns:
-            bool: True if successful, False otherwise
-        """
-        # Deep update the config
-        self._deep_update(self.config, updates)
-        
-        # Save the updated config
-        return self.save_config()
-    
     def replace_env_vars(self, obj):
         """
         Recursively replace environment variables in configuration
@@ -152,16 +451,84 @@ class ConfigManager:
                 "test_video": "./data/test_videos/sample.mp4",
                 "rtsp": {
                     "main_camera": {}
+                },
+                # ใช้ detections เดิมเมื่อเฟรมเหมือนเฟรมที่วิเคราะห์ล่าสุด และแจ้งเมื่อกล้องค้าง
+                "freeze_detection": {
+                    "enabled": True,
+                    "duplicate_threshold": 4.0,  # ความต่างสูงสุดของช่องใดช่องหนึ่ง (0-255) ของภาพย่อที่ถือว่าเป็นเฟรมเดิม
+                    "stale_after": 60.0  # วินาทีที่ได้เฟรมเดิมทุก byte ก่อนแจ้งสถานะ stale (0 = ไม่แจ้ง)
                 }
             },
             "model": {
                 "type": "yolov5",
-                "model_path": "./models/yolov5s.pt",
+                "model_path": "./models/yolov5mu.pt",
                 "confidence_threshold": 0.5,
                 "classes": [2, 5, 7],
-                "device": "cpu"
+                "device": "cpu",
+                "format": "pytorch",  # pytorch, torchscript, onnx, openvino, engine
+                "imgsz": 640,
+                "sha256": None,  # ถ้ากำหนด จะตรวจสอบไฟล์โมเดลก่อนโหลด
+                "registry_dir": "./models/registry",
+                "warmup_runs": 2,
+                # ช่วงทดลองหลังสลับโมเดล: rollback ถ้า p95 latency หรืออัตราข้อผิดพลาดเกินกำหนด
+                "swap_probation_frames": 300,
+                "swap_max_latency_ms": 0,  # 0 = ไม่จำกัด
+                "swap_max_error_rate": 0.05,
+                # การใช้ CPU ของการ inference (ต้องเริ่มโปรแกรมใหม่)
+                "cpu": {
+                    "intra_op_threads": 0,  # 0 = ทุก core ที่ worker นี้ได้รับ
+                    "inter_op_threads": 1,
+                    "workers_per_host": 1,  # จำนวนโปรเซสตรวจจับบนเครื่องเดียวกัน
+                    "worker_index": 0,  # ลำดับของโปรเซสนี้ (เช่น "${WORKER_INDEX}")
+                    "affinity": "auto",  # auto = แบ่ง core ตาม worker, [0, 1] = กำหนดเอง, null = ไม่ผูก
+                    "opencv_threads": 1,  # null = ค่าเริ่มต้นของ OpenCV
+                    "inference_mode": True,
+                    "channels_last": False
+                },
+                # ตรวจจับสองขั้น: โมเดลเล็กทุกเฟรม + โมเดลหลักเฉพาะ crop ที่ต้องยืนยัน (ต้องเริ่มโปรแกรมใหม่)
+                "cascade": {
+                    "enabled": False,
+                    "proposal": {  # แทนค่าในส่วน model สำหรับโมเดลเล็ก
+                        "model_path": "./models/yolov8n.pt",
+                        "format": "pytorch",
+                        "imgsz": 320,
+                        "confidence_threshold": 0.25,
+                        "sha256": None
+                    },
+                    "confirm_below": 0.6,  # proposal ใกล้เส้นที่ confidence ต่ำกว่านี้ต้องยืนยัน
+                    "line_margin": 150,  # ระยะจากเส้นนับ (pixel) ที่ถือว่าใกล้เส้น
+                    "new_object_iou": 0.3,  # IoU สูงสุดกับเฟรมก่อนหน้าที่ต่ำกว่านี้ = วัตถุใหม่
+                    "match_iou": 0.3,
+                    "crop_padding": 0.25,
+                    "confirm_imgsz": 320,
+                    "report_interval": 1000  # แสดงสถิติของแต่ละขั้นทุก N เฟรม (0 = ไม่แสดง)
+                }
             },
             "detection": {
+                "frame_stride": 1,  # ตรวจจับทุก N เฟรม (1 = ทุกเฟรม)
+                # "reference_size": [1280, 720] = ขนาดภาพที่ใช้วัดพิกัด pixel ของเส้นนับและ ROI
+                # (ถ้าไม่กำหนด เส้นนับใช้ 1280x720 และ ROI ที่ไม่มี points_percent ใช้พิกัด pixel ตรงๆ)
+                "tiling": {
+                    "enabled": False,  # แบ่งเฟรมความละเอียดสูงเป็นช่องเพื่อตรวจจับรถที่อยู่ไกล
+                    "tile_size": 0,  # 0 = model.imgsz
+                    "overlap": 0.2,
+                    "min_roi_coverage": 0.0,  # ข้ามช่องที่มีพื้นที่ ROI น้อยกว่าสัดส่วนนี้ (ช่องที่ไม่มี ROI ข้ามเสมอ)
+                    "nms_iou": 0.5,
+                    "nms_containment": 0.8
+                },
+                # ตรวจจับเต็มเฉพาะ keyframe และเลื่อนกล่องด้วย optical flow + Kalman ในเฟรมระหว่างนั้น
+                "keyframes": {
+                    "enabled": False,
+                    "min_interval": 1,  # เมื่อมีรถอยู่ใกล้เส้นนับ (ตรวจจับทุกเฟรม)
+                    "max_interval": 6,  # เมื่อไม่มีรถหรือรถไม่ได้เคลื่อนเข้าหาเส้น
+                    "line_margin": 120,  # ระยะจากเส้นนับ (pixel) ที่ต้องตรวจจับทุกเฟรม
+                    "match_iou": 0.3,
+                    "max_missed": 2,  # จำนวน keyframe ที่ track หายไปได้ก่อนถูกลบ
+                    "optical_flow": True,  # False = ใช้เฉพาะการทำนายของ Kalman filter
+                    "flow_width": 640,  # ความกว้างของภาพที่ใช้คำนวณ optical flow
+                    "process_noise": 1.0,
+                    "measurement_noise": 4.0
+                },
                 "line_crossing": {
                     "enabled": True,
                     "line_position": [[400, 600], [1200, 600]],
@@ -172,18 +539,91 @@ class ConfigManager:
                     "points": [[100, 100], [1500, 100], [1500, 900], [100, 900]]
                 }
             },
+            "config_reload": {
+                "enabled": True,
+                "interval": 2.0
+            },
+            "quantization": {
+                "footage": [],  # วิดีโอจากกล้องที่ใช้ calibrate/ตรวจสอบ (ว่าง = video_source.test_video)
+                # วิดีโอที่ใช้ตรวจสอบเท่านั้น (ว่าง = ช่วงท้ายของวิดีโอสุดท้ายใน footage ที่ไม่ใช้ calibrate)
+                "validation_footage": [],
+                "calibration_frames": 300,
+                "validation_frames": 900,
+                # เกณฑ์ที่ต้องผ่านก่อนลงทะเบียนโมเดล INT8
+                "min_agreement": 0.95,
+                "max_count_delta": 0.02,
+                "min_speedup": 1.2
+            },
+            "autotune": {
+                "clip": None,  # คลิปจากกล้องจริง (null = video_source.test_video)
+                "frames": 300,
+                "formats": ["pytorch"],  # เพิ่ม "openvino" หรือ "openvino-int8" ได้
+                "imgsz": [320, 416, 512, 640],
+                "threads": [],  # ว่าง = ครึ่งหนึ่งและทั้งหมดของ core ที่ได้รับ
+                "strides": [1, 2, 3],
+                "target_fps": 10.0,
+                "min_accuracy": 0.98  # ยอดนับเทียบกับการตั้งค่าที่แม่นยำที่สุด
+            },
+            "control": {
+                "enabled": False,
+                "socket_path": "./run/control.sock",
+                "timeout": 5.0
+            },
             "logging": {
                 "enabled": True,
                 "log_level": "INFO",
                 "log_format": "%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-                "log_file": "./logs/vehicle_counts/vehicle_counts.log"
+                "log_file": "./logs/vehicle_counts/vehicle_counts.log",
+                "backend": "csv",
+                "sqlite_path": "./logs/vehicle_counts/vehicle_counts.db",
+                "buffer_size": 64,
+                "flush_interval": 1.0,
+                "fsync": "interval",
+                "fsync_interval": 5.0,
+                "flush_timeout": 10.0,  # เวลารอสูงสุด (วินาที) ของการ flush เมื่อดิสก์ค้าง
+                # ข้อมูล debug รายเฟรม (ด้านของเส้นของรถแต่ละคัน ฯลฯ) ที่ระดับ DEBUG เฉพาะทุก N เฟรม
+                "debug_trace": {
+                    "enabled": False,
+                    "sample_every": 100
+                },
+                "event_log": {
+                    "enabled": True,
+                    "path": "./logs/vehicle_counts/events.bin",
+                    "index_interval": 256
+                }
+            },
+            "rollups": {
+                "enabled": True,
+                "path": "./logs/vehicle_counts/rollups.bin",
+                "persist_interval": 30,
+                "minute_retention_days": 7,
+                "hour_retention_days": 400
+            },
+            "checkpoint": {
+                "enabled": True,
+                "path": "./logs/state/checkpoint.bin",
+                "interval": 5
             },
             "api": {
                 "enabled": False,
                 "endpoint": "",
                 "send_interval": 60,
                 "retry_attempts": 3,
-                "timeout": 10
+                "timeout": 10,
+                "batch_size": 100,
+                "backoff_base": 1.0,
+                "backoff_max": 300.0,
+                "spool_path": "./logs/api_spool.db",
+                "max_workers": 1,
+                "payload_format": "auto",
+                "compression": "auto",
+                "compress_min_bytes": 1024,
+                "negotiate_retry_interval": 300,  # วินาทีก่อนลองตกลงรูปแบบกับ /status ใหม่เมื่อครั้งก่อนล้มเหลว
+                "uploader": "thread",
+                "heartbeat_interval": 60,
+                "probe_interval": 300,
+                "rate_limit": 0,
+                "rate_burst": 5
             },
             "gui": {
                 "enabled": False,
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Control Server Module
+โมดูลรับคำสั่งควบคุมจากเครื่องเดียวกันผ่าน Unix socket (เช่น สลับโมเดล, ดูสถานะ)
+คำสั่งจะถูกทำงานในลูปหลักระหว่างเฟรม จึงไม่ต้องใช้ lock กับ component ต่าง ๆ
+"""
+
+import os
+import json
+import queue
+import socket
+import threading
+import socketserver
+from loguru import logger
+
+
+class _ControlHandler(socketserver.StreamRequestHandler):
+    """Reads one JSON request per line and writes one JSON reply per line"""
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict) or "command" not in request:
+                    raise ValueError("request must be an object with a 'command' field")
+                reply = self.server.control.submit(request)
+            except ValueError as e:
+                reply = {"ok": False, "error": str(e)}
+            self.wfile.write(json.dumps(reply, ensure_ascii=False, default=str).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+
+class _UnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+class ControlServer:
+    """Local Unix-socket server whose commands run between frames"""
+
+    def __init__(self, socket_path, handlers, timeout=5.0):
+        """
+        Initialize ControlServer
+
+        Args:
+            socket_path (str): Path ของ Unix socket
+            handlers (dict): {ชื่อคำสั่ง: callable(params) -> dict}
+            timeout (float): เวลารอให้ลูปหลักทำคำสั่ง (วินาที)
+        """
+        self.socket_path = socket_path
+        self.handlers = handlers
+        self.timeout = timeout
+        self._requests = queue.Queue()
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        """เปิด socket และรับคำสั่งใน background thread"""
+        directory = os.path.dirname(self.socket_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # ลบ socket ที่ค้างจากการทำงานครั้งก่อน
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+        self._server = _UnixServer(self.socket_path, _ControlHandler)
+        self._server.control = self
+        os.chmod(self.socket_path, 0o600)
+
+        self._thread = threading.Thread(target=self._server.serve_forever, name="control-server", daemon=True)
+        self._thread.start()
+        logger.info(f"Control server listening on {self.socket_path}")
+        return self
+
+    def submit(self, request):
+        """
+        ส่งคำสั่งให้ลูปหลักแล้วรอผล (เรียกจาก thread ของ connection)
+
+        Args:
+            request (dict): {"command": str, "params": dict}
+
+        Returns:
+            dict: ผลของคำสั่ง
+        """
+        done = threading.Event()
+        item = {"request": request, "reply": None, "done": done}
+        self._requests.put(item)
+        if not done.wait(self.timeout):
+            return {"ok": False, "error": "timed out waiting for the processing loop"}
+        return item["reply"]
+
+    def process(self):
+        """
+        ทำคำสั่งที่รออยู่ทั้งหมด (เรียกจากลูปหลักทุกเฟรม ไม่บล็อก)
+
+        Returns:
+            int: จำนวนคำสั่งที่ทำ
+        """
+        processed = 0
+        while True:
+            try:
+                item = self._requests.get_nowait()
+            except queue.Empty:
+                return processed
+
+            request = item["request"]
+            command = request["command"]
+            handler = self.handlers.get(command)
+            try:
+                if handler is None:
+                    reply = {"ok": False, "error": f"unknown command '{command}'",
+                             "commands": sorted(self.handlers)}
+                else:
+                    reply = {"ok": True}
+                    reply.update(handler(request.get("params") or {}) or {})
+            except Exception as e:
+                logger.exception(f"Control command {command} failed: {e}")
+                reply = {"ok": False, "error": str(e)}
+
+            logger.info(f"Control command {command}: {'ok' if reply.get('ok') else reply.get('error')}")
+            item["reply"] = reply
+            item["done"].set()
+            processed += 1
+
+    def close(self):
+        """ปิด socket"""
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._server = None
+        try:
+            os.unlink(self.socket_path)
+        except OSError:
+            pass
+
+
+def create_control_server(config, handlers):
+    """
+    สร้างและเริ่ม ControlServer ตาม control.enabled
+
+    Args:
+        config (dict): Configuration dictionary
+        handlers (dict): {ชื่อคำสั่ง: callable(params) -> dict}
+
+    Returns:
+        ControlServer: หรือ None ถ้าไม่เปิดใช้งานหรือระบบไม่รองรับ Unix socket
+    """
+    control_config = config.get("control", {})
+    if not control_config.get("enabled", False):
+        return None
+    if not hasattr(socket, "AF_UNIX"):
+        logger.warning("Control server requires Unix domain sockets, disabling it on this platform")
+        return None
+    return ControlServer(
+        control_config.get("socket_path", "./run/control.sock"),
+        handlers,
+        control_config.get("timeout", 5.0)
+    ).start()
+
+
+def send_command(socket_path, command, params=None, timeout=30.0):
+    """
+    ส่งคำสั่งไปยัง ControlServer ที่กำลังทำงาน
+
+    Args:
+        socket_path (str): Path ของ Unix socket
+        command (str): ชื่อคำสั่ง
+        params (dict, optional): พารามิเตอร์ของคำสั่ง
+        timeout (float): เวลารอผล (วินาที)
+
+    Returns:
+        dict: ผลของคำสั่ง
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(socket_path)
+        request = json.dumps({"command": command, "params": params or {}}) + "\n"
+        client.sendall(request.encode("utf-8"))
+        with client.makefile('rb') as reply:
+            return json.loads(reply.readline())
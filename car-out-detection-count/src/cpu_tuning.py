@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+CPU Tuning Module
+โมดูลกำหนดการใช้ CPU ของการ inference (จำนวน thread, การผูก core ต่อ worker,
+inference_mode และ channels-last) เพื่อไม่ให้หลาย worker บนเครื่องเดียวกันแย่ง core กัน
+"""
+
+import os
+import contextlib
+from loguru import logger
+
+# ตัวแปรสภาพแวดล้อมของ thread pool ที่ต้องกำหนดก่อนนำเข้า torch/OpenCV/OpenVINO
+_THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+
+def available_cores():
+    """
+    Returns:
+        list: หมายเลข core ที่โปรเซสนี้ใช้ได้ (ตาม affinity/cgroup ถ้าระบบรองรับ)
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def partition_cores(cores, workers, index):
+    """
+    แบ่ง core เป็นช่วงต่อเนื่องเท่า ๆ กันให้แต่ละ worker
+
+    Args:
+        cores (list): core ที่ใช้ได้
+        workers (int): จำนวน worker บนเครื่อง
+        index (int): ลำดับของ worker นี้ (0 ถึง workers - 1)
+
+    Returns:
+        list: core ของ worker นี้ (อย่างน้อย 1 core)
+    """
+    workers = max(1, workers)
+    index = index % workers
+    if workers >= len(cores):
+        return [cores[index % len(cores)]]
+    start = index * len(cores) // workers
+    end = (index + 1) * len(cores) // workers
+    return cores[start:end]
+
+
+def _cpu_settings(config):
+    return config.get("model", {}).get("cpu", {})
+
+
+def apply_cpu_settings(config):
+    """
+    กำหนด affinity และจำนวน thread ของโปรเซสตาม model.cpu
+    ต้องเรียกก่อนโหลดโมเดล (ก่อนที่ torch จะสร้าง thread pool)
+
+    Args:
+        config (dict): Configuration dictionary
+
+    Returns:
+        dict: ค่าที่ใช้จริง (สำหรับรายงานตอนเริ่มโปรแกรม)
+    """
+    settings = _cpu_settings(config)
+    workers = int(settings.get("workers_per_host", 1))
+    worker_index = int(settings.get("worker_index", 0))
+    cores = available_cores()
+
+    # ผูก core: "auto" = แบ่ง core ตามลำดับ worker, list = กำหนดเอง, null = ไม่เปลี่ยน
+    affinity = settings.get("affinity", "auto")
+    if affinity == "auto":
+        affinity = partition_cores(cores, workers, worker_index) if workers > 1 else None
+    if affinity:
+        if hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, affinity)
+            cores = sorted(affinity)
+        else:
+            logger.warning("CPU affinity is not supported on this platform, ignoring model.cpu.affinity")
+
+    # 0 = ใช้ core ทั้งหมดที่ worker นี้ได้รับ
+    intra_op = int(settings.get("intra_op_threads", 0)) or max(1, len(cores) if affinity else len(cores) // workers)
+    inter_op = int(settings.get("inter_op_threads", 1))
+    for name in _THREAD_ENV_VARS:
+        os.environ[name] = str(intra_op)
+
+    report = {
+        "worker": f"{worker_index + 1}/{workers}",
+        "cores": cores,
+        "intra_op_threads": intra_op,
+        "inter_op_threads": inter_op,
+        "inference_mode": settings.get("inference_mode", True),
+        "channels_last": settings.get("channels_last", False),
+        "torch": None
+    }
+
+    opencv_threads = settings.get("opencv_threads", 1)
+    if opencv_threads is not None:
+        import cv2
+        cv2.setNumThreads(int(opencv_threads))
+        report["opencv_threads"] = int(opencv_threads)
+
+    try:
+        import torch
+    except ImportError:
+        # format ที่ไม่ใช้ torch (openvino/onnx) ใช้เฉพาะ OMP_NUM_THREADS และ affinity
+        logger.info("torch not installed, applying only environment thread limits and affinity")
+        return report
+
+    torch.set_num_threads(intra_op)
+    try:
+        torch.set_num_interop_threads(inter_op)
+    except RuntimeError as e:
+        # กำหนดได้ครั้งเดียวก่อนเริ่มงานแบบขนาน
+        logger.warning(f"Could not set inter-op threads: {e}")
+    report["torch"] = {
+        "version": torch.__version__,
+        "num_threads": torch.get_num_threads(),
+        "num_interop_threads": torch.get_num_interop_threads()
+    }
+    return report
+
+
+def log_cpu_report(report, imgsz):
+    """แสดงการตั้งค่า CPU ที่ใช้จริงตอนเริ่มโปรแกรม"""
+    cores = report["cores"]
+    core_text = f"{cores[0]}-{cores[-1]}" if cores == list(range(cores[0], cores[-1] + 1)) else str(cores)
+    torch_text = ("torch n/a" if report["torch"] is None else
+                  f"torch {report['torch']['num_threads']}/{report['torch']['num_interop_threads']} threads")
+    logger.info(f"CPU execution: worker {report['worker']}, cores {core_text}, "
+                f"intra-op {report['intra_op_threads']}, inter-op {report['inter_op_threads']}, {torch_text}, "
+                f"inference_mode={report['inference_mode']}, channels_last={report['channels_last']}, "
+                f"imgsz={imgsz}")
+
+
+def prepare_model(model, config, model_format):
+    """
+    ปรับโมเดล PyTorch ตาม model.cpu (channels-last) ก่อน warm-up
+
+    Args:
+        model: โมเดล ultralytics
+        config (dict): Configuration dictionary
+        model_format (str): model.format (ปรับเฉพาะ pytorch)
+
+    Returns:
+        โมเดลเดิม
+    """
+    if model_format != "pytorch" or not _cpu_settings(config).get("channels_last", False):
+        return model
+
+    import torch
+    model.model.to(memory_format=torch.channels_last)
+    return model
+
+
+def inference_context(config, model_format):
+    """
+    context ที่ใช้ครอบ predict (torch.inference_mode สำหรับโมเดล PyTorch)
+
+    Args:
+        config (dict): Configuration dictionary
+        model_format (str): model.format
+
+    Returns:
+        callable: ฟังก์ชันที่คืน context manager
+    """
+    if model_format != "pytorch" or not _cpu_settings(config).get("inference_mode", True):
+        return contextlib.nullcontext
+    try:
+        import torch
+    except ImportError:
+        return contextlib.nullcontext
+    return torch.inference_mode
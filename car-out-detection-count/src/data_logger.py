@@ -7,24 +7,31 @@ Data Logger Module
 """
 
 import os
-import csv
-import json
-import time
 from datetime import datetime
 from loguru import logger
 from collections import deque
 
+from src.event_store import create_event_store
+from src.rollups import RollupStore
+from src.exporter import export_rows, EXPORT_FORMATS
+from src.event_log import EventLog
+
 class DataLogger:
     """Class for logging vehicle count data"""
     
-    def __init__(self, config):
+    def __init__(self, config, read_only=False, load_rollups=True):
         """
         Initialize DataLogger
         
         Args:
             config (dict): Configuration dictionary
+            read_only (bool): เปิดเพื่ออ่านอย่างเดียว (เช่น --summary, --export ขณะที่ service ทำงานอยู่)
+                ไม่เปิดไฟล์เพื่อเขียน ไม่เริ่ม background thread และไม่บันทึก rollup
+            load_rollups (bool): โหลด rollup (หรือสร้างจากข้อมูลดิบ) ตอนเริ่ม
+                (False สำหรับ repair_rollups ที่สร้างใหม่ทั้งหมดอยู่แล้ว)
         """
         self.config = config
+        self.read_only = read_only
         self.log_enabled = config["logging"]["enabled"]
         self.log_file = config["logging"]["log_file"]
         
@@ -35,22 +42,43 @@ class DataLogger:
         # คิวสำหรับเก็บข้อมูลล่าสุด (เก็บข้อมูล 100 รายการล่าสุด)
         self.recent_counts = deque(maxlen=100)
         
-        # สร้างไดเรกทอรีสำหรับไฟล์ log (ถ้ายังไม่มี)
+        # เวลารอสูงสุด (วินาที) ของการ flush ก่อนอ่านข้อมูลหรือปิดไฟล์ (ไม่บล็อกนานเมื่อดิสก์ค้าง)
+        self.flush_timeout = config["logging"].get("flush_timeout", 10.0)
+        
+        # Store สำหรับเขียนข้อมูลแบบ buffer ใน background thread (CSV หรือ SQLite ตาม logging.backend)
+        self.store = None
         if self.log_enabled:
-            os.makedirs(os.path.dirname(self.log_file), exist_ok=True)
-            
-            # ตรวจสอบว่าไฟล์ log มีอยู่แล้วหรือไม่
-            file_exists = os.path.isfile(self.log_file)
-            
-            # เขียนหัวคอลัมน์ถ้าเป็นไฟล์ใหม่
-            if not file_exists:
-                with open(self.log_file, 'w', newline='') as csvfile:
-                    csv_writer = csv.writer(csvfile)
-                    csv_writer.writerow(['timestamp', 'date', 'time', 'location_id', 'camera_id', 'count', 'total_count'])
-                    
-                logger.info(f"Created new log file: {self.log_file}")
+            self.store = create_event_store(config, read_only)
             
-            logger.info(f"DataLogger initialized to log to {self.log_file}")
+            logger.info(f"DataLogger initialized {'read-only on' if read_only else 'to log to'} {self.store.path}")
+        
+        # Event log แบบไบนารีสำหรับข้อมูลการข้ามเส้นแบบละเอียดของรถแต่ละคัน
+        self.event_log = None
+        event_log_config = config["logging"].get("event_log", {})
+        if self.log_enabled and event_log_config.get("enabled", True):
+            self.event_log = EventLog(
+                event_log_config.get("path", "./logs/vehicle_counts/events.bin"),
+                self.location_id,
+                self.camera_id,
+                index_interval=event_log_config.get("index_interval", 256),
+                buffer_size=config["logging"].get("buffer_size", 64),
+                flush_interval=config["logging"].get("flush_interval", 1.0),
+                fsync_policy=config["logging"].get("fsync", "interval"),
+                fsync_interval=config["logging"].get("fsync_interval", 5.0),
+                read_only=read_only
+            )
+        
+        # Rollup รายนาที/ชั่วโมง/วัน ที่อัปเดตทุกครั้งที่มีการนับ
+        self.rollups = RollupStore(config)
+        if self.log_enabled and self.rollups.enabled and load_rollups:
+            if not self.rollups.load():
+                # ยังไม่มีไฟล์ rollup ให้สร้างจากข้อมูลดิบที่มีอยู่ (ทำครั้งเดียว)
+                self.rebuild_rollups()
+            else:
+                # ไฟล์ rollup บันทึกทุก persist_interval: เล่นซ้ำเหตุการณ์ที่เกิดหลังการบันทึกครั้งล่าสุด
+                self.replay_rollups()
+            if not read_only:
+                self.rollups.start()
     
     def log_vehicle_count(self, count_data):
         """
@@ -59,8 +87,7 @@ class DataLogger:
         Args:
             count_data (dict): ข้อมูลการนับ {'total_count': int, 'new_counts': int}
         """
-        if not self.log_enabled:
-            print("Logging is disabled")
+        if not self.log_enabled or self.read_only:
             return
         
         # สร้างข้อมูล timestamp
@@ -69,53 +96,210 @@ class DataLogger:
         date = now.strftime("%Y-%m-%d")
         time_str = now.strftime("%H:%M:%S")
         
-        # Debug
-        print(f"Logging count data: {count_data}")
+        row = {
+            'timestamp': timestamp,
+            'date': date,
+            'time': time_str,
+            'location_id': self.location_id,
+            'camera_id': self.camera_id,
+            'count': count_data['new_counts'],
+            'total_count': count_data['total_count']
+        }
+        
+        # ส่งเข้าคิวของ store (ไม่บล็อกการประมวลผลเฟรมแม้ดิสก์จะช้า)
+        self.store.append(row)
+        
+        # บันทึกเหตุการณ์ของรถแต่ละคันลง event log
+        # (ไม่มี crossings = ไม่ทราบ class และทิศทาง แต่ยังบันทึกทุกคันเพื่อให้ event log ครบเท่ากับ store)
+        if self.event_log is not None:
+            epoch = now.timestamp()
+            media_time_ms = count_data.get('media_time_ms', 0)
+            crossings = count_data.get('crossings')
+            if crossings is None:
+                crossings = [{'class': -1, 'direction': "unknown"}] * count_data['new_counts']
+            for crossing in crossings:
+                self.event_log.append_event(
+                    epoch, media_time_ms, crossing.get('track_id', 0), count_data['total_count'],
+                    crossing.get('confidence', 0.0), crossing['class'], crossing['direction'],
+                    crossing.get('line_id', 0)
+                )
+        
+        # อัปเดต rollup ตาม class และทิศทางของรถแต่ละคัน
+        if self.rollups.enabled:
+            crossings = count_data.get('crossings')
+            if crossings:
+                for crossing in crossings:
+                    self.rollups.add(now, self.camera_id, crossing['class'], crossing['direction'])
+            else:
+                self.rollups.add(now, self.camera_id, -1, "unknown", count_data['new_counts'])
+        
+        # เก็บข้อมูลล่าสุดในคิว
+        for _ in range(count_data['new_counts']):
+            self.recent_counts.append(dict(row, count=1))
+        
+        logger.debug(f"Logged vehicle count: {count_data['new_counts']} new, {count_data['total_count']} total")
+    
+    def flush(self, timeout=None):
+        """
+        เขียนข้อมูลที่ค้างอยู่ใน buffer ลงไฟล์
+        
+        Args:
+            timeout (float, optional): เวลารอสูงสุด (วินาที) ค่าเริ่มต้นคือ logging.flush_timeout
+        
+        Returns:
+            bool: True ถ้าเขียนเสร็จ
+        """
+        if self.store is None:
+            return True
+        if timeout is None:
+            timeout = self.flush_timeout
+        if self.event_log is not None:
+            self.event_log.flush(timeout)
+        return self.store.flush(timeout)
+    
+    def close(self):
+        """เขียนข้อมูลที่ค้างทั้งหมดและปิดไฟล์ log"""
+        if self.store is not None:
+            self.store.close(self.flush_timeout)
+            if self.event_log is not None:
+                self.event_log.close(self.flush_timeout)
+            if self.rollups.enabled and not self.read_only:
+                self.rollups.close()
+            logger.info("DataLogger closed")
+    
+    def rebuild_rollups(self):
+        """
+        สร้าง rollup ใหม่ทั้งหมดจากข้อมูลดิบใน store (ใช้ซ่อมไฟล์ rollup)
+        
+        Returns:
+            int: จำนวนแถวที่ประมวลผล
+        """
+        if not self.log_enabled:
+            return 0
+        
+        self.flush()
         
-        # บันทึกลง CSV
         try:
-            # ตรวจสอบว่าไดเร็กทอรีมีอยู่หรือไม่
-            os.makedirs(os.path.dirname(self.log_file), exist_ok=True)
-            
-            # ตรวจสอบว่าไฟล์มีอยู่แล้วหรือไม่
-            file_exists = os.path.isfile(self.log_file)
-            
-            with open(self.log_file, 'a', newline='') as csvfile:
-                csv_writer = csv.writer(csvfile)
-                
-                # เขียนหัวคอลัมน์ถ้าเป็นไฟล์ใหม่
-                if not file_exists:
-                    csv_writer.writerow(['timestamp', 'date', 'time', 'location_id', 'camera_id', 'count', 'total_count'])
-                    
-                # เขียนข้อมูล
-                csv_writer.writerow([
-                    timestamp,
-                    date,
-                    time_str,
-                    self.location_id,
-                    self.camera_id,
-                    count_data['new_counts'],
-                    count_data['total_count']
-                ])
-            
-            # เก็บข้อมูลล่าสุดในคิว
-            for _ in range(count_data['new_counts']):
-                self.recent_counts.append({
-                    'timestamp': timestamp,
-                    'date': date,
-                    'time': time_str,
-                    'location_id': self.location_id,
-                    'camera_id': self.camera_id,
-                    'count': 1,
-                    'total_count': count_data['total_count']
-                })
-            
-            print(f"Successfully logged: {count_data['new_counts']} new, {count_data['total_count']} total")
-            logger.debug(f"Logged vehicle count: {count_data['new_counts']} new, {count_data['total_count']} total")
+            processed = self.rollups.rebuild(self._raw_events())
+            if not self.read_only:
+                self.rollups.save()
+            return processed
+        except Exception as e:
+            logger.error(f"Error rebuilding rollups: {e}")
+            return 0
+    
+    def repair_rollups(self):
+        """
+        สร้างไฟล์ rollup ใหม่จากข้อมูลดิบและบันทึกครั้งเดียว (main.py --rebuild-rollups)
+        
+        ใช้กับ DataLogger(config, read_only=True, load_rollups=False) และปฏิเสธถ้า service ที่ทำงานอยู่
+        ถือไฟล์ rollup (ไม่เช่นนั้น service จะบันทึกทับไฟล์ที่ซ่อมภายใน persist_interval)
+        
+        Returns:
+            bool: True ถ้าบันทึกไฟล์ใหม่สำเร็จ
+        """
+        if not self.log_enabled or not self.rollups.enabled:
+            logger.error("Rollups are disabled; nothing to rebuild")
+            return False
+        
+        if not self.rollups.lock():
+            logger.error(f"{self.rollups.path} is in use by the running service; stop it before rebuilding rollups")
+            return False
         
+        try:
+            self.rollups.rebuild(self._raw_events())
+            return self.rollups.save()
+        except Exception as e:
+            logger.error(f"Error rebuilding rollups: {e}")
+            return False
+        finally:
+            self.rollups.close()
+    
+    def replay_rollups(self):
+        """
+        เพิ่มเหตุการณ์ในข้อมูลดิบที่เกิดหลังเหตุการณ์ล่าสุดใน rollup ที่โหลดมา
+        
+        Returns:
+            int: จำนวนเหตุการณ์ที่ประมวลผล
+        """
+        try:
+            processed = self.rollups.replay(self._raw_events(self.rollups.applied_until))
+            if processed and not self.read_only:
+                self.rollups.save()
+            return processed
         except Exception as e:
-            print(f"Error logging vehicle count: {e}")
-            logger.error(f"Error logging vehicle count: {e}")
+            logger.error(f"Error replaying events into rollups: {e}")
+            return 0
+    
+    def _raw_events(self, after=None):
+        """
+        เหตุการณ์จากข้อมูลดิบสำหรับ rollup
+        
+        ใช้ event log สำหรับช่วงเวลาที่มีข้อมูล เพราะเก็บ class และทิศทางของรถแต่ละคัน
+        ส่วนข้อมูลก่อนหน้านั้นใช้ข้อมูลดิบจาก store (ไม่ทราบ class และทิศทาง)
+        
+        Args:
+            after (float, optional): เฉพาะเหตุการณ์ที่เกิดหลังเวลานี้ (epoch)
+        
+        Yields:
+            tuple: (datetime, camera_id, class, direction, count)
+        """
+        logged_events = self.event_log.iter_range(after) if self.event_log is not None else iter(())
+        first_event = next((event for event in logged_events
+                            if after is None or event['timestamp'].timestamp() > after), None)
+        cutoff = first_event['timestamp'].replace(microsecond=0) if first_event else None
+        
+        start_date = datetime.fromtimestamp(after).strftime("%Y-%m-%d") if after is not None else None
+        for row in self.store.iter_rows(start_date):
+            moment = datetime.strptime(row['timestamp'], "%Y-%m-%d %H:%M:%S")
+            if cutoff is not None and moment >= cutoff:
+                break
+            # store เก็บเวลาละเอียดระดับวินาที: แถวในวินาทีเดียวกับเหตุการณ์ล่าสุดถือว่ารวมแล้ว
+            if after is not None and moment.timestamp() <= after:
+                continue
+            yield moment, row['camera_id'], -1, "unknown", row['count']
+        
+        if first_event is not None:
+            yield first_event['timestamp'], first_event['camera_id'], first_event['class'], first_event['direction'], 1
+            for event in logged_events:
+                yield event['timestamp'], event['camera_id'], event['class'], event['direction'], 1
+    
+    def get_events(self, start=None, end=None):
+        """
+        ดึงเหตุการณ์การข้ามเส้นแบบละเอียดจาก event log
+        
+        Args:
+            start (datetime, optional): เวลาเริ่มต้น
+            end (datetime, optional): เวลาสิ้นสุด
+        
+        Returns:
+            iterator: เหตุการณ์แต่ละรายการ (dict)
+        """
+        if self.event_log is None:
+            return iter(())
+        
+        self.event_log.flush(self.flush_timeout)
+        return self.event_log.iter_range(start.timestamp() if start else None,
+                                         end.timestamp() if end else None)
+    
+    def get_rollups(self, granularity, start, end, camera_id=None, cls=None, direction=None):
+        """
+        ดึงข้อมูล rollup สำหรับ dashboard
+        
+        Args:
+            granularity (str): "minute", "hour" หรือ "day"
+            start (datetime): เวลาเริ่มต้น
+            end (datetime): เวลาสิ้นสุด
+            camera_id (str, optional): กรองเฉพาะกล้อง
+            cls (int, optional): กรองเฉพาะ class
+            direction (str, optional): กรองเฉพาะทิศทาง ("up", "down")
+        
+        Returns:
+            list: รายการ rollup
+        """
+        if not self.rollups.enabled:
+            return []
+        return self.rollups.query(granularity, start, end, camera_id, cls, direction)
     
     def get_recent_counts(self, max_entries=None):
         """
@@ -131,13 +315,79 @@ class DataLogger:
             return list(self.recent_counts)
         else:
             return list(self.recent_counts)[-max_entries:]
-    
-    def get_daily_summary(self, date=None):
+
+    def get_state(self):
+        """
+        ดึงสถานะของคิวข้อมูลล่าสุดสำหรับบันทึก checkpoint
+
+        Returns:
+            dict: {"recent_counts": [(timestamp_epoch, total_count), ...]}
+        """
+        recent = []
+        for entry in self.recent_counts:
+            timestamp = datetime.strptime(entry['timestamp'], "%Y-%m-%d %H:%M:%S").timestamp()
+            recent.append((timestamp, entry['total_count']))
+        return {"recent_counts": recent}
+
+    def restore_state(self, state):
+        """
+        กู้คืนคิวข้อมูลล่าสุดจาก checkpoint
+
+        Args:
+            state (dict): สถานะจาก get_state()
+        """
+        self.recent_counts.clear()
+        for timestamp, total_count in state["recent_counts"]:
+            moment = datetime.fromtimestamp(timestamp)
+            self.recent_counts.append({
+                'timestamp': moment.strftime("%Y-%m-%d %H:%M:%S"),
+                'date': moment.strftime("%Y-%m-%d"),
+                'time': moment.strftime("%H:%M:%S"),
+                'location_id': self.location_id,
+                'camera_id': self.camera_id,
+                'count': 1,
+                'total_count': total_count
+            })
+
+    def get_last_track_id(self):
+        """
+        อ่านหมายเลข track ล่าสุดที่บันทึกไว้ใน event log
+
+        Returns:
+            int: หมายเลข track ล่าสุด หรือ None ถ้าไม่มีข้อมูล
+        """
+        if self.event_log is None:
+            return None
+
+        try:
+            return self.event_log.last_track_id()
+        except Exception as e:
+            logger.error(f"Error reading last track id: {e}")
+            return None
+
+    def get_last_total_count(self):
+        """
+        อ่านยอดรวมล่าสุดที่บันทึกไว้ใน log
+
+        Returns:
+            int: ยอดรวมล่าสุด หรือ None ถ้าไม่มีข้อมูล
+        """
+        if not self.log_enabled:
+            return None
+
+        try:
+            return self.store.last_total_count()
+        except Exception as e:
+            logger.error(f"Error reading last total count: {e}")
+            return None
+
+    def get_daily_summary(self, date=None, camera_id=None):
         """
         ดึงข้อมูลสรุปรายวัน
         
         Args:
             date (str, optional): วันที่ต้องการสรุป ในรูปแบบ "YYYY-MM-DD". ถ้าไม่ระบุจะใช้วันปัจจุบัน.
+            camera_id (str, optional): กรองเฉพาะกล้องที่กำหนด. ถ้าไม่ระบุจะรวมทุกกล้อง.
         
         Returns:
             dict: ข้อมูลสรุปรายวัน
@@ -156,32 +406,23 @@ class DataLogger:
             "hourly_counts": {}
         }
         
+        # อ่านจาก rollup โดยตรงถ้าเปิดใช้งาน (ไม่ต้องสแกนข้อมูลดิบ)
+        if self.rollups.enabled:
+            summary["total_count"], summary["hourly_counts"] = self.rollups.daily_summary(date, camera_id)
+            return summary
+        
+        # เขียนข้อมูลที่ค้างใน buffer ก่อนอ่านข้อมูล
+        self.flush()
+        
         try:
-            with open(self.log_file, 'r', newline='') as csvfile:
-                csv_reader = csv.DictReader(csvfile)
-                for row in csv_reader:
-                    # ข้ามข้อมูลที่ไม่ตรงกับวันที่ต้องการ
-                    if row['date'] != date:
-                        continue
-                    
-                    # เพิ่มจำนวนรวม
-                    count = int(row['count'])
-                    summary["total_count"] += count
-                    
-                    # เพิ่มจำนวนตามชั่วโมง
-                    hour = row['time'].split(':')[0]
-                    if hour in summary["hourly_counts"]:
-                        summary["hourly_counts"][hour] += count
-                    else:
-                        summary["hourly_counts"][hour] = count
-            
+            summary["total_count"], summary["hourly_counts"] = self.store.daily_summary(date, camera_id)
             return summary
         
         except Exception as e:
             logger.error(f"Error generating daily summary: {e}")
             return summary
     
-    def export_data(self, output_file, start_date=None, end_date=None, format="csv"):
+    def export_data(self, output_file, start_date=None, end_date=None, format="csv", camera_id=None):
         """
         ส่งออกข้อมูลการนับในช่วงเวลาที่กำหนด
         
@@ -189,7 +430,9 @@ class DataLogger:
             output_file (str): ชื่อไฟล์สำหรับส่งออก
             start_date (str, optional): วันที่เริ่มต้น ในรูปแบบ "YYYY-MM-DD". ถ้าไม่ระบุจะใช้ข้อมูลทั้งหมด.
             end_date (str, optional): วันที่สิ้นสุด ในรูปแบบ "YYYY-MM-DD". ถ้าไม่ระบุจะใช้วันปัจจุบัน.
-            format (str, optional): รูปแบบการส่งออก ("csv" หรือ "json"). ค่าเริ่มต้นเป็น "csv".
+            format (str, optional): รูปแบบการส่งออก ("csv", "json", "jsonl" หรือ "parquet"). ค่าเริ่มต้นเป็น "csv".
+                สำหรับ "parquet" output_file คือไดเรกทอรีที่แบ่ง partition ตามวันที่และกล้อง.
+            camera_id (str, optional): กรองเฉพาะกล้องที่กำหนด. ถ้าไม่ระบุจะส่งออกทุกกล้อง.
         
         Returns:
             bool: True ถ้าสำเร็จ, False ถ้าล้มเหลว
@@ -202,42 +445,19 @@ class DataLogger:
         if end_date is None:
             end_date = datetime.now().strftime("%Y-%m-%d")
         
+        # เขียนข้อมูลที่ค้างใน buffer ก่อนอ่านข้อมูล
+        self.flush()
+        
         try:
-            # อ่านข้อมูลจากไฟล์ log
-            data = []
-            with open(self.log_file, 'r', newline='') as csvfile:
-                csv_reader = csv.DictReader(csvfile)
-                for row in csv_reader:
-                    # กรองตามช่วงวันที่
-                    if start_date and row['date'] < start_date:
-                        continue
-                    if end_date and row['date'] > end_date:
-                        continue
-                    
-                    # แปลงประเภทข้อมูล
-                    row['count'] = int(row['count'])
-                    row['total_count'] = int(row['total_count'])
-                    
-                    data.append(row)
-            
-            # ส่งออกข้อมูลตามรูปแบบที่กำหนด
-            if format.lower() == "csv":
-                with open(output_file, 'w', newline='') as csvfile:
-                    fieldnames = ['timestamp', 'date', 'time', 'location_id', 'camera_id', 'count', 'total_count']
-                    csv_writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                    csv_writer.writeheader()
-                    for row in data:
-                        csv_writer.writerow(row)
-            
-            elif format.lower() == "json":
-                with open(output_file, 'w') as jsonfile:
-                    json.dump(data, jsonfile, indent=4)
-            
-            else:
+            if format.lower() not in EXPORT_FORMATS:
                 logger.error(f"Unsupported export format: {format}")
                 return False
             
-            logger.info(f"Data exported to {output_file} in {format} format")
+            # อ่านข้อมูลจาก store ทีละแถวและเขียนออกทันที (ไม่โหลดข้อมูลทั้งหมดเข้าหน่วยความจำ)
+            rows = self.store.iter_rows(start_date, end_date, camera_id)
+            exported = export_rows(rows, output_file, format)
+            
+            logger.info(f"Exported {exported} row(s) to {output_file} in {format} format")
             return True
         
         except Exception as e:
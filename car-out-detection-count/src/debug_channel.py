@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Debug Channel Module
+โมดูลบันทึกข้อมูล debug รายเฟรมแบบสุ่มตัวอย่าง (ทุก N เฟรม) ผ่าน logger ระดับ DEBUG
+เมื่อปิดใช้งาน ค่าใช้จ่ายเหลือเพียงการตรวจสอบ attribute หนึ่งครั้งต่อเฟรม
+"""
+
+from loguru import logger
+
+
+class DebugChannel:
+    """Level-gated, per-frame sampled diagnostics for the frame loop"""
+
+    def __init__(self, config, name):
+        """
+        Args:
+            config (dict): Configuration dictionary (ใช้ logging.debug_trace)
+            name (str): ชื่อของส่วนที่บันทึก (แสดงหน้าข้อความ)
+        """
+        self.name = name
+        self._frames = 0
+        logging_config = config.get("logging", {})
+        settings = logging_config.get("debug_trace", {})
+        # ข้อความระดับ DEBUG จะถูกทิ้งอยู่แล้วถ้า log_level สูงกว่า จึงปิดทั้งช่องทางตั้งแต่ต้น
+        level = str(logging_config.get("log_level", "INFO")).upper()
+        self.enabled = bool(settings.get("enabled", False)) and level in ("TRACE", "DEBUG")
+        self.sample_every = max(1, int(settings.get("sample_every", 100)))
+
+    def sample(self):
+        """
+        เรียกครั้งเดียวต่อเฟรม เพื่อเลือกว่าเฟรมนี้จะบันทึกข้อมูล debug หรือไม่
+        (บันทึกทั้งเฟรม เพื่อให้ข้อความของเฟรมเดียวกันครบ)
+
+        Returns:
+            bool: True ถ้าควรบันทึกเฟรมนี้
+        """
+        if not self.enabled:
+            return False
+        self._frames += 1
+        return self._frames % self.sample_every == 0
+
+    def log(self, message, *args, **kwargs):
+        """
+        บันทึกข้อความระดับ DEBUG (format แบบ loguru "{}" จึงไม่สร้างข้อความถ้า level สูงกว่า DEBUG)
+
+        Args:
+            message (str): ข้อความ
+        """
+        logger.opt(depth=1).debug(f"[{self.name}] {message}", *args, **kwargs)
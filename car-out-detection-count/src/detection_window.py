@@ -130,9 +130,6 @@ class DetectionWindow(QMainWindow):
             # Detect vehicles
             detections = self.vehicle_detector.detect(frame)
             
-            # Debug
-            print(f"Detected {len(detections)} vehicles")
-            
             # Draw detections
             if detections is not None:
                 display_frame = self.vehicle_detector.draw_detections(display_frame, detections)
@@ -144,16 +141,14 @@ class DetectionWindow(QMainWindow):
             if counts["new_counts"] > 0:
                 self.total_count += counts["new_counts"]
                 self.count_label.setText(f"จำนวนรถที่นับได้: {self.total_count}")
-                print(f"*** NEW VEHICLE COUNTED! Current total: {self.total_count} ***")
                 
                 # Log data
-                self.data_logger.log_vehicle_count({"total_count": self.total_count, "new_counts": counts["new_counts"]})
+                self.data_logger.log_vehicle_count(dict(counts, total_count=self.total_count))
             
             # Display frame
             self.display_frame(display_frame)
         
         except Exception as e:
-            print(f"Error processing frame: {e}")
             logger.exception(f"Error processing frame: {e}")
             self.count_label.setText(f"เกิดข้อผิดพลาด: {str(e)}")
     
@@ -192,4 +187,5 @@ class DetectionWindow(QMainWindow):
         self.close()
     
     def closeEvent(self, event):
-        """Handle window close event"""
\ No newline at end of file
+        """Handle window close event"""
+        self.data_logger.close()
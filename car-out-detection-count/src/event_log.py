@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Event Log Module
+โมดูลสำหรับบันทึกเหตุการณ์การข้ามเส้นแบบละเอียดลงไฟล์ไบนารีแบบ append-only
+"""
+
+import os
+import re
+import mmap
+import time
+import struct
+import bisect
+from datetime import datetime
+from loguru import logger
+
+from src.event_store import BackgroundWriter
+
+# รูปแบบไฟล์ event log (little-endian)
+# header (64 bytes): magic, version, ขนาด record, location_id, camera_id
+# record (24 bytes): timestamp, media_time_ms, track_id, total_count, confidence (0-255), class, direction, line_id
+EVENT_LOG_MAGIC = b"VDEL"
+EVENT_LOG_VERSION = 1
+_HEADER = struct.Struct("<4sHH28s28s")
+_RECORD = struct.Struct("<dIIIBBbB")
+
+# sidecar index: (timestamp, หมายเลข record) ทุก ๆ index_interval records
+_INDEX_ENTRY = struct.Struct("<dQ")
+
+# การเข้ารหัสทิศทางและ class ที่ไม่ทราบ
+_DIRECTION_CODES = {"unknown": 0, "up": 1, "down": -1}
+_DIRECTION_NAMES = {code: name for name, code in _DIRECTION_CODES.items()}
+_UNKNOWN_CLASS = 255
+
+
+class EventLog(BackgroundWriter):
+    """Fixed-width binary append log of line-crossing events with a time index"""
+
+    def __init__(self, path, location_id, camera_id, index_interval=256, **kwargs):
+        """
+        Initialize EventLog
+
+        Args:
+            path (str): Path ของไฟล์ event log
+            location_id (str): รหัสสถานที่ (เก็บครั้งเดียวใน header)
+            camera_id (str): รหัสกล้อง (เก็บครั้งเดียวใน header)
+            index_interval (int): จำนวน record ต่อหนึ่ง entry ใน sidecar index
+            **kwargs: พารามิเตอร์ของ BackgroundWriter
+        """
+        self.path = path
+        self.index_path = f"{path}.idx"
+        self.location_id = location_id
+        self.camera_id = camera_id
+        self.index_interval = max(1, int(index_interval))
+        self._file = None
+        self._index_file = None
+        self._record_count = 0
+        # ตรวจสอบ header ก่อนเริ่ม writer thread: ไฟล์ของกล้องอื่นหรือรูปแบบเก่าจะถูกย้ายออก แล้วเริ่มไฟล์ใหม่
+        # (ไม่หยุดการนับ เพราะ service ที่ restart วนซ้ำจะไม่นับเลย; การอ่านอย่างเดียวไม่เปลี่ยนไฟล์)
+        if (not kwargs.get("read_only") and os.path.isfile(self.path)
+                and os.path.getsize(self.path) >= _HEADER.size):
+            foreign = self._check_header()
+            if foreign is not None:
+                self._rotate(foreign)
+        super().__init__(name="event-log-writer", **kwargs)
+
+    def append_event(self, timestamp, media_time_ms, track_id, total_count, confidence, cls, direction, line_id=0):
+        """
+        เพิ่มเหตุการณ์การข้ามเส้นเข้าคิว (ไม่บล็อก)
+
+        Args:
+            timestamp (float): เวลาของเหตุการณ์ (epoch)
+            media_time_ms (int): ตำแหน่งเวลาในวิดีโอ (มิลลิวินาที)
+            track_id (int): หมายเลข track ของรถ
+            total_count (int): ยอดรวมหลังนับเหตุการณ์นี้
+            confidence (float): ค่าความมั่นใจของการตรวจจับ (0-1)
+            cls (int): class ของรถ (-1 ถ้าไม่ทราบ)
+            direction (str): "up", "down" หรือ "unknown"
+            line_id (int): หมายเลขเส้นนับ
+
+        Returns:
+            bool: True ถ้าเข้าคิวได้
+        """
+        return self.append((
+            timestamp,
+            max(0, int(media_time_ms)) & 0xFFFFFFFF,
+            int(track_id) & 0xFFFFFFFF,
+            int(total_count),
+            min(255, max(0, int(round(confidence * 255)))),
+            _UNKNOWN_CLASS if cls is None or cls < 0 else int(cls),
+            _DIRECTION_CODES.get(direction, 0),
+            int(line_id)
+        ))
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        if os.path.isfile(self.path) and os.path.getsize(self.path) >= _HEADER.size:
+            # ตัด record ที่เขียนไม่ครบ (เช่น ไฟดับระหว่างเขียน)
+            size = os.path.getsize(self.path)
+            complete = _HEADER.size + (size - _HEADER.size) // _RECORD.size * _RECORD.size
+            if complete != size:
+                logger.warning(f"Truncating partial record at end of {self.path}")
+                os.truncate(self.path, complete)
+            self._file = open(self.path, 'ab')
+        else:
+            self._file = open(self.path, 'wb')
+            self._file.write(_HEADER.pack(EVENT_LOG_MAGIC, EVENT_LOG_VERSION, _RECORD.size,
+                                          self.location_id.encode('utf-8')[:28],
+                                          self.camera_id.encode('utf-8')[:28]))
+            self._file.flush()
+
+        self._record_count = (self._file.tell() - _HEADER.size) // _RECORD.size
+
+        # สร้าง index ใหม่ถ้าไม่ตรงกับจำนวน record ในไฟล์
+        expected_entries = (self._record_count + self.index_interval - 1) // self.index_interval
+        if self._index_entry_count() != expected_entries:
+            self.rebuild_index()
+        self._index_file = open(self.index_path, 'ab')
+
+    def _check_header(self):
+        """
+        Returns:
+            str: ชื่อที่ใช้ย้ายไฟล์ออก (camera_id ของไฟล์ หรือ "unsupported") หรือ None ถ้าเขียนต่อได้
+        """
+        with open(self.path, 'rb') as file:
+            magic, version, record_size, location_id, camera_id = _HEADER.unpack(file.read(_HEADER.size))
+        if magic != EVENT_LOG_MAGIC or version != EVENT_LOG_VERSION or record_size != _RECORD.size:
+            logger.error(f"Unsupported event log file: {self.path}")
+            return "unsupported"
+        file_camera_id = camera_id.rstrip(b"\0").decode('utf-8', errors='replace')
+        if file_camera_id != self.camera_id.encode('utf-8')[:28].decode('utf-8', errors='ignore'):
+            logger.error(f"Event log {self.path} belongs to camera {file_camera_id}, not {self.camera_id}")
+            return file_camera_id
+        return None
+
+    def _rotate(self, name):
+        """ย้ายไฟล์ event log (และ index) ออกเป็น events.<name>.bin เพื่อเริ่มไฟล์ใหม่โดยไม่ลบข้อมูลเดิม"""
+        root, ext = os.path.splitext(self.path)
+        name = re.sub(r"[^\w.-]", "_", name) or "unknown"
+        target = f"{root}.{name}{ext}"
+        if os.path.exists(target):
+            target = f"{root}.{name}.{int(time.time())}{ext}"
+        os.replace(self.path, target)
+        if os.path.isfile(self.index_path):
+            os.replace(self.index_path, f"{target}.idx")
+        logger.warning(f"Moved {self.path} to {target}; starting a new event log for camera {self.camera_id}")
+
+    def last_track_id(self):
+        """
+        Returns:
+            int: หมายเลข track ของเหตุการณ์ล่าสุดในไฟล์ หรือ None ถ้าไม่มีเหตุการณ์
+        """
+        if not os.path.isfile(self.path):
+            return None
+        size = os.path.getsize(self.path)
+        count = (size - _HEADER.size) // _RECORD.size if size > _HEADER.size else 0
+        if count == 0:
+            return None
+        with open(self.path, 'rb') as file:
+            file.seek(_HEADER.size + (count - 1) * _RECORD.size)
+            return _RECORD.unpack(file.read(_RECORD.size))[2]
+
+    def _write_batch(self, batch):
+        data = bytearray()
+        index_entries = bytearray()
+        for record in batch:
+            if self._record_count % self.index_interval == 0:
+                index_entries += _INDEX_ENTRY.pack(record[0], self._record_count)
+            data += _RECORD.pack(*record)
+            self._record_count += 1
+
+        self._file.write(data)
+        self._file.flush()
+        if index_entries:
+            self._index_file.write(index_entries)
+            self._index_file.flush()
+
+    def _sync(self):
+        os.fsync(self._file.fileno())
+        os.fsync(self._index_file.fileno())
+
+    def _close(self):
+        for handle in (self._file, self._index_file):
+            if handle is not None:
+                handle.close()
+        self._file = None
+        self._index_file = None
+
+    def _index_entry_count(self):
+        if not os.path.isfile(self.index_path):
+            return 0
+        return os.path.getsize(self.index_path) // _INDEX_ENTRY.size
+
+    def rebuild_index(self):
+        """สร้าง sidecar index ใหม่จากไฟล์ event log (ไฟล์มี record ขนาดคงที่จึงอ่านได้เร็ว)"""
+        entries = bytearray()
+        with open(self.path, 'rb') as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                count = (len(data) - _HEADER.size) // _RECORD.size
+                for record_no in range(0, count, self.index_interval):
+                    (timestamp,) = struct.unpack_from("<d", data, _HEADER.size + record_no * _RECORD.size)
+                    entries += _INDEX_ENTRY.pack(timestamp, record_no)
+
+        with open(self.index_path, 'wb') as file:
+            file.write(entries)
+        logger.info(f"Rebuilt event log index with {len(entries) // _INDEX_ENTRY.size} entries")
+
+    def iter_range(self, start=None, end=None):
+        """
+        อ่านเหตุการณ์ในช่วงเวลาที่กำหนด โดยใช้ binary search บน index แล้วอ่านผ่าน mmap
+
+        Args:
+            start (float, optional): เวลาเริ่มต้น (epoch, รวม)
+            end (float, optional): เวลาสิ้นสุด (epoch, รวม)
+
+        Yields:
+            dict: ข้อมูลเหตุการณ์
+        """
+        if not os.path.isfile(self.path) or os.path.getsize(self.path) <= _HEADER.size:
+            return
+
+        first_record = 0
+        if start is not None and os.path.isfile(self.index_path):
+            with open(self.index_path, 'rb') as file:
+                raw = file.read()
+            index = list(_INDEX_ENTRY.iter_unpack(raw[:len(raw) // _INDEX_ENTRY.size * _INDEX_ENTRY.size]))
+            # entry สุดท้ายที่มีเวลาน้อยกว่า start
+            position = bisect.bisect_left([timestamp for timestamp, _ in index], start)
+            if position > 0:
+                first_record = index[position - 1][1]
+
+        with open(self.path, 'rb') as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                _, _, _, location_id, camera_id = _HEADER.unpack_from(data, 0)
+                ids = (location_id.rstrip(b"\0").decode('utf-8'), camera_id.rstrip(b"\0").decode('utf-8'))
+                count = (len(data) - _HEADER.size) // _RECORD.size
+                for record_no in range(first_record, count):
+                    record = _RECORD.unpack_from(data, _HEADER.size + record_no * _RECORD.size)
+                    timestamp = record[0]
+                    if start is not None and timestamp < start:
+                        continue
+                    if end is not None and timestamp > end:
+                        break
+                    yield self._to_event(record, *ids)
+
+    @staticmethod
+    def _to_event(record, location_id, camera_id):
+        timestamp, media_time_ms, track_id, total_count, confidence, cls, direction, line_id = record
+        return {
+            "timestamp": datetime.fromtimestamp(timestamp),
+            "media_time_ms": media_time_ms,
+            "track_id": track_id,
+            "total_count": total_count,
+            "confidence": confidence / 255,
+            "class": -1 if cls == _UNKNOWN_CLASS else cls,
+            "direction": _DIRECTION_NAMES.get(direction, "unknown"),
+            "line_id": line_id,
+            "location_id": location_id,
+            "camera_id": camera_id
+        }
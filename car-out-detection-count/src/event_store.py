@@ -0,0 +1,608 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Event Store Module
+โมดูลสำหรับเขียนข้อมูลการนับลงดิสก์แบบ buffer ผ่าน background thread
+"""
+
+import io
+import os
+import csv
+import time
+import queue
+import atexit
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from loguru import logger
+
+# คอลัมน์ของไฟล์ log การนับรถ
+CSV_FIELDNAMES = ['timestamp', 'date', 'time', 'location_id', 'camera_id', 'count', 'total_count']
+
+# นโยบาย fsync ที่รองรับ
+FSYNC_POLICIES = ("batch", "interval", "never")
+
+# ระดับ synchronous ของ SQLite ตามนโยบาย fsync
+_SQLITE_SYNCHRONOUS = {"batch": "FULL", "interval": "NORMAL", "never": "OFF"}
+
+
+class _FlushRequest:
+    """Marker placed in the write queue to request a flush"""
+
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class BackgroundWriter:
+    """Base class for stores that batch writes on a background thread"""
+
+    def __init__(self, buffer_size=64, flush_interval=1.0, fsync_policy="interval",
+                 fsync_interval=5.0, max_queue=10000, name="event-writer", read_only=False):
+        """
+        Initialize BackgroundWriter
+
+        Args:
+            buffer_size (int): จำนวนรายการสูงสุดใน buffer ก่อนเขียนลงดิสก์
+            flush_interval (float): ระยะเวลาสูงสุด (วินาที) ที่ข้อมูลค้างใน buffer
+            fsync_policy (str): "batch" (fsync ทุกครั้งที่เขียน), "interval" หรือ "never"
+            fsync_interval (float): ระยะห่าง (วินาที) ระหว่าง fsync เมื่อใช้นโยบาย "interval"
+            max_queue (int): ขนาดคิวสูงสุด ถ้าดิสก์ค้างจนคิวเต็ม ข้อมูลใหม่จะถูกทิ้ง
+            name (str): ชื่อ thread
+            read_only (bool): เปิดเพื่ออ่านอย่างเดียว (ไม่เปิดไฟล์เพื่อเขียนและไม่เริ่ม writer thread)
+                ใช้กับคำสั่งที่อ่านข้อมูลขณะที่ service ยังเขียนไฟล์เดียวกันอยู่
+        """
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"Unsupported fsync policy: {fsync_policy}")
+
+        self.buffer_size = max(1, int(buffer_size))
+        self.flush_interval = flush_interval
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+        self.dropped = 0
+        self.read_only = read_only
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._last_fsync = time.monotonic()
+        self._closed = read_only
+        self._thread = None
+        if read_only:
+            return
+        self._thread = threading.Thread(target=self._writer_loop, name=name, daemon=True)
+        self._thread.start()
+
+        # flush ข้อมูลที่ค้างเมื่อโปรแกรมจบการทำงาน แม้จะไม่ได้เรียก close()
+        atexit.register(self.close)
+
+    def append(self, row):
+        """
+        เพิ่มข้อมูลเข้าคิวโดยไม่บล็อก (ไม่รอดิสก์)
+
+        Args:
+            row: ข้อมูลหนึ่งรายการ
+
+        Returns:
+            bool: True ถ้าเข้าคิวได้, False ถ้าคิวเต็มและข้อมูลถูกทิ้ง (หรือเปิดแบบอ่านอย่างเดียว)
+        """
+        if self.read_only:
+            return False
+        try:
+            self._queue.put_nowait(row)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                logger.error(f"Write queue full, dropped {self.dropped} record(s)")
+            return False
+
+    def flush(self, timeout=None):
+        """
+        บังคับเขียนข้อมูลที่ค้างอยู่ทั้งหมดลงดิสก์และรอจนเสร็จ
+
+        Args:
+            timeout (float, optional): เวลารอสูงสุด (วินาที) รวมเวลารอที่ว่างในคิว
+
+        Returns:
+            bool: True ถ้าเขียนเสร็จภายในเวลาที่กำหนด
+        """
+        if self._closed:
+            return True
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        request = _FlushRequest()
+        try:
+            # คิวเต็มเมื่อดิสก์ค้าง: รอที่ว่างไม่เกิน timeout แทนการบล็อกไม่มีกำหนด
+            self._queue.put(request, timeout=timeout)
+        except queue.Full:
+            logger.warning(f"Write queue still full after {timeout}s, flush skipped")
+            return False
+        remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+        return request.done.wait(remaining)
+
+    def close(self, timeout=10):
+        """
+        เขียนข้อมูลที่ค้างทั้งหมด, fsync และปิด store
+
+        Args:
+            timeout (float): เวลารอสูงสุด (วินาที)
+        """
+        if self._closed:
+            return
+
+        self.flush(timeout)
+        self._closed = True
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            logger.error(f"Write queue still full after {timeout}s, closing without writing "
+                         f"{self._queue.qsize()} queued record(s)")
+            return
+        self._thread.join(timeout)
+
+    def _writer_loop(self):
+        """Background loop ที่รวบรวมข้อมูลเป็น batch และเขียนลงดิสก์"""
+        try:
+            self._open()
+        except Exception as e:
+            logger.error(f"Error opening store: {e}")
+
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                # ครบเวลา flush_interval แล้ว
+                self._write(batch, sync=False)
+                batch = []
+                deadline = None
+                continue
+
+            if item is None:
+                self._write(batch, sync=True)
+                self._close_store()
+                return
+
+            if isinstance(item, _FlushRequest):
+                self._write(batch, sync=self.fsync_policy != "never")
+                batch = []
+                deadline = None
+                item.done.set()
+                continue
+
+            batch.append(item)
+            if deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+            if len(batch) >= self.buffer_size:
+                self._write(batch, sync=False)
+                batch = []
+                deadline = None
+
+    def _write(self, batch, sync):
+        """เขียน batch และ fsync ตามนโยบายที่กำหนด"""
+        try:
+            if batch:
+                self._write_batch(batch)
+
+            now = time.monotonic()
+            if self.fsync_policy == "never":
+                return
+            if sync or self.fsync_policy == "batch" or now - self._last_fsync >= self.fsync_interval:
+                self._sync()
+                self._last_fsync = now
+
+        except Exception as e:
+            logger.error(f"Error writing {len(batch)} record(s): {e}")
+
+    def _close_store(self):
+        try:
+            self._close()
+        except Exception as e:
+            logger.error(f"Error closing store: {e}")
+
+    # เมธอดที่ subclass ต้อง implement
+    def _open(self):
+        raise NotImplementedError
+
+    def _write_batch(self, batch):
+        raise NotImplementedError
+
+    def _sync(self):
+        raise NotImplementedError
+
+    def _close(self):
+        raise NotImplementedError
+
+    def iter_rows(self, start_date=None, end_date=None, camera_id=None):
+        """
+        อ่านข้อมูลการนับในช่วงวันที่ที่กำหนดทีละแถว
+
+        Args:
+            start_date (str, optional): วันที่เริ่มต้น "YYYY-MM-DD"
+            end_date (str, optional): วันที่สิ้นสุด "YYYY-MM-DD"
+            camera_id (str, optional): กรองเฉพาะกล้องที่กำหนด
+
+        Yields:
+            dict: ข้อมูลหนึ่งแถวตาม CSV_FIELDNAMES
+        """
+        raise NotImplementedError
+
+    def daily_summary(self, date, camera_id=None):
+        """
+        สรุปจำนวนรถรายชั่วโมงของวันที่กำหนด
+
+        Args:
+            date (str): วันที่ "YYYY-MM-DD"
+            camera_id (str, optional): กรองเฉพาะกล้องที่กำหนด
+
+        Returns:
+            tuple: (total_count, {"HH": count})
+        """
+        total_count = 0
+        hourly_counts = {}
+        for row in self.iter_rows(date, date, camera_id):
+            total_count += row['count']
+            hour = row['time'][:2]
+            hourly_counts[hour] = hourly_counts.get(hour, 0) + row['count']
+        return total_count, hourly_counts
+
+    def last_total_count(self):
+        """
+        ดึงยอดรวมล่าสุดที่บันทึกไว้
+
+        Returns:
+            int: ยอดรวมล่าสุด หรือ None ถ้าไม่มีข้อมูล
+        """
+        raise NotImplementedError
+
+
+class CsvEventStore(BackgroundWriter):
+    """Append-only CSV event store with a persistent file handle"""
+
+    def __init__(self, path, fieldnames=CSV_FIELDNAMES, **kwargs):
+        """
+        Initialize CsvEventStore
+
+        Args:
+            path (str): Path ของไฟล์ CSV
+            fieldnames (list): ชื่อคอลัมน์
+            **kwargs: พารามิเตอร์ของ BackgroundWriter
+        """
+        self.path = path
+        self.fieldnames = fieldnames
+        self._file = None
+        self._writer = None
+        super().__init__(name="csv-writer", **kwargs)
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._file = open(self.path, 'a', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._file)
+
+        # เขียนหัวคอลัมน์ถ้าเป็นไฟล์ใหม่
+        if self._file.tell() == 0:
+            self._writer.writerow(self.fieldnames)
+            self._file.flush()
+
+    def _write_batch(self, batch):
+        self._writer.writerows([row[name] for name in self.fieldnames] for row in batch)
+        self._file.flush()
+
+    def _sync(self):
+        os.fsync(self._file.fileno())
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def iter_rows(self, start_date=None, end_date=None, camera_id=None):
+        # ไฟล์ log เขียนต่อท้ายตามลำดับเวลา จึงค้นหาตำแหน่งเริ่มต้นด้วย binary search
+        # และหยุดอ่านทันทีเมื่อเลยวันที่สิ้นสุด แทนการตรวจสอบวันที่ทุกแถวทั้งไฟล์
+        if not os.path.isfile(self.path):
+            return
+
+        date_index = self.fieldnames.index('date')
+        with open(self.path, 'rb') as file:
+            header = file.readline()
+            if start_date:
+                self._seek_date(file, len(header), start_date.encode('ascii'), date_index)
+
+            text = io.TextIOWrapper(file, encoding='utf-8', newline='')
+            for fields in csv.reader(text):
+                if len(fields) != len(self.fieldnames):
+                    continue
+                row = dict(zip(self.fieldnames, fields))
+
+                # กรองตามช่วงวันที่และกล้อง
+                if start_date and row['date'] < start_date:
+                    continue
+                if end_date and row['date'] > end_date:
+                    break
+                if camera_id and row['camera_id'] != camera_id:
+                    continue
+
+                # แปลงประเภทข้อมูล
+                row['count'] = int(row['count'])
+                row['total_count'] = int(row['total_count'])
+                yield row
+
+    @staticmethod
+    def _seek_date(file, data_start, start_date, date_index, block_size=65536):
+        """เลื่อนตำแหน่งไฟล์ไปยังบรรทัดแรกที่อาจมีวันที่ >= start_date"""
+        file.seek(0, os.SEEK_END)
+        low, high = data_start, file.tell()
+
+        while high - low > block_size:
+            middle = (low + high) // 2
+            file.seek(middle)
+            file.readline()  # ข้ามบรรทัดที่ถูกตัดกลาง
+            line = file.readline()
+            fields = line.split(b',')
+            if not line or len(fields) <= date_index or fields[date_index] >= start_date:
+                high = middle
+            else:
+                low = middle
+
+        file.seek(low)
+        if low > data_start:
+            file.readline()
+
+    def last_total_count(self):
+        if not os.path.isfile(self.path):
+            return None
+
+        # อ่านเฉพาะท้ายไฟล์แทนการอ่านทั้งไฟล์
+        with open(self.path, 'rb') as file:
+            file.seek(0, os.SEEK_END)
+            size = file.tell()
+            file.seek(max(0, size - 4096))
+            lines = file.read().decode('utf-8', errors='ignore').splitlines()
+
+        total_index = self.fieldnames.index('total_count')
+        for line in reversed(lines):
+            fields = next(csv.reader([line]), [])
+            if len(fields) == len(self.fieldnames) and fields[total_index].isdigit():
+                return int(fields[total_index])
+        return None
+
+
+class SqliteEventStore(BackgroundWriter):
+    """SQLite (WAL mode) event store with batched inserts and indexed range queries"""
+
+    _SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS events ("
+        " id INTEGER PRIMARY KEY,"
+        " timestamp TEXT NOT NULL,"
+        " location_id TEXT NOT NULL,"
+        " camera_id TEXT NOT NULL,"
+        " count INTEGER NOT NULL,"
+        " total_count INTEGER NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS idx_events_camera_timestamp ON events (camera_id, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_events_timestamp ON events (timestamp)",
+    )
+
+    _INSERT = "INSERT INTO events (timestamp, location_id, camera_id, count, total_count) VALUES (?, ?, ?, ?, ?)"
+
+    def __init__(self, path, **kwargs):
+        """
+        Initialize SqliteEventStore
+
+        Args:
+            path (str): Path ของไฟล์ฐานข้อมูล SQLite
+            **kwargs: พารามิเตอร์ของ BackgroundWriter
+        """
+        self.path = path
+        self._conn = None
+        super().__init__(name="sqlite-writer", **kwargs)
+
+    def _connect(self):
+        """เปิด connection ใหม่ (แต่ละ thread ใช้ connection ของตัวเอง)"""
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = self._connect()
+        self._conn.execute(f"PRAGMA synchronous={_SQLITE_SYNCHRONOUS[self.fsync_policy]}")
+        with self._conn:
+            for statement in self._SCHEMA:
+                self._conn.execute(statement)
+
+    def _write_batch(self, batch):
+        # insert ทั้ง batch ใน transaction เดียว
+        with self._conn:
+            self._conn.executemany(self._INSERT, [
+                (row['timestamp'], row['location_id'], row['camera_id'], row['count'], row['total_count'])
+                for row in batch
+            ])
+
+    def _sync(self):
+        # ย้ายข้อมูลจาก WAL เข้าไฟล์หลักโดยไม่บล็อก reader
+        self._conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def _close(self):
+        if self._conn is not None:
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self._conn.close()
+            self._conn = None
+
+    def _range_query(self, columns, start_date, end_date, camera_id, suffix=""):
+        """สร้าง query แบบ range scan บน index (camera_id, timestamp)"""
+        conditions = []
+        params = []
+        if camera_id:
+            conditions.append("camera_id = ?")
+            params.append(camera_id)
+        if start_date:
+            conditions.append("timestamp >= ?")
+            params.append(f"{start_date} 00:00:00")
+        if end_date:
+            # ใช้วันถัดไปเป็นขอบบนเพื่อให้ครอบคลุมทั้งวัน
+            next_day = (datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+            conditions.append("timestamp < ?")
+            params.append(f"{next_day} 00:00:00")
+
+        query = f"SELECT {columns} FROM events"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        return query + suffix, params
+
+    def iter_rows(self, start_date=None, end_date=None, camera_id=None):
+        if not os.path.isfile(self.path):
+            return
+
+        query, params = self._range_query(
+            "timestamp, location_id, camera_id, count, total_count",
+            start_date, end_date, camera_id, " ORDER BY timestamp, id"
+        )
+
+        conn = self._connect()
+        try:
+            cursor = conn.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(1000)
+                if not rows:
+                    break
+                for timestamp, location_id, row_camera_id, count, total_count in rows:
+                    yield {
+                        'timestamp': timestamp,
+                        'date': timestamp[:10],
+                        'time': timestamp[11:],
+                        'location_id': location_id,
+                        'camera_id': row_camera_id,
+                        'count': count,
+                        'total_count': total_count
+                    }
+        finally:
+            conn.close()
+
+    def daily_summary(self, date, camera_id=None):
+        if not os.path.isfile(self.path):
+            return 0, {}
+
+        query, params = self._range_query(
+            "substr(timestamp, 12, 2) AS hour, SUM(count)",
+            date, date, camera_id, " GROUP BY hour ORDER BY hour"
+        )
+
+        conn = self._connect()
+        try:
+            hourly_counts = dict(conn.execute(query, params).fetchall())
+        finally:
+            conn.close()
+        return sum(hourly_counts.values()), hourly_counts
+
+    def last_total_count(self):
+        if not os.path.isfile(self.path):
+            return None
+
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT total_count FROM events ORDER BY id DESC LIMIT 1").fetchone()
+        finally:
+            conn.close()
+        return row[0] if row else None
+
+
+def create_event_store(config, read_only=False):
+    """
+    สร้าง event store ตาม backend ที่กำหนดใน config (logging.backend)
+
+    Args:
+        config (dict): Configuration dictionary
+        read_only (bool): เปิดเพื่ออ่านอย่างเดียว (ดู BackgroundWriter)
+
+    Returns:
+        BackgroundWriter: CsvEventStore หรือ SqliteEventStore
+    """
+    logging_config = config["logging"]
+    backend = logging_config.get("backend", "csv").lower()
+    options = {
+        "buffer_size": logging_config.get("buffer_size", 64),
+        "flush_interval": logging_config.get("flush_interval", 1.0),
+        "fsync_policy": logging_config.get("fsync", "interval"),
+        "fsync_interval": logging_config.get("fsync_interval", 5.0),
+        "read_only": read_only
+    }
+
+    if backend == "csv":
+        return CsvEventStore(logging_config["log_file"], **options)
+    elif backend == "sqlite":
+        return SqliteEventStore(logging_config.get("sqlite_path", "./logs/vehicle_counts/vehicle_counts.db"), **options)
+    else:
+        raise ValueError(f"Unsupported logging backend: {backend}")
+
+
+def import_csv_to_sqlite(csv_path, db_path, batch_size=5000):
+    """
+    นำเข้าไฟล์ log CSV เดิมเข้าฐานข้อมูล SQLite แบบ streaming (ใช้หน่วยความจำคงที่)
+
+    นำเข้าทั้งไฟล์ใน transaction เดียว (ล้มเหลวกลางทาง = ไม่มีแถวใดถูกนำเข้า) และปฏิเสธถ้าฐานข้อมูล
+    มีข้อมูลของกล้องเดียวกันในช่วงเวลาของไฟล์อยู่แล้ว จึงรันซ้ำได้โดยยอดนับไม่ซ้ำซ้อน
+
+    Args:
+        csv_path (str): Path ของไฟล์ CSV
+        db_path (str): Path ของไฟล์ฐานข้อมูล SQLite
+        batch_size (int): จำนวนแถวต่อการเขียนหนึ่งครั้ง
+
+    Returns:
+        int: จำนวนแถวที่นำเข้า
+
+    Raises:
+        ValueError: ถ้าฐานข้อมูลมีข้อมูลของกล้องเดียวกันในช่วงเวลาของไฟล์อยู่แล้ว
+    """
+    directory = os.path.dirname(db_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        with conn:
+            for statement in SqliteEventStore._SCHEMA:
+                conn.execute(statement)
+
+        # อ่านเข้าตารางชั่วคราวก่อน แล้วตรวจช่วงเวลาที่ซ้อนกับข้อมูลเดิมก่อนย้ายเข้า events
+        conn.execute("CREATE TEMP TABLE import_events "
+                     "(timestamp TEXT, location_id TEXT, camera_id TEXT, count INTEGER, total_count INTEGER)")
+        with conn:
+            with open(csv_path, 'r', newline='', encoding='utf-8') as csvfile:
+                batch = []
+                for row in csv.DictReader(csvfile):
+                    batch.append((row['timestamp'], row['location_id'], row['camera_id'],
+                                  int(row['count']), int(row['total_count'])))
+                    if len(batch) >= batch_size:
+                        conn.executemany("INSERT INTO import_events VALUES (?, ?, ?, ?, ?)", batch)
+                        batch = []
+                if batch:
+                    conn.executemany("INSERT INTO import_events VALUES (?, ?, ?, ?, ?)", batch)
+
+            overlaps = conn.execute(
+                "SELECT camera_id, first, last FROM ("
+                " SELECT camera_id, MIN(timestamp) AS first, MAX(timestamp) AS last"
+                " FROM import_events GROUP BY camera_id) AS imported"
+                " WHERE EXISTS (SELECT 1 FROM events WHERE events.camera_id = imported.camera_id"
+                " AND events.timestamp BETWEEN imported.first AND imported.last)"
+            ).fetchall()
+            if overlaps:
+                ranges = ", ".join(f"{camera} {first} - {last}" for camera, first, last in overlaps)
+                raise ValueError(f"{db_path} already has events for {ranges}; {csv_path} was not imported")
+
+            imported = conn.execute(
+                "INSERT INTO events (timestamp, location_id, camera_id, count, total_count) "
+                "SELECT timestamp, location_id, camera_id, count, total_count FROM import_events"
+            ).rowcount
+
+        logger.info(f"Imported {imported} row(s) from {csv_path} into {db_path}")
+        return imported
+    finally:
+        conn.close()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Exporter Module
+โมดูลสำหรับส่งออกข้อมูลการนับแบบ streaming (CSV, JSON, JSON Lines, Parquet)
+"""
+
+import os
+import csv
+import json
+from datetime import datetime
+from loguru import logger
+
+from src.event_store import CSV_FIELDNAMES
+
+# รูปแบบการส่งออกที่รองรับ
+EXPORT_FORMATS = ("csv", "json", "jsonl", "parquet")
+
+
+def export_rows(rows, output_path, format="csv", chunk_size=50000):
+    """
+    ส่งออกข้อมูลทีละแถวโดยไม่โหลดข้อมูลทั้งหมดเข้าหน่วยความจำ
+
+    Args:
+        rows (iterable): ข้อมูลแต่ละแถวตาม CSV_FIELDNAMES
+        output_path (str): ไฟล์ปลายทาง (หรือไดเรกทอรีสำหรับ parquet)
+        format (str): "csv", "json", "jsonl" หรือ "parquet"
+        chunk_size (int): จำนวนแถวต่อ record batch (เฉพาะ parquet)
+
+    Returns:
+        int: จำนวนแถวที่ส่งออก
+    """
+    format = format.lower()
+    if format == "csv":
+        return _export_csv(rows, output_path)
+    elif format == "json":
+        return _export_json(rows, output_path)
+    elif format == "jsonl":
+        return _export_jsonl(rows, output_path)
+    elif format == "parquet":
+        return _export_parquet(rows, output_path, chunk_size)
+    raise ValueError(f"Unsupported export format: {format}")
+
+
+def _export_csv(rows, output_path):
+    exported = 0
+    with open(output_path, 'w', newline='', encoding='utf-8') as csvfile:
+        csv_writer = csv.DictWriter(csvfile, fieldnames=CSV_FIELDNAMES)
+        csv_writer.writeheader()
+        for row in rows:
+            csv_writer.writerow(row)
+            exported += 1
+    return exported
+
+
+def _export_json(rows, output_path):
+    # เขียน JSON array ทีละรายการแทนการ json.dump ทั้ง list
+    exported = 0
+    with open(output_path, 'w', encoding='utf-8') as jsonfile:
+        jsonfile.write("[")
+        for row in rows:
+            jsonfile.write(",\n" if exported else "\n")
+            jsonfile.write(json.dumps(row, separators=(",", ":")))
+            exported += 1
+        jsonfile.write("\n]\n")
+    return exported
+
+
+def _export_jsonl(rows, output_path):
+    exported = 0
+    with open(output_path, 'w', encoding='utf-8') as jsonfile:
+        for row in rows:
+            jsonfile.write(json.dumps(row, separators=(",", ":")))
+            jsonfile.write("\n")
+            exported += 1
+    return exported
+
+
+def _export_parquet(rows, output_dir, chunk_size):
+    """
+    ส่งออกเป็น Parquet แบบแบ่ง partition ตามวันที่และกล้อง (hive-style)
+    output_dir/date=YYYY-MM-DD/camera_id=CAM/part-N.parquet
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        logger.error("pyarrow not installed. Please install it with: pip install pyarrow")
+        raise ImportError("pyarrow not installed")
+
+    # date และ camera_id เป็น partition key จึงไม่เก็บซ้ำในไฟล์
+    schema = pa.schema([
+        ("timestamp", pa.timestamp("s")),
+        ("location_id", pa.dictionary(pa.int32(), pa.string())),
+        ("count", pa.int32()),
+        ("total_count", pa.int64())
+    ])
+
+    writers = {}
+    buffers = {}
+    part_numbers = {}
+    current_date = None
+    exported = 0
+
+    def flush_partition(key):
+        buffer = buffers.pop(key, None)
+        if not buffer:
+            return
+        if key not in writers:
+            date, camera_id = key
+            partition_dir = os.path.join(output_dir, f"date={date}", f"camera_id={camera_id}")
+            os.makedirs(partition_dir, exist_ok=True)
+            # ถ้า partition ถูกเปิดซ้ำ (ข้อมูลไม่เรียงตามวัน) ให้เขียนไฟล์ part ใหม่แทนการเขียนทับ
+            part = part_numbers.get(key, 0)
+            part_numbers[key] = part + 1
+            writers[key] = pq.ParquetWriter(os.path.join(partition_dir, f"part-{part}.parquet"),
+                                            schema, compression="zstd")
+        batch = pa.record_batch([
+            pa.array(buffer["timestamp"], pa.timestamp("s")),
+            pa.array(buffer["location_id"], pa.string()).dictionary_encode().cast(schema.field("location_id").type),
+            pa.array(buffer["count"], pa.int32()),
+            pa.array(buffer["total_count"], pa.int64())
+        ], schema=schema)
+        writers[key].write_batch(batch)
+
+    def close_partitions():
+        for key in list(buffers):
+            flush_partition(key)
+        for writer in writers.values():
+            writer.close()
+        writers.clear()
+
+    try:
+        for row in rows:
+            # ข้อมูลเรียงตามเวลา เมื่อขึ้นวันใหม่จึงปิด partition ของวันก่อนหน้าได้
+            if row['date'] != current_date:
+                close_partitions()
+                current_date = row['date']
+
+            key = (row['date'], row['camera_id'])
+            buffer = buffers.get(key)
+            if buffer is None:
+                buffer = buffers[key] = {"timestamp": [], "location_id": [], "count": [], "total_count": []}
+            buffer["timestamp"].append(datetime.strptime(row['timestamp'], "%Y-%m-%d %H:%M:%S"))
+            buffer["location_id"].append(row['location_id'])
+            buffer["count"].append(row['count'])
+            buffer["total_count"].append(row['total_count'])
+            exported += 1
+
+            if len(buffer["count"]) >= chunk_size:
+                flush_partition(key)
+    finally:
+        close_partitions()
+
+    return exported
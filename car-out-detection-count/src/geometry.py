@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Geometry Module
+โมดูลเก็บตำแหน่งเส้นนับและ ROI แบบสัดส่วนของภาพ (0-1) และแปลงเป็นพิกัด pixel ครั้งเดียวต่อขนาดเฟรม
+เพื่อให้การนับ การกรอง ROI การแบ่งช่อง และการวาดบนเฟรมใช้เส้นเดียวกันทุกความละเอียด
+"""
+
+import math
+from dataclasses import dataclass
+
+import numpy as np
+
+# ขนาดภาพอ้างอิงของพิกัด pixel ในไฟล์การตั้งค่า (เมื่อไม่ได้กำหนดพิกัดแบบร้อยละ)
+REFERENCE_SIZE = (1280, 720)
+
+
+def normalize_points(points, width, height):
+    """
+    แปลงพิกัด pixel เป็นสัดส่วนของภาพ
+
+    Args:
+        points (list): [[x, y], ...] ในพิกัด pixel
+        width (int): ความกว้างของภาพที่ใช้วัดพิกัด
+        height (int): ความสูงของภาพที่ใช้วัดพิกัด
+
+    Returns:
+        tuple: ((x, y), ...) ในช่วง 0-1
+    """
+    return tuple((float(x) / width, float(y) / height) for x, y in points)
+
+
+@dataclass(frozen=True, eq=False)
+class PixelGeometry:
+    """Counting line and ROI of a SceneGeometry mapped to one frame size"""
+
+    __slots__ = ("width", "height", "line", "a", "b", "c", "norm", "side_normal", "side_offset",
+                 "roi", "roi_bounds")
+    width: int
+    height: int
+    line: tuple
+    a: int
+    b: int
+    c: int
+    norm: float
+    side_normal: np.ndarray
+    side_offset: float
+    roi: np.ndarray
+    roi_bounds: tuple
+
+    def distances(self, points):
+        """
+        ระยะแบบมีเครื่องหมายจากเส้นนับ (pixel) ของหลายจุดพร้อมกัน
+
+        Args:
+            points (numpy.ndarray): จุด N x 2
+
+        Returns:
+            numpy.ndarray: ระยะของแต่ละจุด
+        """
+        return points @ self.side_normal + self.side_offset
+
+    def sides(self, points):
+        """
+        Args:
+            points (numpy.ndarray): จุด N x 2
+
+        Returns:
+            numpy.ndarray: 1, -1 หรือ 0 (อยู่บนเส้น) ของแต่ละจุด
+        """
+        distances = self.distances(points)
+        return np.where(np.abs(distances) < 1e-9, 0, np.sign(distances)).astype(int)
+
+
+class SceneGeometry:
+    """Normalized counting line and ROI, converted to pixel arrays once per frame size"""
+
+    def __init__(self, line_percent, roi_percent=None, reference_size=REFERENCE_SIZE, roi_pixels=None):
+        """
+        Args:
+            line_percent (tuple): ((x1, y1), (x2, y2)) ในช่วง 0-1
+            roi_percent (tuple, optional): จุดของ ROI ในช่วง 0-1 (None = ไม่ใช้ ROI)
+            reference_size (tuple): (width, height) ของพิกัด pixel ในไฟล์การตั้งค่า
+            roi_pixels (tuple, optional): จุดของ ROI ในพิกัด pixel ที่ใช้ตรงๆ ทุกขนาดเฟรม (แทน roi_percent)
+        """
+        self.line_percent = tuple(tuple(point) for point in line_percent)
+        self.roi_percent = tuple(tuple(point) for point in roi_percent) if roi_percent else None
+        self.roi_pixels = tuple(tuple(point) for point in roi_pixels) if roi_pixels else None
+        self.reference_size = tuple(reference_size)
+        self._cache = {}
+
+    def with_line(self, line_percent):
+        """
+        Returns:
+            SceneGeometry: geometry เดิมที่เปลี่ยนเฉพาะเส้นนับ
+        """
+        return SceneGeometry(line_percent, self.roi_percent, self.reference_size, self.roi_pixels)
+
+    @property
+    def reference(self):
+        """PixelGeometry ที่ขนาดภาพอ้างอิง"""
+        return self.pixels(*self.reference_size)
+
+    def for_frame(self, frame):
+        """
+        Args:
+            frame (numpy.ndarray): เฟรม
+
+        Returns:
+            PixelGeometry: geometry ที่ขนาดของเฟรมนี้
+        """
+        height, width = frame.shape[:2]
+        return self.pixels(width, height)
+
+    def pixels(self, width, height):
+        """
+        Args:
+            width (int): ความกว้างของเฟรม
+            height (int): ความสูงของเฟรม
+
+        Returns:
+            PixelGeometry: geometry ที่ขนาดนี้ (คำนวณครั้งแรกแล้วเก็บไว้)
+        """
+        key = (int(width), int(height))
+        pixels = self._cache.get(key)
+        if pixels is None:
+            pixels = self._build(*key)
+            self._cache[key] = pixels
+        return pixels
+
+    def _build(self, width, height):
+        (x1, y1), (x2, y2) = [(int(round(x * width)), int(round(y * height))) for x, y in self.line_percent]
+        a = y2 - y1
+        b = x1 - x2
+        c = x2 * y1 - x1 * y2
+        norm = math.sqrt(a * a + b * b) or 1.0
+
+        roi = None
+        roi_bounds = None
+        if self.roi_pixels:
+            roi = np.array(self.roi_pixels, dtype=np.int32)
+        elif self.roi_percent:
+            roi = np.array([(round(x * width), round(y * height)) for x, y in self.roi_percent], dtype=np.int32)
+        if roi is not None:
+            roi.setflags(write=False)
+            # (x1, y1, x2, y2) แบบเดียวกับ cv2.boundingRect (x2, y2 = ค่าสูงสุด + 1)
+            (rx1, ry1), (rx2, ry2) = roi.min(axis=0), roi.max(axis=0) + 1
+            roi_bounds = (int(rx1), int(ry1), int(rx2), int(ry2))
+
+        side_normal = np.array([a / norm, b / norm])
+        side_normal.setflags(write=False)
+        return PixelGeometry(
+            width=width, height=height,
+            line=((x1, y1), (x2, y2)),
+            a=a, b=b, c=c, norm=norm,
+            side_normal=side_normal, side_offset=c / norm,
+            roi=roi, roi_bounds=roi_bounds
+        )
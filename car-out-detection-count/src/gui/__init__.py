@@ -367,6 +367,7 @@ class VehicleDetectionGUI(QMainWindow):
             
             # อัพเดทสถานะ
             self.total_count = 0
+            self.last_detections = []
             
         except Exception as e:
             logger.exception(f"Error in start_detection_view: {e}")
@@ -383,14 +384,21 @@ class VehicleDetectionGUI(QMainWindow):
                 self.detection_timer.stop()
                 return
             
-            # ตรวจจับรถยนต์
-            detections = self.vehicle_detector.detect(frame)
-            
-            # วาดกรอบการตรวจจับ
-            frame = self.vehicle_detector.draw_detections(frame, detections)
-            
-            # นับรถยนต์ที่ตัดผ่านเส้น
-            counts = self.line_counter.update(frame, detections)
+            # เฟรมซ้ำ (กล้องค้าง): ใช้ detections เดิม ไม่รันโมเดลและไม่นับซ้ำ
+            if self.video_processor.is_duplicate_frame(frame):
+                frame = self.vehicle_detector.draw_detections(frame, self.last_detections)
+                self.line_counter.draw_line(frame)
+                counts = {"new_counts": 0}
+            else:
+                # ตรวจจับรถยนต์
+                detections = self.vehicle_detector.detect(frame)
+                self.last_detections = detections
+                
+                # วาดกรอบการตรวจจับ
+                frame = self.vehicle_detector.draw_detections(frame, detections)
+                
+                # นับรถยนต์ที่ตัดผ่านเส้น
+                counts = self.line_counter.update(frame, detections)
             
             # อัพเดทการแสดงผลจำนวนนับ
             if counts["new_counts"] > 0:
@@ -398,7 +406,7 @@ class VehicleDetectionGUI(QMainWindow):
                 self.count_label.setText(f"จำนวนรถที่นับได้: {self.total_count}")
                 
                 # บันทึกข้อมูล
-                self.data_logger.log_vehicle_count({"total_count": self.total_count, "new_counts": counts["new_counts"]})
+                self.data_logger.log_vehicle_count(dict(counts, total_count=self.total_count))
             
             # แสดงเฟรม
             rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
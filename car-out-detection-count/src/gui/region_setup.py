@@ -235,12 +235,17 @@ class RegionSetupWidget(QWidget):
             QMessageBox.warning(self, "ข้อผิดพลาด", "กรุณาวาดพื้นที่อย่างน้อย 3 จุดก่อนบันทึก")
             return
         
+        # คำนวณพิกัดเป็นร้อยละของขนาดภาพ (ใช้แทน points ที่ทุกความละเอียดของกล้อง)
+        h, w = self.current_frame.shape[:2]
+        points_percent = [[x / w, y / h] for x, y in self.region_points]
+        
         # Update config
         updates = {
             "detection": {
                 "region_of_interest": {
                     "enabled": self.enable_region_checkbox.isChecked(),
-                    "points": self.region_points
+                    "points": self.region_points,
+                    "points_percent": points_percent
                 }
             }
         }
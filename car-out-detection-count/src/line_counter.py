@@ -13,6 +13,10 @@ from datetime import datetime
 from loguru import logger
 from collections import defaultdict
 
+from src.geometry import normalize_points
+from src.runtime_config import get_runtime_config
+from src.debug_channel import DebugChannel
+
 class LineCounter:
     """Class for counting vehicles crossing a line"""
     
@@ -25,36 +29,18 @@ class LineCounter:
         """
         self.config = config
         
-        # Load line crossing configuration
-        self.line_enabled = config["detection"]["line_crossing"]["enabled"]
-        self.line_position = config["detection"]["line_crossing"]["line_position"]
-        self.direction = config["detection"]["line_crossing"]["direction"]
+        # Load line crossing configuration (ตรวจสอบแล้วใน RuntimeConfig)
+        runtime = get_runtime_config(config)
+        self.line_enabled = runtime.line.enabled
+        self.direction = runtime.line.direction
         
-        # โหลดพิกัดแบบร้อยละ (ถ้ามี)
-        if "line_position_percent" in config["detection"]["line_crossing"]:
-            self.line_percent = config["detection"]["line_crossing"]["line_position_percent"]
-        else:
-            # คำนวณจากพิกัดพิกเซลเดิม (ใช้ขนาดมาตรฐาน 1280x720 ถ้าไม่มีการกำหนด)
-            self.line_percent = [
-                [self.line_position[0][0] / 1280, self.line_position[0][1] / 720],
-                [self.line_position[1][0] / 1280, self.line_position[1][1] / 720]
-            ]
-        
-        # Convert line points to numpy array for easier processing
-        self.line = np.array(self.line_position, dtype=np.int32)
-        
-        # Calculate line equation for detection: ax + by + c = 0
-        # For a line from (x1, y1) to (x2, y2):
-        # a = y2 - y1
-        # b = x1 - x2
-        # c = x2*y1 - x1*y2
-        x1, y1 = self.line[0]
-        x2, y2 = self.line[1]
-        self.line_params = {
-            'a': y2 - y1,
-            'b': x1 - x2,
-            'c': x2*y1 - x1*y2
-        }
+        # เส้นนับเก็บเป็นสัดส่วนของภาพ ใช้ทั้งนับและวาด โดยแปลงเป็น pixel ตามขนาดเฟรมที่ประมวลผล
+        self.geometry = runtime.geometry
+        self.line_percent = self.geometry.line_percent
+        self._use_pixels(self.geometry.reference)
+        
+        # ข้อมูล debug รายเฟรม (สุ่มตัวอย่างตาม logging.debug_trace, ปิดไว้โดยค่าเริ่มต้น)
+        self.trace = DebugChannel(config, "LineCounter")
         
         # Vehicle tracking for line crossing detection
         # Format: {vehicle_id: {"position": (x, y), "crossed": bool, "time": datetime}}
@@ -64,7 +50,24 @@ class LineCounter:
         self.total_count = 0
         self.crossed_ids = set()  # Set of vehicle IDs that have crossed the line
         
-        logger.info(f"LineCounter initialized with line at {self.line_position}")
+        # หมายเลข track แบบตัวเลข (ใช้ใน event log)
+        self.next_track_id = 1
+        
+        logger.info(f"LineCounter initialized with line at {self.line_position} "
+                    f"({self.pixels.width}x{self.pixels.height})")
+    
+    def _use_pixels(self, pixels):
+        """
+        ใช้เส้นนับที่ขนาดเฟรมนี้ (PixelGeometry ถูกเก็บไว้ต่อขนาดเฟรม จึงคำนวณใหม่เฉพาะเมื่อขนาดเปลี่ยน)
+        
+        Args:
+            pixels (PixelGeometry): เส้นนับที่ขนาดเฟรมปัจจุบัน
+        """
+        self.pixels = pixels
+        self.line_position = pixels.line
+        self.line = np.array(pixels.line, dtype=np.int32)
+        # Line equation for detection: ax + by + c = 0 และ norm = sqrt(a² + b²)
+        self.line_params = {'a': pixels.a, 'b': pixels.b, 'c': pixels.c, 'norm': pixels.norm}
     
     def point_side_of_line(self, point):
         """
@@ -76,22 +79,19 @@ class LineCounter:
         Returns:
             int: 1 if point is on one side, -1 if on the other side, 0 if on the line
         """
-        x, y = point
-        a, b, c = self.line_params['a'], self.line_params['b'], self.line_params['c']
-        
-        # Calculate signed distance from point to line
-        # d = (ax + by + c) / sqrt(a² + b²)
-        distance = (a * x + b * y + c) / math.sqrt(a**2 + b**2)
+        return int(self.sides_of_line(np.array([point]))[0])
+    
+    def sides_of_line(self, points):
+        """
+        ด้านของเส้นของหลายจุดพร้อมกัน
         
-        # Debug
-        print(f"Point: ({x}, {y}), Distance to line: {distance}")
+        Args:
+            points (numpy.ndarray): จุด N x 2 (พิกัดของเฟรมที่ประมวลผลล่าสุด)
         
-        if abs(distance) < 1e-9:  # If distance is very close to zero
-            return 0
-        elif distance > 0:
-            return 1
-        else:
-            return -1
+        Returns:
+            numpy.ndarray: 1, -1 หรือ 0 (อยู่บนเส้น) ของแต่ละจุด
+        """
+        return self.pixels.sides(points)
     
     def update(self, frame, detections):
         """
@@ -99,7 +99,8 @@ class LineCounter:
         
         Args:
             frame (numpy.ndarray): Current frame
-            detections (list): List of detections [x1, y1, x2, y2, conf, class]
+            detections (list): List of detections [x1, y1, x2, y2, conf, class] หรือ
+                [x1, y1, x2, y2, conf, class, track_id] จาก MotionTracker
         
         Returns:
             dict: Count information including total_count and new_counts
@@ -107,6 +108,10 @@ class LineCounter:
         if not self.line_enabled:
             return {"total_count": 0, "new_counts": 0}
         
+        pixels = self.geometry.for_frame(frame)
+        if pixels is not self.pixels:
+            self._use_pixels(pixels)
+        
         # Draw the line on the frame
         self.draw_line(frame)
         
@@ -115,58 +120,70 @@ class LineCounter:
         
         # Set to track new crossings in this update
         new_crossed_ids = set()
-        
-        # Debug
-        print(f"จำนวนวัตถุที่ตรวจพบในเฟรม: {len(detections)}")
+        crossings = []
+        traced = self.trace.sample()
+        if traced:
+            self.trace.log("{} detection(s) in frame", len(detections))
+        
+        # ด้านของเส้นของตำแหน่งปัจจุบันและตำแหน่งก่อนหน้าของทุก detection ในการคำนวณครั้งเดียว
+        if detections:
+            boxes = np.array([det[:4] for det in detections], dtype=np.int64).reshape(-1, 4)
+            centers = (boxes[:, :2] + boxes[:, 2:]) // 2
+            vehicle_ids = []
+            for det, (center_x, center_y) in zip(detections, centers.tolist()):
+                if len(det) > 6:
+                    # กล่องจาก MotionTracker มีหมายเลข track ที่คงที่ระหว่างเฟรม
+                    vehicle_ids.append(f"{int(det[5])}_t{det[6]}")
+                else:
+                    # ใช้ ID ที่เสถียรกว่าโดยใช้พิกัดที่มีการปัดเศษลง
+                    vehicle_ids.append(f"{int(det[5])}_{int(center_x//20)}_{int(center_y//20)}")
+            previous = np.array([
+                self.tracked_vehicles[vehicle_id]["position"] if vehicle_id in self.tracked_vehicles else center
+                for vehicle_id, center in zip(vehicle_ids, centers.tolist())
+            ]).reshape(-1, 2)
+            sides = self.sides_of_line(np.concatenate([centers, previous])).tolist()
+            current_sides, previous_sides = sides[:len(detections)], sides[len(detections):]
+        else:
+            vehicle_ids, current_sides, previous_sides = [], [], []
+            centers = np.zeros((0, 2), dtype=np.int64)
         
         # Process each detection
-        for det in detections:
-            x1, y1, x2, y2, conf, cls = det
-            
-            # Create an ID for this vehicle (use center point and downscaled coordinates for stability)
-            center_x = (x1 + x2) // 2
-            center_y = (y1 + y2) // 2
+        for det, vehicle_id, (center_x, center_y), side, prev_side in zip(
+                detections, vehicle_ids, centers.tolist(), current_sides, previous_sides):
+            conf, cls = det[4], det[5]
             
-            # ใช้ ID ที่เสถียรกว่าโดยใช้พิกัดที่มีการปัดเศษลง
-            vehicle_id = f"{int(cls)}_{int(center_x//20)}_{int(center_y//20)}"
-            
-            # Determine which side of the line the vehicle is on
-            side = self.point_side_of_line((center_x, center_y))
-            
-            # Debug
-            print(f"Vehicle ID: {vehicle_id}, Side: {side}, Position: ({center_x}, {center_y})")
+            if traced:
+                self.trace.log("vehicle {} at ({}, {}) side {} (previous {})",
+                               vehicle_id, center_x, center_y, side, prev_side)
             
             if vehicle_id in self.tracked_vehicles:
-                # Get previous position and side
-                prev_center_x, prev_center_y = self.tracked_vehicles[vehicle_id]["position"]
-                prev_side = self.point_side_of_line((prev_center_x, prev_center_y))
-                
-                # Debug
-                print(f"Previous side: {prev_side}, Current side: {side}")
-                
                 # ตรวจสอบการข้ามเส้นแบบเข้มงวดน้อยลง
                 if side != prev_side:
-                    # Debug info
-                    print(f"CROSSING DETECTED! Vehicle {vehicle_id} moved from side {prev_side} to {side}")
-                    
                     # คำนวณทิศทางการข้าม
                     crossing_up = prev_side > side
                     
-                    # Debug
-                    print(f"Direction: {'UP' if crossing_up else 'DOWN'}, Config direction: {self.direction}")
-                    
-                    count_crossing = False
-                    if (self.direction == "up" and crossing_up) or (self.direction == "down" and not crossing_up) or (self.direction == "both"):
-                        count_crossing = True
-                        print(f"COUNT ACCEPTED! Direction match: {self.direction}")
+                    count_crossing = ((self.direction == "up" and crossing_up)
+                                      or (self.direction == "down" and not crossing_up)
+                                      or self.direction == "both")
+                    if traced:
+                        self.trace.log("crossing by {} ({}), counted: {}",
+                                       vehicle_id, "up" if crossing_up else "down", count_crossing)
                     
                     if count_crossing and not self.tracked_vehicles[vehicle_id]["crossed"]:
                         # นับรถ
                         self.tracked_vehicles[vehicle_id]["crossed"] = True
                         self.crossed_ids.add(vehicle_id)
                         self.total_count += 1
-                        print(f"*** VEHICLE COUNTED! ID: {vehicle_id}, Total count: {self.total_count} ***")
                         new_crossed_ids.add(vehicle_id)
+                        crossings.append({
+                            "vehicle_id": vehicle_id,
+                            "track_id": self.tracked_vehicles[vehicle_id]["track_id"],
+                            "line_id": 0,
+                            "class": int(cls),
+                            "direction": "up" if crossing_up else "down",
+                            "confidence": float(conf),
+                            "position": (center_x, center_y)
+                        })
                         
                         # บันทึกข้อมูลสำคัญ
                         class_names = {2: "Car", 3: "Motorcycle", 5: "Bus", 7: "Truck"}
@@ -182,9 +199,10 @@ class LineCounter:
                     "crossed": False,
                     "first_seen": current_time,
                     "last_seen": current_time,
-                    "class": int(cls)
+                    "class": int(cls),
+                    "track_id": self.next_track_id
                 }
-                print(f"New vehicle added: {vehicle_id}")
+                self.next_track_id += 1
         
         # Clean up tracked vehicles that haven't been seen recently (5 seconds)
         vehicles_to_remove = []
@@ -219,23 +237,22 @@ class LineCounter:
         result = {
             "total_count": self.total_count,
             "new_counts": len(new_crossed_ids),
-            "new_vehicles": list(new_crossed_ids)
+            "new_vehicles": list(new_crossed_ids),
+            "crossings": crossings
         }
         
-        print(f"Update result: {result}")
+        if traced:
+            self.trace.log("total {}, new {}", result["total_count"], result["new_counts"])
         return result
     
     def draw_line(self, frame):
         """
-        วาดเส้นนับบนเฟรมโดยคำนวณพิกัดตามสัดส่วนของขนาดเฟรม
+        วาดเส้นนับบนเฟรม (พิกัดเดียวกับที่ใช้นับที่ขนาดเฟรมนี้)
         
         Args:
             frame (numpy.ndarray): เฟรมที่จะวาด
         """
-        h, w = frame.shape[:2]
-        # คำนวณพิกัดจริงตามสัดส่วนของภาพปัจจุบัน
-        line_start = (int(self.line_percent[0][0] * w), int(self.line_percent[0][1] * h))
-        line_end = (int(self.line_percent[1][0] * w), int(self.line_percent[1][1] * h))
+        line_start, line_end = self.geometry.for_frame(frame).line
         
         # วาดเส้น
         cv2.line(frame, line_start, line_end, (0, 255, 255), 2)
@@ -293,27 +310,125 @@ class LineCounter:
         self.crossed_ids = set()
         self.tracked_vehicles = {}
         logger.info("Vehicle counter reset")
-    
-    def set_line_position(self, line_position):
+
+    def get_state(self):
+        """
+        ดึงสถานะการนับและการติดตามปัจจุบันสำหรับบันทึก checkpoint
+
+        Returns:
+            dict: {"total_count": int, "tracks": {vehicle_id: {...}}, "next_track_id": int}
+        """
+        tracks = {}
+        for vehicle_id, vehicle_data in self.tracked_vehicles.items():
+            tracks[vehicle_id] = {
+                "position": vehicle_data["position"],
+                "first_seen": vehicle_data["first_seen"].timestamp(),
+                "class": vehicle_data["class"],
+                "crossed": vehicle_data["crossed"],
+                "track_id": vehicle_data["track_id"]
+            }
+
+        # หมายเลข track ต่อเนื่องหลังเริ่มใหม่ เพื่อไม่ให้ซ้ำกับเหตุการณ์ใน event log ก่อนหน้า
+        return {"total_count": self.total_count, "tracks": tracks, "next_track_id": self.next_track_id}
+
+    def restore_state(self, state, logged_total=None, logged_track_id=None):
+        """
+        กู้คืนสถานะการนับจาก checkpoint
+
+        ถ้ายอดที่บันทึกใน log มากกว่ายอดใน checkpoint แสดงว่ามีรถข้ามเส้นหลังจาก checkpoint
+        ล่าสุดก่อนระบบหยุดทำงาน ซึ่งไม่รู้ว่าเป็นคันไหน จึงถือว่ารถทุกคันที่กำลังติดตามอยู่
+        ถูกนับไปแล้วเพื่อป้องกันการนับซ้ำ
+
+        Args:
+            state (dict): สถานะจาก get_state()
+            logged_total (int, optional): ยอดรวมล่าสุดที่บันทึกใน log
+            logged_track_id (int, optional): หมายเลข track ล่าสุดใน event log (อาจใหม่กว่า checkpoint)
+        """
+        now = datetime.now()
+        self.next_track_id = max(self.next_track_id, state.get("next_track_id", 1), (logged_track_id or 0) + 1)
+
+        self.total_count = state["total_count"]
+        suppress_live_tracks = logged_total is not None and logged_total > self.total_count
+        if suppress_live_tracks:
+            logger.warning(f"Checkpoint total {self.total_count} is behind logged total {logged_total}, "
+                           f"treating {len(state['tracks'])} live track(s) as already counted")
+            self.total_count = logged_total
+
+        self.tracked_vehicles = {}
+        self.crossed_ids = set()
+        for vehicle_id, track in state["tracks"].items():
+            crossed = track["crossed"] or suppress_live_tracks
+            # ใช้เวลาปัจจุบันเป็น last_seen เพื่อให้ track ที่กู้คืนอยู่รอดช่วงเริ่มต้นใหม่
+            self.tracked_vehicles[vehicle_id] = {
+                "position": tuple(track["position"]),
+                "crossed": crossed,
+                "first_seen": datetime.fromtimestamp(track["first_seen"]),
+                "last_seen": now,
+                "class": track["class"],
+                "track_id": track.get("track_id") or self.next_track_id
+            }
+            if not track.get("track_id"):
+                self.next_track_id += 1
+            if crossed:
+                self.crossed_ids.add(vehicle_id)
+
+        logger.info(f"LineCounter restored: total={self.total_count}, tracks={len(self.tracked_vehicles)}")
+
+    def next_tracker_id(self):
+        """
+        หมายเลข track แรกที่ MotionTracker ใช้ได้โดยไม่ซ้ำกับ key "{class}_t{track_id}" ที่กำลังติดตาม
+        (เรียกหลัง restore_state เพราะ track ที่กู้คืนมาจาก MotionTracker ของรอบก่อน)
+
+        Returns:
+            int: หมายเลข track ถัดไป
+        """
+        restored = [int(vehicle_id.rsplit("_t", 1)[1]) for vehicle_id in self.tracked_vehicles if "_t" in vehicle_id]
+        return max([self.next_track_id] + [track_id + 1 for track_id in restored])
+
+    def set_line_position(self, line_position, reset=True, frame_size=None):
         """
         Set a new position for the counting line
         
         Args:
             line_position (list): List of two points [[x1, y1], [x2, y2]]
+            reset (bool): รีเซ็ตยอดนับและการติดตาม ถ้า False จะคงยอดนับและ track เดิมไว้
+                (ด้านของเส้นคำนวณใหม่จากเส้นปัจจุบันทั้งตำแหน่งก่อนหน้าและปัจจุบัน จึงไม่เกิดการนับผิด)
+            frame_size (tuple, optional): (width, height) ของภาพที่ใช้วัด line_position
+                (ค่าเริ่มต้น = ขนาดเฟรมที่ประมวลผลล่าสุด)
         """
-        self.line_position = line_position
-        self.line = np.array(line_position, dtype=np.int32)
-        
-        # Recalculate line equation
-        x1, y1 = self.line[0]
-        x2, y2 = self.line[1]
-        self.line_params = {
-            'a': y2 - y1,
-            'b': x1 - x2,
-            'c': x2*y1 - x1*y2
-        }
+        width, height = frame_size or (self.pixels.width, self.pixels.height)
+        self.set_line_percent(normalize_points(line_position, width, height), reset)
+    
+    def set_line_percent(self, line_percent, reset=True):
+        """
+        Set a new position for the counting line as fractions of the frame size
+        
+        Args:
+            line_percent (list): [[x1, y1], [x2, y2]] ในช่วง 0-1
+            reset (bool): รีเซ็ตยอดนับและการติดตาม (ดู set_line_position)
+        """
+        self.geometry = self.geometry.with_line(line_percent)
+        self.line_percent = self.geometry.line_percent
+        self._use_pixels(self.geometry.pixels(self.pixels.width, self.pixels.height))
         
         # Reset counter
-        self.reset_counter()
+        if reset:
+            self.reset_counter()
+        
+        logger.info(f"Line position updated to {self.line_position} "
+                    f"({self.pixels.width}x{self.pixels.height})")
+    
+    def apply_config(self, config):
+        """
+        นำการตั้งค่าที่โหลดใหม่ (hot reload) มาใช้ระหว่างเฟรม โดยไม่รีเซ็ตยอดนับและการติดตาม
+        
+        Args:
+            config (dict): Configuration dictionary
+        """
+        line = get_runtime_config(config).line
+        self.config = config
+        self.line_enabled = line.enabled
+        self.direction = line.direction
         
-        logger.info(f"Line position updated to {line_position}")
\ No newline at end of file
+        if line.percent != self.line_percent:
+            self.set_line_percent(line.percent, reset=False)
\ No newline at end of file
@@ -8,30 +8,34 @@ Vehicle Detection System: Main Module
 
 import os
 import sys
+import json
 import time
 import signal
 import argparse
+import yaml
 from loguru import logger
 
 # เพิ่ม path ของโปรเจค
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Import modules
+# โหลดเฉพาะโมดูลที่ทุกคำสั่งใช้ ส่วน GUI (PySide6), การประมวลผลภาพ (OpenCV, torch)
+# และการส่งข้อมูล API จะนำเข้าเมื่อเข้าสู่โหมดนั้นจริงเท่านั้น
 from src.config_manager import ConfigManager
-from src.video_processor import VideoProcessor
-from src.vehicle_detector import VehicleDetector
-from src.line_counter import LineCounter
+from src.runtime_config import ConfigError
 from src.data_logger import DataLogger
-from src.api_client import ApiClient
-
-# ถ้าเปิดใช้งาน GUI
-from src.gui import create_gui_app
+from src.event_store import import_csv_to_sqlite
 
 # Global flag for graceful shutdown
 running = True
 
 def signal_handler(sig, frame):
-    """จัดการกับสัญญาณจากระบบปฏิบัติการ (Ctrl+C)"""
+    """
+    จัดการกับสัญญาณจากระบบปฏิบัติการ (Ctrl+C, SIGTERM จาก docker stop)
+    
+    ตั้งค่า flag ให้ลูปหลักหยุดทำงาน แล้วลูปหลักจะ flush ข้อมูลที่ค้างใน buffer ก่อนออกจากโปรแกรม
+    (ไม่เขียนไฟล์ใน signal handler โดยตรงเพื่อหลีกเลี่ยง deadlock กับ writer thread)
+    """
     global running
     logger.info("Received signal to shutdown...")
     running = False
@@ -45,6 +49,31 @@ def parse_arguments():
                         help="Start with GUI for configuration")
     parser.add_argument("--test", action="store_true", 
                         help="Run in test mode (override config)")
+    parser.add_argument("--import-csv", type=str, metavar="CSV_PATH",
+                        help="Import an existing CSV count log into the SQLite store and exit")
+    parser.add_argument("--rebuild-rollups", action="store_true",
+                        help="Rebuild minute/hour/day rollups from raw count events and exit "
+                             "(refused while the counting service is running)")
+    parser.add_argument("--export", type=str, metavar="OUTPUT",
+                        help="Export count data to OUTPUT (a directory for parquet) and exit")
+    parser.add_argument("--format", type=str, default="csv", choices=["csv", "json", "jsonl", "parquet"],
+                        help="Export format used with --export")
+    parser.add_argument("--start-date", type=str, default=None,
+                        help="First date (YYYY-MM-DD) to export")
+    parser.add_argument("--end-date", type=str, default=None,
+                        help="Last date (YYYY-MM-DD) to export")
+    parser.add_argument("--summary", type=str, nargs="?", const="", metavar="DATE",
+                        help="Print the daily count summary for DATE (YYYY-MM-DD, default today) and exit")
+    parser.add_argument("--quantize", action="store_true",
+                        help="Build an INT8 CPU model from model.model_path, validate it against the "
+                             "original and register it as model.format openvino-int8 if it passes, then exit")
+    parser.add_argument("--autotune", action="store_true",
+                        help="Sweep input size, threads, model format and frame stride on a camera clip, "
+                             "write the fastest setting that meets autotune.target_fps/min_accuracy "
+                             "into the config file, then exit")
+    parser.add_argument("--control", type=str, nargs="+", metavar=("COMMAND", "KEY=VALUE"),
+                        help="Send a command (status, swap_model, rollback_model) to the running "
+                             "process, e.g. --control swap_model model_path=./models/yolov8s.pt format=onnx")
     return parser.parse_args()
 
 def setup_logger(config):
@@ -68,6 +97,36 @@ def setup_logger(config):
     
     logger.info("Logger configured successfully")
 
+def send_control_command(config, arguments):
+    """
+    ส่งคำสั่งไปยัง control server ของโปรเซสที่กำลังทำงาน แล้วแสดงผล
+    
+    Args:
+        config (dict): Configuration dictionary
+        arguments (list): [COMMAND, KEY=VALUE, ...] ค่าจะถูกแปลงชนิดแบบ YAML (เช่น imgsz=960 เป็น int)
+    
+    Returns:
+        int: 0 ถ้าคำสั่งสำเร็จ
+    """
+    from src.control_server import send_command
+    
+    command, params = arguments[0], {}
+    for argument in arguments[1:]:
+        key, separator, value = argument.partition("=")
+        if not separator:
+            logger.error(f"Invalid parameter '{argument}', expected KEY=VALUE")
+            return 1
+        params[key] = yaml.safe_load(value)
+    
+    socket_path = config.get("control", {}).get("socket_path", "./run/control.sock")
+    try:
+        reply = send_command(socket_path, command, params)
+    except OSError as e:
+        logger.error(f"Cannot reach the control socket {socket_path} (is control.enabled set?): {e}")
+        return 1
+    print(json.dumps(reply, ensure_ascii=False, indent=2))
+    return 0 if reply.get("ok") else 1
+
 def main():
     """Main function to start the vehicle detection system"""
     # Register signal handler for graceful shutdown
@@ -77,8 +136,12 @@ def main():
     # Parse command line arguments
     args = parse_arguments()
     
-    # Load configuration
-    config_manager = ConfigManager(args.config)
+    # Load configuration (หยุดทันทีถ้าไฟล์การตั้งค่าไม่ถูกต้อง แทนที่จะไปล้มระหว่างประมวลผล)
+    try:
+        config_manager = ConfigManager(args.config)
+    except ConfigError as e:
+        logger.error(f"Invalid configuration {args.config}: {e}")
+        return 1
     config = config_manager.get_config()
     
     # Override config with command line arguments if provided
@@ -91,12 +154,83 @@ def main():
     logger.info(f"Starting {config['general']['app_name']} v{config['general']['version']}")
     logger.info(f"Running in {'test' if config['general']['test_mode'] else 'production'} mode")
     
+    # ส่งคำสั่งไปยังโปรเซสที่กำลังทำงานผ่าน control socket แล้วจบการทำงาน
+    if args.control:
+        return send_control_command(config, args.control)
+    
+    # สร้างและตรวจสอบโมเดล INT8 แล้วจบการทำงาน
+    if args.quantize:
+        from src.quantization import quantize_model
+        report = quantize_model(config)
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return 0 if report["passed"] else 1
+    
+    # หาการตั้งค่าที่เหมาะกับเครื่องแล้วบันทึกลงไฟล์การตั้งค่า
+    if args.autotune:
+        from src.autotune import apply_best, autotune
+        report = autotune(config)
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        if report["best"] is None:
+            logger.error(f"No setting reached {report['target_fps']} FPS with count accuracy "
+                         f">= {report['min_accuracy']}; config unchanged")
+            return 1
+        logger.info(f"Selected {report['best']}")
+        return 0 if apply_best(config_manager, report["best"]) else 1
+    
+    # นำเข้าไฟล์ log CSV เดิมเข้า SQLite แล้วจบการทำงาน
+    if args.import_csv:
+        db_path = config["logging"].get("sqlite_path", "./logs/vehicle_counts/vehicle_counts.db")
+        try:
+            import_csv_to_sqlite(args.import_csv, db_path)
+        except ValueError as e:
+            logger.error(f"CSV import refused: {e}")
+            return 1
+        return 0
+    
+    # ซ่อม rollup โดยสร้างใหม่จากข้อมูลดิบแล้วจบการทำงาน
+    if args.rebuild_rollups:
+        data_logger = DataLogger(config, read_only=True, load_rollups=False)
+        success = data_logger.repair_rollups()
+        data_logger.close()
+        return 0 if success else 1
+    
+    # ส่งออกข้อมูลการนับแล้วจบการทำงาน
+    if args.export:
+        data_logger = DataLogger(config, read_only=True)
+        success = data_logger.export_data(args.export, args.start_date, args.end_date, args.format)
+        data_logger.close()
+        return 0 if success else 1
+    
+    # แสดงสรุปยอดนับรายวันแล้วจบการทำงาน (อ่านอย่างเดียว เพราะ service อาจกำลังเขียนไฟล์เดียวกันอยู่)
+    if args.summary is not None:
+        data_logger = DataLogger(config, read_only=True)
+        summary = data_logger.get_daily_summary(args.summary or None)
+        data_logger.close()
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+        return 0
+    
     # Start GUI if needed
     if args.gui or config["gui"]["enabled"]:
         logger.info("Starting GUI...")
+        from src.gui import create_gui_app
         app = create_gui_app(config_manager)
         return app.exec()
     
+    # โมดูลของการประมวลผลภาพและการส่งข้อมูล (torch/ultralytics จะถูกนำเข้าเมื่อโหลดโมเดล)
+    from src.video_processor import VideoProcessor
+    from src.vehicle_detector import VehicleDetector
+    from src.line_counter import LineCounter
+    from src.api_client import ApiClient
+    from src.api_sender import ApiSender
+    from src.async_uploader import AsyncUploader
+    from src.state_store import StateCheckpointer
+    from src.control_server import create_control_server
+    from src.motion_tracker import create_motion_tracker
+    from src.cpu_tuning import apply_cpu_settings, log_cpu_report
+    
+    # กำหนด thread และ core ของการ inference ก่อนโหลดโมเดล
+    log_cpu_report(apply_cpu_settings(config), config_manager.get_runtime_config().model.imgsz)
+    
     # Initialize components
     try:
         # Create video processor
@@ -108,12 +242,37 @@ def main():
         # Create line counter
         line_counter = LineCounter(config)
         
+        # ตรวจจับเฉพาะ keyframe และติดตามรถในเฟรมระหว่างนั้น (ถ้าเปิดใช้งาน detection.keyframes)
+        motion_tracker = create_motion_tracker(config)
+        
         # Create data logger
         data_logger = DataLogger(config)
         
         # Create API client if enabled
         api_client = ApiClient(config) if config["api"]["enabled"] else None
         
+        # ส่งข้อมูลผ่าน spool บนดิสก์ใน background thread (ไม่บล็อกการประมวลผลภาพ)
+        # api.uploader: "thread" (ApiSender) หรือ "async" (asyncio พร้อม heartbeat และตรวจสอบการเชื่อมต่อ)
+        api_uploader = None
+        api_sender = None
+        if api_client:
+            if config["api"].get("uploader", "thread") == "async":
+                api_uploader = AsyncUploader(config)
+                api_sender = api_uploader.add_camera(api_client)
+            else:
+                api_sender = ApiSender(config, api_client)
+        
+        # กู้คืนสถานะการนับจาก checkpoint ล่าสุด (ถ้ามี)
+        checkpointer = StateCheckpointer(config)
+        checkpoint = checkpointer.load()
+        if checkpoint:
+            line_counter.restore_state(checkpoint["counter"], data_logger.get_last_total_count(),
+                                       data_logger.get_last_track_id())
+            data_logger.restore_state(checkpoint["logger"])
+            # track ใหม่ต้องไม่ใช้ key "{class}_t{id}" ซ้ำกับ track ที่กู้คืน (จะได้สถานะ crossed/ตำแหน่งเดิมไป)
+            if motion_tracker:
+                motion_tracker.reserve_track_ids(line_counter.next_tracker_id())
+        
         # Main processing loop
         logger.info("Starting main processing loop...")
         
@@ -135,9 +294,43 @@ def main():
         # Process frames
         frame_count = 0
         start_time = time.time()
-        last_api_send_time = start_time
+        runtime = config_manager.get_runtime_config()
+        
+        # รับคำสั่งควบคุมจาก Unix socket (ทำงานในลูปหลักระหว่างเฟรม)
+        control_server = create_control_server(config, {
+            "status": lambda params: {
+                "model": vehicle_detector.get_model_status(),
+                "camera": video_processor.get_camera_status(),
+                "keyframes": motion_tracker.get_stats() if motion_tracker else None,
+                "frames": frame_count,
+                "total_count": line_counter.total_count
+            },
+            "swap_model": lambda params: {"model": vehicle_detector.request_model_swap(params)},
+            "rollback_model": lambda params: {
+                "rolled_back": vehicle_detector.rollback_model("control command"),
+                "model": vehicle_detector.get_model_status()
+            }
+        })
         
         while running:
+            # นำการตั้งค่าที่แก้ไขใน config.yaml มาใช้ระหว่างเฟรม (ไม่ต้องเริ่มโปรแกรมใหม่)
+            if config_manager.check_for_changes():
+                config = config_manager.get_config()
+                runtime = config_manager.get_runtime_config()
+                line_counter.apply_config(config)
+                vehicle_detector.apply_config(config)
+                if motion_tracker:
+                    motion_tracker.apply_config(config)
+                if api_client:
+                    api_client.apply_config(config)
+                if api_uploader:
+                    api_uploader.apply_config(config)
+                elif api_sender:
+                    api_sender.apply_config(config)
+            
+            if control_server:
+                control_server.process()
+            
             # Read frame
             ret, frame = video_processor.read_frame()
             if not ret:
@@ -148,24 +341,43 @@ def main():
                 video_processor.open_video_source(video_source)
                 continue
             
-            # Detect vehicles
-            detections = vehicle_detector.detect(frame)
+            # ตรวจจับและนับทุก detection.frame_stride เฟรม (เฟรมที่ข้ามจะแสดง/บันทึกวิดีโอตามปกติ)
+            # เฟรมที่เหมือนเฟรมที่วิเคราะห์ล่าสุด (กล้องค้าง) ใช้ detections เดิม ไม่รันโมเดลและไม่ส่งให้ tracker ซ้ำ
+            if (frame_count % runtime.detection.frame_stride == 0
+                    and not video_processor.is_duplicate_frame(frame)):
+                # Detect vehicles (หรือใช้กล่องที่ติดตามจาก keyframe ก่อนหน้า)
+                if motion_tracker:
+                    detections = motion_tracker.step(frame, vehicle_detector.detect)
+                else:
+                    detections = vehicle_detector.detect(frame)
+                
+                # Count vehicles crossing the line
+                counts = line_counter.update(frame, detections)
+            else:
+                if line_counter.line_enabled:
+                    line_counter.draw_line(frame)
+                counts = {"total_count": line_counter.total_count, "new_counts": 0}
             
-            # Count vehicles crossing the line
-            counts = line_counter.update(frame, detections)
+            # แจ้งสถานะกล้องค้าง (stale) ผ่าน health check
+            if api_client and video_processor.stale != (api_client.camera_status["status"] == "stale"):
+                api_client.set_camera_status(video_processor.get_camera_status())
             
             # Log data if counts changed
             if counts["new_counts"] > 0:
                 logger.info(f"Detected {counts['new_counts']} new vehicle(s) crossing the line")
+                counts["media_time_ms"] = video_processor.get_position_ms()
                 data_logger.log_vehicle_count(counts)
                 
-                # Send data to API if enabled
-                if api_client and time.time() - last_api_send_time >= config["api"]["send_interval"]:
-                    api_client.send_data(data_logger.get_recent_counts())
-                    last_api_send_time = time.time()
+                # Queue the new records for the API sender
+                if api_sender:
+                    api_sender.enqueue(data_logger.get_recent_counts(counts["new_counts"]))
+            
+            # บันทึก checkpoint เป็นระยะ (การเขียนไฟล์ทำใน background thread)
+            if checkpointer.due():
+                checkpointer.submit(line_counter.get_state(), data_logger.get_state())
             
             # Display result
-            if config["general"]["display_output"]:
+            if runtime.general.display_output:
                 video_processor.display_frame(frame)
                 
                 # Check for exit key (q)
@@ -174,7 +386,7 @@ def main():
                     break
             
             # Save output video if enabled
-            if config["general"]["save_output_video"]:
+            if runtime.general.save_output_video:
                 video_processor.write_frame(frame)
             
             # Calculate FPS and log every 100 frames
@@ -183,14 +395,28 @@ def main():
                 elapsed_time = time.time() - start_time
                 fps = frame_count / elapsed_time
                 logger.debug(f"Processing at {fps:.2f} FPS")
+                if motion_tracker:
+                    stats = motion_tracker.get_stats()
+                    logger.debug(f"Keyframes {stats['keyframe_rate']:.0%} of analyzed frames, "
+                                 f"interval {stats['interval']}, {stats['tracks']} track(s)")
+                if api_sender:
+                    metrics = api_sender.get_metrics()
+                    logger.debug(f"API queue depth {metrics['queue_depth']}, "
+                                 f"oldest unsent {metrics['oldest_unsent_age']:.1f}s")
         
         # Cleanup
         logger.info("Cleaning up resources...")
+        if control_server:
+            control_server.close()
         video_processor.release()
+        checkpointer.close(line_counter.get_state(), data_logger.get_state())
+        data_logger.close()
         
-        # Send final data to API if enabled
-        if api_client:
-            api_client.send_data(data_logger.get_recent_counts())
+        # Send pending data to API; anything left stays in the spool for the next run
+        if api_sender:
+            api_sender.close()
+        if api_uploader:
+            api_uploader.close()
         
         logger.info("Vehicle detection system stopped successfully")
         return 0
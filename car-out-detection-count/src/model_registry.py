@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Model Registry Module
+โมดูลจัดการไฟล์โมเดลในเครื่อง (ไม่ดาวน์โหลด) ตรวจสอบ checksum
+เก็บไฟล์ที่ export แล้วตาม hash ของโมเดล ขนาดภาพ และ format และ warm-up ก่อนใช้งาน
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import numpy as np
+from loguru import logger
+
+from src.state_store import atomic_write
+from src.cpu_tuning import prepare_model
+
+# format ที่รองรับ (ตาม format ของ ultralytics export) และนามสกุลของไฟล์ที่ได้
+MODEL_FORMATS = {
+    "pytorch": ".pt",
+    "torchscript": ".torchscript",
+    "onnx": ".onnx",
+    "openvino": "_openvino_model",
+    "engine": ".engine",
+    "openvino-int8": "_int8_openvino_model"
+}
+
+# format ที่ต้องผ่านการตรวจสอบความแม่นยำก่อนใช้ (สร้างด้วย main.py --quantize เท่านั้น)
+VALIDATED_FORMATS = ("openvino-int8",)
+
+MANIFEST_VERSION = 1
+
+
+class ModelChecksumError(ValueError):
+    """Raised when a model file does not match its expected SHA-256"""
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    """
+    คำนวณ SHA-256 ของไฟล์แบบอ่านทีละส่วน
+
+    Args:
+        path (str): Path ของไฟล์
+        chunk_size (int): ขนาดที่อ่านต่อครั้ง (ไบต์)
+
+    Returns:
+        str: SHA-256 แบบ hex
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_yolo():
+    """นำเข้า ultralytics.YOLO เมื่อต้องใช้เท่านั้น"""
+    try:
+        from ultralytics import YOLO
+    except ImportError:
+        logger.error("Ultralytics not installed. Please install it with: pip install -U ultralytics")
+        raise ImportError("Ultralytics not installed")
+    return YOLO
+
+
+def predict_ultralytics(model, source, conf, classes, imgsz, device):
+    """
+    inference ด้วยโมเดล ultralytics (ภาพเดียวหรือ list ของภาพเป็น batch)
+
+    Args:
+        model: โมเดลจาก ModelRegistry.load()
+        source: ภาพ (numpy.ndarray) หรือ list ของภาพ
+        conf (float): confidence threshold
+        classes (list): class ที่ต้องการ หรือ None = ทุก class
+        imgsz (int): ขนาดภาพ input
+        device (str): device ที่ใช้ inference
+
+    Returns:
+        list: ผลของแต่ละภาพ (ultralytics Results)
+    """
+    return model.predict(source, conf=conf, classes=classes, imgsz=imgsz, device=device, verbose=False)
+
+
+class ModelRegistry:
+    """Offline store of model weights and their exported artifacts"""
+
+    def __init__(self, config):
+        """
+        Initialize ModelRegistry
+
+        Args:
+            config (dict): Configuration dictionary (ใช้ model.registry_dir และ model.warmup_runs)
+        """
+        self.config = config
+        model_config = config.get("model", {})
+        self.registry_dir = model_config.get("registry_dir", "./models/registry")
+        self.warmup_runs = model_config.get("warmup_runs", 2)
+        self.manifest_path = os.path.join(self.registry_dir, "manifest.json")
+        self._manifest = self._load_manifest()
+
+    def _load_manifest(self):
+        """โหลด manifest (checksum ของไฟล์ และ artifact ที่ export แล้ว)"""
+        empty = {"version": MANIFEST_VERSION, "files": {}, "artifacts": {}}
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as file:
+                manifest = json.load(file)
+        except FileNotFoundError:
+            return empty
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable model manifest {self.manifest_path}: {e}")
+            return empty
+
+        if manifest.get("version") != MANIFEST_VERSION:
+            return empty
+        manifest.setdefault("files", {})
+        manifest.setdefault("artifacts", {})
+        return manifest
+
+    def _save_manifest(self):
+        data = json.dumps(self._manifest, indent=2, sort_keys=True).encode("utf-8")
+        atomic_write(self.manifest_path, data)
+
+    def resolve(self, model_path):
+        """
+        หาไฟล์โมเดลในเครื่อง: path ที่กำหนด หรือไฟล์ชื่อเดียวกันใน registry_dir
+
+        Args:
+            model_path (str): model.model_path
+
+        Returns:
+            str: Absolute path ของไฟล์โมเดล
+
+        Raises:
+            FileNotFoundError: ถ้าไม่พบไฟล์ (ไม่มีการดาวน์โหลด)
+        """
+        candidates = [model_path, os.path.join(self.registry_dir, os.path.basename(model_path))]
+        for candidate in candidates:
+            if candidate and os.path.exists(candidate):
+                return os.path.abspath(candidate)
+        raise FileNotFoundError(
+            f"Model file not found: {model_path} (searched {', '.join(candidates)}; "
+            f"weights are never downloaded, copy them to one of these paths)"
+        )
+
+    def checksum(self, path):
+        """
+        SHA-256 ของไฟล์โมเดล (ใช้ค่าใน manifest ถ้าขนาดและเวลาแก้ไขไม่เปลี่ยน)
+
+        Args:
+            path (str): Absolute path ของไฟล์โมเดล
+
+        Returns:
+            str: SHA-256 แบบ hex
+        """
+        stat = os.stat(path)
+        entry = self._manifest["files"].get(path)
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return entry["sha256"]
+
+        started = time.perf_counter()
+        sha256 = file_sha256(path)
+        logger.debug(f"Hashed {path} in {time.perf_counter() - started:.2f}s")
+        self._manifest["files"][path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": sha256}
+        self._save_manifest()
+        return sha256
+
+    def verify(self, path, expected=None):
+        """
+        ตรวจสอบ checksum ของไฟล์โมเดล
+
+        Args:
+            path (str): Absolute path ของไฟล์โมเดล
+            expected (str, optional): SHA-256 ที่คาดไว้ (model.sha256) ถ้าไม่ระบุจะไม่ตรวจเทียบ
+
+        Returns:
+            str: SHA-256 ของไฟล์
+
+        Raises:
+            ModelChecksumError: ถ้า SHA-256 ไม่ตรงกับที่คาดไว้
+        """
+        if expected and os.path.isfile(path):
+            # ไม่เชื่อ manifest เมื่อต้องตรวจเทียบ (ไฟล์อาจถูกแก้ไขโดยไม่เปลี่ยน mtime)
+            sha256 = file_sha256(path)
+        else:
+            sha256 = self.checksum(path) if os.path.isfile(path) else None
+
+        if expected and sha256 != expected.lower():
+            raise ModelChecksumError(f"Checksum mismatch for {path}: expected {expected}, got {sha256}")
+        return sha256
+
+    def artifact(self, path, sha256, imgsz, model_format, device="cpu"):
+        """
+        ไฟล์โมเดลใน format ที่ต้องการ (export ครั้งแรกแล้วเก็บไว้ตาม hash, imgsz และ format)
+
+        Args:
+            path (str): Absolute path ของไฟล์โมเดลต้นฉบับ
+            sha256 (str): SHA-256 ของไฟล์ต้นฉบับ
+            imgsz (int): ขนาดภาพ input
+            model_format (str): หนึ่งใน MODEL_FORMATS
+            device (str): device ที่ใช้ export
+
+        Returns:
+            str: Path ของไฟล์ที่พร้อมโหลด
+        """
+        if model_format == "pytorch" or sha256 is None:
+            return path
+
+        key = self.artifact_key(sha256, imgsz, model_format)
+        target = os.path.join(self.registry_dir, key + MODEL_FORMATS[model_format])
+        if key in self._manifest["artifacts"] and os.path.exists(target):
+            return target
+
+        if model_format in VALIDATED_FORMATS:
+            raise FileNotFoundError(
+                f"No validated {model_format} artifact for {os.path.basename(path)} (imgsz={imgsz}); "
+                f"create one with: python src/main.py --quantize"
+            )
+
+        logger.info(f"Exporting {os.path.basename(path)} to {model_format} (imgsz={imgsz})...")
+        started = time.perf_counter()
+        YOLO = load_yolo()
+        exported = YOLO(path).export(format=model_format, imgsz=imgsz, device=device)
+        target = self.register(exported, path, sha256, imgsz, model_format)
+        logger.info(f"Exported {key} in {time.perf_counter() - started:.1f}s")
+        return target
+
+    @staticmethod
+    def artifact_key(sha256, imgsz, model_format):
+        """ชื่อของ artifact ใน registry (hash ของโมเดลต้นฉบับ, ขนาดภาพ, format)"""
+        return f"{sha256[:16]}-{imgsz}-{model_format}"
+
+    def register(self, exported, path, sha256, imgsz, model_format, validation=None):
+        """
+        ย้ายไฟล์ที่ export แล้วเข้า registry และบันทึกใน manifest
+
+        Args:
+            exported (str): Path ของไฟล์หรือไดเรกทอรีที่ export
+            path (str): Absolute path ของไฟล์โมเดลต้นฉบับ
+            sha256 (str): SHA-256 ของไฟล์ต้นฉบับ
+            imgsz (int): ขนาดภาพ input
+            model_format (str): หนึ่งใน MODEL_FORMATS
+            validation (dict, optional): ผลการตรวจสอบความแม่นยำ (สำหรับ VALIDATED_FORMATS)
+
+        Returns:
+            str: Path ของ artifact ใน registry
+        """
+        key = self.artifact_key(sha256, imgsz, model_format)
+        target = os.path.join(self.registry_dir, key + MODEL_FORMATS[model_format])
+
+        os.makedirs(self.registry_dir, exist_ok=True)
+        if os.path.isdir(target):
+            shutil.rmtree(target)
+        shutil.move(str(exported), target)
+
+        self._manifest["artifacts"][key] = {
+            "source": path,
+            "source_sha256": sha256,
+            "imgsz": imgsz,
+            "format": model_format,
+            "path": target,
+            "created": time.time(),
+            "validation": validation
+        }
+        self._save_manifest()
+        return target
+
+    def load(self, model_config):
+        """
+        โหลดโมเดลจาก registry: resolve -> verify -> artifact -> warm-up
+
+        Args:
+            model_config (ModelConfig): การตั้งค่าโมเดลจาก RuntimeConfig
+
+        Returns:
+            YOLO: โมเดลที่ warm-up แล้ว
+        """
+        path = self.resolve(model_config.model_path)
+        sha256 = self.verify(path, model_config.sha256)
+        artifact = self.artifact(path, sha256, model_config.imgsz, model_config.format, model_config.device)
+
+        YOLO = load_yolo()
+        model = YOLO(artifact, task="detect")
+        if model_config.format == "pytorch" and model_config.device != "cpu":
+            model.to(model_config.device)
+        prepare_model(model, self.config, model_config.format)
+
+        checksum = sha256[:12] if sha256 else "unhashed"
+        logger.info(f"Loaded model {os.path.basename(artifact)} ({checksum}, {model_config.format}) "
+                    f"on {model_config.device}")
+
+        self.warm_up(model, model_config.imgsz, model_config.device)
+        return model
+
+    def warm_up(self, model, imgsz, device="cpu"):
+        """
+        รัน inference กับภาพว่างก่อนใช้งาน เพื่อให้เฟรมแรกไม่ต้องรอการ allocate/compile
+
+        Args:
+            model: โมเดล ultralytics
+            imgsz (int): ขนาดภาพ input
+            device (str): device ที่ใช้ inference
+
+        Returns:
+            list: เวลาที่ใช้ของแต่ละรอบ (วินาที)
+        """
+        frame = np.zeros((imgsz, imgsz, 3), dtype=np.uint8)
+        timings = []
+        for _ in range(self.warmup_runs):
+            started = time.perf_counter()
+            model.predict(frame, imgsz=imgsz, device=device, verbose=False)
+            timings.append(time.perf_counter() - started)
+
+        if timings:
+            logger.info(f"Model warm-up: {', '.join(f'{t * 1000:.0f} ms' for t in timings)}")
+        return timings
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Motion Tracker Module
+โมดูลติดตามรถระหว่าง keyframe: ตรวจจับเต็มทุก N เฟรม และเลื่อนกล่องในเฟรมระหว่างนั้นด้วย
+optical flow (Lucas-Kanade) ร่วมกับ Kalman filter โดยปรับ N ตามระยะของรถจากเส้นนับ
+"""
+
+import math
+import numpy as np
+import cv2
+from loguru import logger
+
+from src.cascade import iou_matrix
+from src.runtime_config import get_runtime_config
+
+# Kalman filter แบบความเร็วคงที่ของสถานะ [cx, cy, w, h, vx, vy] (หน่วย: pixel, ต่อเฟรมที่วิเคราะห์)
+_TRANSITION = np.eye(6)
+_TRANSITION[0, 4] = _TRANSITION[1, 5] = 1.0
+_MEASUREMENT = np.eye(4, 6)
+
+
+class Track:
+    """A vehicle box followed between keyframes with a constant-velocity Kalman filter"""
+
+    def __init__(self, track_id, detection, process_noise, measurement_noise):
+        x1, y1, x2, y2, conf, cls = detection[:6]
+        self.track_id = track_id
+        self.confidence = conf
+        self.cls = int(cls)
+        self.missed = 0
+        self.state = np.array([(x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1, 0.0, 0.0])
+        self.covariance = np.diag([10.0, 10.0, 10.0, 10.0, 100.0, 100.0])
+        self._process_noise = np.diag([1.0, 1.0, 1.0, 1.0, 0.5, 0.5]) * process_noise
+        self._measurement_noise = np.eye(4) * measurement_noise
+
+    def predict(self):
+        self.state = _TRANSITION @ self.state
+        self.covariance = _TRANSITION @ self.covariance @ _TRANSITION.T + self._process_noise
+
+    def correct(self, box, noise_scale=1.0):
+        """
+        Args:
+            box (tuple): (x1, y1, x2, y2) ที่วัดได้ (จาก detection หรือ optical flow)
+            noise_scale (float): คูณความไม่แน่นอนของการวัด (optical flow เชื่อถือได้น้อยกว่า detection)
+        """
+        x1, y1, x2, y2 = box
+        measurement = np.array([(x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1])
+        innovation = measurement - _MEASUREMENT @ self.state
+        covariance = _MEASUREMENT @ self.covariance @ _MEASUREMENT.T + self._measurement_noise * noise_scale
+        gain = self.covariance @ _MEASUREMENT.T @ np.linalg.inv(covariance)
+        self.state = self.state + gain @ innovation
+        self.covariance = (np.eye(6) - gain @ _MEASUREMENT) @ self.covariance
+
+    @property
+    def box(self):
+        cx, cy, w, h = self.state[:4]
+        return cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2
+
+    def as_detection(self):
+        """[x1, y1, x2, y2, confidence, class, track_id] (track_id ใช้เป็นตัวระบุรถใน LineCounter)"""
+        x1, y1, x2, y2 = self.box
+        return [int(x1), int(y1), int(x2), int(y2), self.confidence, self.cls, self.track_id]
+
+
+class MotionTracker:
+    """Runs the detector on keyframes and propagates tracks on the frames in between"""
+
+    def __init__(self, config):
+        """
+        Initialize MotionTracker
+
+        Args:
+            config (dict): Configuration dictionary
+        """
+        self.tracks = []
+        self.next_track_id = 1
+        self.interval = 1
+        self._countdown = 0
+        self._previous_gray = None
+        self._scale = 1.0
+        self.frames = 0
+        self.keyframes = 0
+        self.pixels = None
+        self.apply_config(config)
+
+    def apply_config(self, config):
+        """
+        นำการตั้งค่าที่โหลดใหม่ (hot reload) มาใช้ (detection.keyframes และเส้นนับ)
+
+        Args:
+            config (dict): Configuration dictionary
+        """
+        settings = config["detection"].get("keyframes", {})
+        self.min_interval = max(1, int(settings.get("min_interval", 1)))
+        self.max_interval = max(self.min_interval, int(settings.get("max_interval", 6)))
+        self.line_margin = settings.get("line_margin", 120)
+        self.match_iou = settings.get("match_iou", 0.3)
+        self.max_missed = settings.get("max_missed", 2)
+        self.optical_flow = settings.get("optical_flow", True)
+        self.flow_width = settings.get("flow_width", 640)
+        self.process_noise = settings.get("process_noise", 1.0)
+        self.measurement_noise = settings.get("measurement_noise", 4.0)
+        runtime = get_runtime_config(config)
+        self.line_enabled = runtime.line.enabled
+        self.geometry = runtime.geometry
+
+    def reserve_track_ids(self, next_track_id):
+        """
+        เริ่มหมายเลข track ใหม่ไม่ต่ำกว่า next_track_id (หลังกู้คืน checkpoint ของ LineCounter)
+
+        Args:
+            next_track_id (int): จาก LineCounter.next_tracker_id()
+        """
+        self.next_track_id = max(self.next_track_id, int(next_track_id))
+
+    def step(self, frame, detect):
+        """
+        ประมวลผลหนึ่งเฟรม: ตรวจจับถ้าเป็น keyframe ไม่เช่นนั้นเลื่อนกล่องของ track เดิม
+
+        Args:
+            frame (numpy.ndarray): Input frame
+            detect (callable): ฟังก์ชันตรวจจับ เช่น VehicleDetector.detect
+
+        Returns:
+            list: [x1, y1, x2, y2, confidence, class, track_id] ของ track ที่ยังเห็นอยู่
+        """
+        self.frames += 1
+        self.pixels = self.geometry.for_frame(frame)
+        gray = self._gray(frame)
+        for track in self.tracks:
+            track.predict()
+
+        if self._countdown <= 0:
+            self.keyframes += 1
+            self._associate(detect(frame))
+            self.interval = self._next_interval()
+            self._countdown = self.interval
+        else:
+            if self.optical_flow and self._previous_gray is not None and self._previous_gray.shape == gray.shape:
+                self._propagate(self._previous_gray, gray)
+            # รถที่เคลื่อนเข้าใกล้เส้นเร็วกว่าที่คาดไว้ -> เลื่อน keyframe ถัดไปให้เร็วขึ้น
+            self._countdown = min(self._countdown, self._next_interval())
+        self._countdown -= 1
+        self._previous_gray = gray
+        return [track.as_detection() for track in self.tracks if track.missed == 0]
+
+    def _gray(self, frame):
+        if not self.optical_flow:
+            return None
+        height, width = frame.shape[:2]
+        # ย่อภาพก่อนคำนวณ optical flow (เร็วขึ้นมากกับภาพความละเอียดสูง)
+        self._scale = min(1.0, self.flow_width / float(width))
+        if self._scale < 1.0:
+            frame = cv2.resize(frame, (int(width * self._scale), int(height * self._scale)),
+                               interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+    def _associate(self, detections):
+        """จับคู่ detection ของ keyframe กับ track (IoU สูงสุดก่อน) แล้วสร้าง track ใหม่ให้ที่เหลือ"""
+        matched_tracks, matched_detections = set(), set()
+        if self.tracks and detections:
+            track_boxes = np.array([track.box for track in self.tracks])
+            detection_boxes = np.array([det[:4] for det in detections], dtype=np.float64)
+            overlaps = iou_matrix(track_boxes, detection_boxes)
+            for t, d in zip(*np.unravel_index(np.argsort(-overlaps, axis=None), overlaps.shape)):
+                if overlaps[t, d] < self.match_iou:
+                    break
+                if t in matched_tracks or d in matched_detections:
+                    continue
+                track = self.tracks[t]
+                if track.cls != int(detections[d][5]):
+                    continue
+                track.correct(detections[d][:4])
+                track.confidence = detections[d][4]
+                track.missed = 0
+                matched_tracks.add(t)
+                matched_detections.add(d)
+
+        for index, track in enumerate(self.tracks):
+            if index not in matched_tracks:
+                track.missed += 1
+        self.tracks = [track for track in self.tracks if track.missed <= self.max_missed]
+
+        for index, detection in enumerate(detections):
+            if index not in matched_detections:
+                self.tracks.append(Track(self.next_track_id, detection, self.process_noise, self.measurement_noise))
+                self.next_track_id += 1
+
+    def _propagate(self, previous_gray, gray):
+        """เลื่อนกล่องตาม median ของการเคลื่อนที่ของจุดมุม (Lucas-Kanade) ภายในกล่อง"""
+        scale = self._scale
+        height, width = gray.shape[:2]
+        for track in self.tracks:
+            if track.missed:
+                continue
+            x1, y1, x2, y2 = [int(v * scale) for v in track.box]
+            x1, y1 = max(0, x1), max(0, y1)
+            x2, y2 = min(width, x2), min(height, y2)
+            if x2 - x1 < 8 or y2 - y1 < 8:
+                continue
+            mask = np.zeros_like(previous_gray)
+            mask[y1:y2, x1:x2] = 255
+            points = cv2.goodFeaturesToTrack(previous_gray, maxCorners=20, qualityLevel=0.01, minDistance=3,
+                                             mask=mask)
+            if points is None:
+                continue
+            moved, status, _ = cv2.calcOpticalFlowPyrLK(previous_gray, gray, points, None,
+                                                        winSize=(15, 15), maxLevel=2)
+            good = status.reshape(-1) == 1
+            if good.sum() < 3:
+                continue
+            dx, dy = np.median((moved - points).reshape(-1, 2)[good], axis=0) / scale
+            bx1, by1, bx2, by2 = track.box
+            # กล่องที่วัดจาก flow มีความไม่แน่นอนมากกว่า detection
+            track.correct((bx1 + dx, by1 + dy, bx2 + dx, by2 + dy), noise_scale=4.0)
+
+    def _next_interval(self):
+        """
+        จำนวนเฟรมถึง keyframe ถัดไป: ไม่มีรถ -> max_interval,
+        รถอยู่ใกล้เส้น (ภายใน line_margin) -> min_interval,
+        ไม่เช่นนั้นครึ่งหนึ่งของจำนวนเฟรมที่รถคันที่ใกล้ที่สุดจะถึงขอบ line_margin
+        """
+        line = self.pixels
+        if not self.tracks or not self.line_enabled:
+            return self.max_interval
+
+        frames_to_line = math.inf
+        for track in self.tracks:
+            cx, cy, _, _, vx, vy = track.state
+            distance = (line.a * cx + line.b * cy + line.c) / line.norm
+            if abs(distance) <= self.line_margin:
+                return self.min_interval
+            # ความเร็วในทิศเข้าหาเส้น (บวก = กำลังเข้าใกล้)
+            approach = -math.copysign(1.0, distance) * (line.a * vx + line.b * vy) / line.norm
+            if approach > 0:
+                frames_to_line = min(frames_to_line, (abs(distance) - self.line_margin) / approach)
+
+        if math.isinf(frames_to_line):
+            return self.max_interval
+        return int(min(self.max_interval, max(self.min_interval, frames_to_line // 2)))
+
+    def get_stats(self):
+        """
+        Returns:
+            dict: จำนวนเฟรม, สัดส่วน keyframe, ระยะห่างของ keyframe ปัจจุบัน และจำนวน track
+        """
+        return {
+            "frames": self.frames,
+            "keyframes": self.keyframes,
+            "keyframe_rate": self.keyframes / self.frames if self.frames else 0.0,
+            "interval": self.interval,
+            "tracks": len(self.tracks)
+        }
+
+
+def create_motion_tracker(config):
+    """
+    สร้าง MotionTracker ถ้าเปิดใช้งาน detection.keyframes
+
+    Returns:
+        MotionTracker | None
+    """
+    if not config["detection"].get("keyframes", {}).get("enabled", False):
+        return None
+    tracker = MotionTracker(config)
+    logger.info(f"Keyframe detection enabled: every {tracker.min_interval}-{tracker.max_interval} analyzed frames, "
+                f"optical flow {'on' if tracker.optical_flow else 'off'}")
+    return tracker
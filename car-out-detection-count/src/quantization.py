@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Quantization Module
+โมดูลสร้างโมเดล INT8 สำหรับ CPU (OpenVINO) โดย calibrate ด้วยเฟรมจากวิดีโอของกล้องเอง
+แล้วตรวจสอบเทียบกับโมเดลต้นฉบับ (ความตรงกันของ detection, ยอดนับ, FPS) ก่อนลงทะเบียนใน registry
+"""
+
+import os
+import copy
+import time
+import shutil
+import tempfile
+import cv2
+import yaml
+from loguru import logger
+
+from src.model_registry import ModelRegistry, load_yolo
+from src.runtime_config import get_runtime_config
+
+INT8_FORMAT = "openvino-int8"
+
+
+def _footage(config):
+    """วิดีโอที่ใช้ calibrate/ตรวจสอบ (quantization.footage หรือ video_source.test_video)"""
+    footage = config.get("quantization", {}).get("footage") or [config["video_source"]["test_video"]]
+    missing = [path for path in footage if not os.path.exists(path)]
+    if missing:
+        raise FileNotFoundError(f"Quantization footage not found: {', '.join(missing)}")
+    return footage
+
+
+def _frame_count(path):
+    capture = cv2.VideoCapture(path)
+    try:
+        return int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    finally:
+        capture.release()
+
+
+def validation_clip(config, footage, frames):
+    """
+    คลิปที่ใช้ตรวจสอบโมเดล INT8 ซึ่งไม่ใช้เป็นข้อมูล calibration
+
+    ใช้ quantization.validation_footage ถ้ากำหนด ไม่เช่นนั้นกันช่วงท้ายของวิดีโอสุดท้ายใน footage
+    (ไม่เกินครึ่งวิดีโอ) ไว้สำหรับตรวจสอบ และ sample calibration เฉพาะเฟรมก่อนช่วงนั้น
+
+    Returns:
+        tuple: (path, เฟรมเริ่มต้น, {path: จำนวนเฟรมแรกที่ใช้ calibrate ได้})
+    """
+    held_out = config.get("quantization", {}).get("validation_footage") or []
+    if held_out:
+        if not os.path.exists(held_out[0]):
+            raise FileNotFoundError(f"Quantization validation footage not found: {held_out[0]}")
+        return held_out[0], 0, {}
+
+    path = footage[-1]
+    total = _frame_count(path)
+    if total <= 0:
+        logger.warning(f"Frame count of {path} is unknown; validating on frames that may be in the calibration set")
+        return path, 0, {}
+    start = max(total // 2, total - frames)
+    return path, start, {path: start}
+
+
+def sample_calibration_frames(footage, count, output_dir, frame_limits=None):
+    """
+    สุ่มเฟรมแบบกระจายเท่า ๆ กันจากวิดีโอทุกไฟล์ แล้วบันทึกเป็น JPEG
+
+    Args:
+        footage (list): Path ของวิดีโอ
+        count (int): จำนวนเฟรมทั้งหมด
+        output_dir (str): ไดเรกทอรีที่จะบันทึกภาพ
+        frame_limits (dict, optional): {path: จำนวนเฟรมแรกที่ใช้ได้} (ช่วงหลังจากนั้นกันไว้ตรวจสอบ)
+
+    Returns:
+        int: จำนวนภาพที่บันทึก
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    frame_limits = frame_limits or {}
+    per_video = max(1, count // len(footage))
+    saved = 0
+    for video_index, path in enumerate(footage):
+        capture = cv2.VideoCapture(path)
+        total = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        samples = per_video
+        if path in frame_limits:
+            total = min(total, frame_limits[path])
+            samples = min(per_video, total)
+        step = max(1, total // samples) if total > 0 and samples > 0 else 1
+        for index in range(samples):
+            capture.set(cv2.CAP_PROP_POS_FRAMES, index * step)
+            ret, frame = capture.read()
+            if not ret:
+                break
+            cv2.imwrite(os.path.join(output_dir, f"{video_index:02d}_{index:05d}.jpg"), frame)
+            saved += 1
+        capture.release()
+    return saved
+
+
+def write_dataset_yaml(path, images_dir, names):
+    """ไฟล์ dataset (รูปแบบ ultralytics) ที่ชี้ไปยังภาพ calibration"""
+    dataset = {"path": os.path.abspath(images_dir), "train": ".", "val": ".", "names": dict(names)}
+    with open(path, 'w', encoding='utf-8') as file:
+        yaml.safe_dump(dataset, file, allow_unicode=True)
+    return path
+
+
+def box_iou(a, b):
+    """IoU ของกล่อง [x1, y1, x2, y2]"""
+    width = min(a[2], b[2]) - max(a[0], b[0])
+    height = min(a[3], b[3]) - max(a[1], b[1])
+    if width <= 0 or height <= 0:
+        return 0.0
+    intersection = width * height
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+def match_detections(reference, candidate, iou_threshold=0.5):
+    """
+    จับคู่ detection ที่ class เดียวกันและ IoU >= iou_threshold (greedy ตาม IoU สูงสุด)
+
+    Returns:
+        int: จำนวนคู่ที่ตรงกัน
+    """
+    pairs = []
+    for i, ref in enumerate(reference):
+        for j, cand in enumerate(candidate):
+            if ref[5] == cand[5]:
+                iou = box_iou(ref, cand)
+                if iou >= iou_threshold:
+                    pairs.append((iou, i, j))
+
+    matched_ref, matched_cand = set(), set()
+    for _, i, j in sorted(pairs, reverse=True):
+        if i not in matched_ref and j not in matched_cand:
+            matched_ref.add(i)
+            matched_cand.add(j)
+    return len(matched_ref)
+
+
+def run_clip(detector, video_path, frames, config, stride=1, start_frame=0):
+    """
+    รันโมเดลบนคลิปต่อเนื่อง (ตั้งแต่ start_frame) พร้อมนับรถด้วย LineCounter เหมือนลูปหลัก
+
+    Args:
+        detector (VehicleDetector): ตัวตรวจจับที่โหลดโมเดลแล้ว
+        video_path (str): Path ของวิดีโอ
+        frames (int): จำนวนเฟรมที่ใช้
+        config (dict): Configuration dictionary
+        stride (int): ตรวจจับทุก N เฟรม (detection.frame_stride)
+        start_frame (int): เฟรมแรกของคลิป
+
+    Returns:
+        dict: detections ต่อเฟรม (None = เฟรมที่ข้าม), FPS ของวิดีโอที่รองรับได้ และยอดนับ
+    """
+    from src.line_counter import LineCounter
+
+    if detector.model is None:
+        raise RuntimeError("Model failed to load, cannot run the validation clip")
+    line_counter = LineCounter(config)
+    capture = cv2.VideoCapture(video_path)
+    if start_frame:
+        capture.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+    detections = []
+    processing_time = 0.0
+    try:
+        while len(detections) < frames:
+            ret, frame = capture.read()
+            if not ret:
+                break
+            if len(detections) % stride:
+                detections.append(None)
+                continue
+            # จับเวลาเฉพาะการตรวจจับและนับ (ไม่รวมการ decode วิดีโอ)
+            started = time.perf_counter()
+            result = detector.detect(frame)
+            line_counter.update(frame, result)
+            processing_time += time.perf_counter() - started
+            detections.append(result)
+    finally:
+        capture.release()
+
+    return {
+        "detections": detections,
+        "fps": len(detections) / processing_time if processing_time > 0 else 0.0,
+        "count": line_counter.total_count
+    }
+
+
+def compare_runs(reference, candidate):
+    """
+    เปรียบเทียบผลของโมเดลต้นฉบับกับโมเดล INT8
+
+    Returns:
+        dict: agreement (F1 ของการจับคู่ detection), ยอดนับ, FPS และ speedup
+    """
+    matched = reference_total = candidate_total = 0
+    for ref, cand in zip(reference["detections"], candidate["detections"]):
+        if ref is None or cand is None:
+            continue
+        matched += match_detections(ref, cand)
+        reference_total += len(ref)
+        candidate_total += len(cand)
+
+    total = reference_total + candidate_total
+    return {
+        "frames": min(len(reference["detections"]), len(candidate["detections"])),
+        "agreement": 2 * matched / total if total else 1.0,
+        "reference_detections": reference_total,
+        "candidate_detections": candidate_total,
+        "reference_count": reference["count"],
+        "candidate_count": candidate["count"],
+        "count_delta": abs(candidate["count"] - reference["count"]) / max(1, reference["count"]),
+        "reference_fps": reference["fps"],
+        "candidate_fps": candidate["fps"],
+        "speedup": candidate["fps"] / reference["fps"] if reference["fps"] else 0.0
+    }
+
+
+def check_thresholds(report, settings):
+    """
+    Returns:
+        list: เหตุผลที่ไม่ผ่าน (ว่าง = ผ่าน)
+    """
+    failures = []
+    if report["agreement"] < settings.get("min_agreement", 0.95):
+        failures.append(f"agreement {report['agreement']:.3f} < {settings.get('min_agreement', 0.95)}")
+    if report["count_delta"] > settings.get("max_count_delta", 0.02):
+        failures.append(f"count {report['candidate_count']} vs {report['reference_count']} "
+                        f"(delta {report['count_delta']:.3f} > {settings.get('max_count_delta', 0.02)})")
+    if report["speedup"] < settings.get("min_speedup", 1.2):
+        failures.append(f"speedup {report['speedup']:.2f}x < {settings.get('min_speedup', 1.2)}x")
+    return failures
+
+
+def quantize_model(config):
+    """
+    สร้าง ตรวจสอบ และลงทะเบียนโมเดล INT8 ของ model.model_path
+
+    Args:
+        config (dict): Configuration dictionary
+
+    Returns:
+        dict: รายงานผล (passed, metrics, failures, path)
+    """
+    from src.vehicle_detector import VehicleDetector
+
+    settings = config.get("quantization", {})
+    model_config = get_runtime_config(config).model
+    footage = _footage(config)
+    registry = ModelRegistry(config)
+    path = registry.resolve(model_config.model_path)
+    sha256 = registry.verify(path, model_config.sha256)
+    imgsz = model_config.imgsz
+
+    frames = settings.get("validation_frames", 900)
+    validation_path, validation_start, frame_limits = validation_clip(config, footage, frames)
+
+    YOLO = load_yolo()
+    workdir = tempfile.mkdtemp(prefix="quantize-")
+    try:
+        # 1. calibration set จากวิดีโอของกล้องเอง (ไม่รวมช่วงที่ใช้ตรวจสอบ)
+        images_dir = os.path.join(workdir, "images")
+        saved = sample_calibration_frames(footage, settings.get("calibration_frames", 300), images_dir,
+                                          frame_limits)
+        if saved == 0:
+            raise ValueError(f"No frames could be read from {', '.join(footage)}")
+        source = YOLO(path)
+        dataset = write_dataset_yaml(os.path.join(workdir, "calibration.yaml"), images_dir, source.names)
+        logger.info(f"Calibrating INT8 model with {saved} frames from {len(footage)} video(s)...")
+
+        # 2. export INT8 (OpenVINO + NNCF post-training quantization)
+        started = time.perf_counter()
+        exported = source.export(format="openvino", int8=True, data=dataset, imgsz=imgsz, device="cpu")
+        export_time = time.perf_counter() - started
+        logger.info(f"INT8 export finished in {export_time:.0f}s")
+
+        # 3. เทียบกับโมเดลต้นฉบับ (FP32) บนคลิปที่ไม่ได้ใช้ calibrate ด้วย VehicleDetector ตัวเดียวกับที่ใช้งานจริง
+        # ทั้งสองโมเดลรันบน CPU เพื่อให้ speedup เทียบบนอุปกรณ์เดียวกัน
+        logger.info(f"Validating on {validation_path} from frame {validation_start}")
+        reference_config = copy.deepcopy(config)
+        reference_config["model"]["format"] = "pytorch"
+        reference_config["model"]["device"] = "cpu"
+        reference = run_clip(VehicleDetector(reference_config), validation_path, frames, config,
+                             start_frame=validation_start)
+
+        candidate_config = copy.deepcopy(config)
+        candidate_config["model"]["device"] = "cpu"
+        candidate_model = YOLO(str(exported), task="detect")
+        registry.warm_up(candidate_model, imgsz)
+        candidate = run_clip(VehicleDetector(candidate_config, model=candidate_model), validation_path, frames,
+                             config, start_frame=validation_start)
+
+        report = compare_runs(reference, candidate)
+        report["export_time"] = export_time
+        report["calibration_frames"] = saved
+        failures = check_thresholds(report, settings)
+
+        # 4. ลงทะเบียนเฉพาะเมื่อผ่านเกณฑ์
+        if failures:
+            logger.warning(f"INT8 model rejected: {'; '.join(failures)}")
+            shutil.rmtree(str(exported), ignore_errors=True)
+            target = None
+        else:
+            target = registry.register(exported, path, sha256, imgsz, INT8_FORMAT, validation=report)
+            logger.info(f"INT8 model registered at {target}; select it with model.format: {INT8_FORMAT}")
+        return {"passed": not failures, "failures": failures, "path": target, "metrics": report}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,429 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Rollups Module
+โมดูลสำหรับสรุปจำนวนรถรายนาที/รายชั่วโมง/รายวันแบบ incremental
+"""
+
+import os
+import math
+import zlib
+import struct
+import threading
+from datetime import datetime, date as date_cls
+from loguru import logger
+
+try:
+    import fcntl
+except ImportError:  # Windows: ไม่มี advisory lock ของไฟล์
+    fcntl = None
+
+from src.state_store import atomic_write
+
+# ระดับความละเอียดของ rollup และจำนวน bucket ต่อวัน
+GRANULARITIES = {"minute": 1440, "hour": 24, "day": 1}
+
+# การเข้ารหัสทิศทางในไฟล์
+_DIRECTION_CODES = {"unknown": 0, "up": 1, "down": 2}
+_DIRECTION_NAMES = {code: name for name, code in _DIRECTION_CODES.items()}
+_GRANULARITY_CODES = {"minute": 0, "hour": 1, "day": 2}
+_GRANULARITY_NAMES = {code: name for name, code in _GRANULARITY_CODES.items()}
+
+# รูปแบบไฟล์ rollup (little-endian)
+# header : magic, version, จำนวนกล้อง, เวลา (epoch) ของเหตุการณ์ล่าสุดที่รวมแล้ว (NaN = ยังไม่มี)
+# camera : ความยาวชื่อ, ชื่อกล้อง (utf-8)
+# section: granularity, จำนวน entries
+# entry  : bucket, camera index, class, direction, count
+# trailer: crc32
+ROLLUP_MAGIC = b"VDRU"
+ROLLUP_VERSION = 2
+_HEADER = struct.Struct("<4sHHd")
+_NAME_LEN = struct.Struct("<H")
+_SECTION = struct.Struct("<BI")
+_ENTRY = struct.Struct("<iHbbI")
+_CRC = struct.Struct("<I")
+
+
+def bucket_of(moment, granularity):
+    """
+    คำนวณหมายเลข bucket จากเวลา (ใช้ลำดับวันตามปฏิทินของเวลาท้องถิ่น)
+
+    Args:
+        moment (datetime): เวลาของเหตุการณ์
+        granularity (str): "minute", "hour" หรือ "day"
+
+    Returns:
+        int: หมายเลข bucket
+    """
+    day = moment.toordinal()
+    if granularity == "minute":
+        return day * 1440 + moment.hour * 60 + moment.minute
+    elif granularity == "hour":
+        return day * 24 + moment.hour
+    return day
+
+
+def bucket_start(bucket, granularity):
+    """
+    แปลงหมายเลข bucket กลับเป็นเวลาเริ่มต้นของ bucket
+
+    Args:
+        bucket (int): หมายเลข bucket
+        granularity (str): "minute", "hour" หรือ "day"
+
+    Returns:
+        datetime: เวลาเริ่มต้นของ bucket
+    """
+    day, offset = divmod(bucket, GRANULARITIES[granularity])
+    base = datetime.fromordinal(day)
+    if granularity == "minute":
+        return base.replace(hour=offset // 60, minute=offset % 60)
+    elif granularity == "hour":
+        return base.replace(hour=offset)
+    return base
+
+
+class RollupStore:
+    """Class for incrementally maintained per-camera/class/direction count rollups"""
+
+    def __init__(self, config):
+        """
+        Initialize RollupStore
+
+        Args:
+            config (dict): Configuration dictionary
+        """
+        rollup_config = config.get("rollups", {})
+        self.enabled = rollup_config.get("enabled", True)
+        self.path = rollup_config.get("path", "./logs/vehicle_counts/rollups.bin")
+        self.persist_interval = rollup_config.get("persist_interval", 30)
+        self.retention_days = {
+            "minute": rollup_config.get("minute_retention_days", 7),
+            "hour": rollup_config.get("hour_retention_days", 400),
+            "day": None
+        }
+
+        # {granularity: {bucket: {(camera_id, class, direction): count}}}
+        self._rollups = {granularity: {} for granularity in GRANULARITIES}
+        # เวลา (epoch) ของเหตุการณ์ล่าสุดที่รวมใน rollup แล้ว ใช้เล่นซ้ำเหตุการณ์หลังจากนั้นเมื่อเริ่มใหม่
+        self.applied_until = None
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._lock_file = None
+
+    def add(self, moment, camera_id, cls, direction, count=1):
+        """
+        เพิ่มจำนวนนับเข้า rollup ทุกระดับ (O(1) ต่อเหตุการณ์)
+
+        Args:
+            moment (datetime): เวลาของเหตุการณ์
+            camera_id (str): รหัสกล้อง
+            cls (int): class ของรถ (-1 ถ้าไม่ทราบ)
+            direction (str): "up", "down" หรือ "unknown"
+            count (int): จำนวนที่จะเพิ่ม
+        """
+        key = (camera_id, int(cls), direction)
+        epoch = moment.timestamp()
+        with self._lock:
+            for granularity, buckets in self._rollups.items():
+                counts = buckets.setdefault(bucket_of(moment, granularity), {})
+                counts[key] = counts.get(key, 0) + count
+            if self.applied_until is None or epoch > self.applied_until:
+                self.applied_until = epoch
+            self._dirty = True
+
+    def daily_summary(self, date, camera_id=None):
+        """
+        สรุปจำนวนรถรายชั่วโมงของวันที่กำหนดจาก rollup รายชั่วโมง
+
+        Args:
+            date (str): วันที่ "YYYY-MM-DD"
+            camera_id (str, optional): กรองเฉพาะกล้องที่กำหนด
+
+        Returns:
+            tuple: (total_count, {"HH": count})
+        """
+        first_hour = datetime.strptime(date, "%Y-%m-%d").toordinal() * 24
+        hourly_counts = {}
+        with self._lock:
+            hours = self._rollups["hour"]
+            for hour in range(24):
+                counts = hours.get(first_hour + hour)
+                if not counts:
+                    continue
+                total = sum(count for (row_camera_id, _, _), count in counts.items()
+                            if camera_id is None or row_camera_id == camera_id)
+                if total:
+                    hourly_counts[f"{hour:02d}"] = total
+        return sum(hourly_counts.values()), hourly_counts
+
+    def query(self, granularity, start, end, camera_id=None, cls=None, direction=None):
+        """
+        ดึงข้อมูล rollup ในช่วงเวลาที่กำหนด (สำหรับ dashboard)
+
+        Args:
+            granularity (str): "minute", "hour" หรือ "day"
+            start (datetime): เวลาเริ่มต้น (รวม)
+            end (datetime): เวลาสิ้นสุด (รวม)
+            camera_id (str, optional): กรองเฉพาะกล้อง
+            cls (int, optional): กรองเฉพาะ class
+            direction (str, optional): กรองเฉพาะทิศทาง
+
+        Returns:
+            list: [{"time": datetime, "camera_id": str, "class": int, "direction": str, "count": int}]
+        """
+        first, last = bucket_of(start, granularity), bucket_of(end, granularity)
+        results = []
+        with self._lock:
+            buckets = self._rollups[granularity]
+            # เลือกวิธีที่ถูกกว่าระหว่างไล่ทุก bucket ในช่วง หรือไล่เฉพาะ bucket ที่มีข้อมูล
+            if last - first + 1 <= len(buckets):
+                candidates = [bucket for bucket in range(first, last + 1) if bucket in buckets]
+            else:
+                candidates = sorted(bucket for bucket in buckets if first <= bucket <= last)
+
+            for bucket in candidates:
+                for (row_camera_id, row_cls, row_direction), count in buckets[bucket].items():
+                    if camera_id is not None and row_camera_id != camera_id:
+                        continue
+                    if cls is not None and row_cls != cls:
+                        continue
+                    if direction is not None and row_direction != direction:
+                        continue
+                    results.append({
+                        "time": bucket_start(bucket, granularity),
+                        "camera_id": row_camera_id,
+                        "class": row_cls,
+                        "direction": row_direction,
+                        "count": count
+                    })
+        return results
+
+    def rebuild(self, events):
+        """
+        สร้าง rollup ใหม่ทั้งหมดจากข้อมูลดิบ
+
+        Args:
+            events (iterable): (datetime, camera_id, class, direction, count)
+
+        Returns:
+            int: จำนวนเหตุการณ์ที่ประมวลผล
+        """
+        with self._lock:
+            self._rollups = {granularity: {} for granularity in GRANULARITIES}
+            self.applied_until = None
+            self._dirty = True
+
+        processed = 0
+        for moment, camera_id, cls, direction, count in events:
+            self.add(moment, camera_id, cls, direction, count)
+            processed += 1
+
+        self.prune()
+        logger.info(f"Rollups rebuilt from {processed} event(s)")
+        return processed
+
+    def replay(self, events):
+        """
+        เพิ่มเหตุการณ์ที่เกิดหลังการบันทึกไฟล์ครั้งล่าสุด (เช่น หลังโปรแกรมหยุดทำงานกะทันหัน)
+
+        Args:
+            events (iterable): (datetime, camera_id, class, direction, count) ที่เกิดหลัง applied_until
+
+        Returns:
+            int: จำนวนเหตุการณ์ที่ประมวลผล
+        """
+        processed = 0
+        for moment, camera_id, cls, direction, count in events:
+            self.add(moment, camera_id, cls, direction, count)
+            processed += 1
+
+        if processed:
+            logger.info(f"Rollups caught up with {processed} event(s) logged after the last save")
+        return processed
+
+    def prune(self, today=None):
+        """
+        ลบ bucket ที่เก่ากว่าระยะเวลาเก็บรักษาที่กำหนด
+
+        Args:
+            today (date, optional): วันอ้างอิง. ถ้าไม่ระบุจะใช้วันปัจจุบัน.
+        """
+        today = (today or date_cls.today()).toordinal()
+        with self._lock:
+            for granularity, retention in self.retention_days.items():
+                if retention is None:
+                    continue
+                oldest = (today - retention) * GRANULARITIES[granularity]
+                buckets = self._rollups[granularity]
+                for bucket in [bucket for bucket in buckets if bucket < oldest]:
+                    del buckets[bucket]
+                    self._dirty = True
+
+    def encode(self):
+        """
+        แปลง rollup เป็นข้อมูลไบนารี
+
+        Returns:
+            bytes: ข้อมูล rollup
+        """
+        with self._lock:
+            snapshot = {granularity: {bucket: dict(counts) for bucket, counts in buckets.items()}
+                        for granularity, buckets in self._rollups.items()}
+            applied_until = self.applied_until
+
+        cameras = {}
+        sections = []
+        for granularity, buckets in snapshot.items():
+            entries = []
+            for bucket, counts in buckets.items():
+                for (camera_id, cls, direction), count in counts.items():
+                    camera_index = cameras.setdefault(camera_id, len(cameras))
+                    entries.append(_ENTRY.pack(bucket, camera_index, cls, _DIRECTION_CODES[direction], count))
+            sections.append(_SECTION.pack(_GRANULARITY_CODES[granularity], len(entries)))
+            sections.extend(entries)
+
+        parts = [_HEADER.pack(ROLLUP_MAGIC, ROLLUP_VERSION, len(cameras),
+                              math.nan if applied_until is None else applied_until)]
+        for camera_id in cameras:
+            encoded = camera_id.encode('utf-8')
+            parts.append(_NAME_LEN.pack(len(encoded)))
+            parts.append(encoded)
+        parts.extend(sections)
+
+        payload = b"".join(parts)
+        return payload + _CRC.pack(zlib.crc32(payload))
+
+    def decode(self, data):
+        """
+        โหลด rollup จากข้อมูลไบนารี
+
+        Args:
+            data (bytes): ข้อมูล rollup
+
+        Raises:
+            ValueError: ถ้าไฟล์เสียหายหรือไม่ใช่รูปแบบที่รองรับ
+        """
+        if len(data) < _HEADER.size + _CRC.size:
+            raise ValueError("Rollup file is truncated")
+
+        payload, (crc,) = data[:-_CRC.size], _CRC.unpack(data[-_CRC.size:])
+        if zlib.crc32(payload) != crc:
+            raise ValueError("Rollup checksum mismatch")
+
+        magic, version, n_cameras, applied_until = _HEADER.unpack_from(payload, 0)
+        if magic != ROLLUP_MAGIC or version != ROLLUP_VERSION:
+            # ไฟล์รุ่นเก่าไม่มีเวลาของเหตุการณ์ล่าสุด จึงต้องสร้างใหม่จากข้อมูลดิบ
+            raise ValueError("Unsupported rollup file")
+
+        offset = _HEADER.size
+        cameras = []
+        for _ in range(n_cameras):
+            (name_len,) = _NAME_LEN.unpack_from(payload, offset)
+            offset += _NAME_LEN.size
+            cameras.append(payload[offset:offset + name_len].decode('utf-8'))
+            offset += name_len
+
+        rollups = {granularity: {} for granularity in GRANULARITIES}
+        while offset < len(payload):
+            granularity_code, n_entries = _SECTION.unpack_from(payload, offset)
+            offset += _SECTION.size
+            buckets = rollups[_GRANULARITY_NAMES[granularity_code]]
+            for bucket, camera_index, cls, direction, count in _ENTRY.iter_unpack(
+                    payload[offset:offset + n_entries * _ENTRY.size]):
+                key = (cameras[camera_index], cls, _DIRECTION_NAMES[direction])
+                buckets.setdefault(bucket, {})[key] = count
+            offset += n_entries * _ENTRY.size
+
+        with self._lock:
+            self._rollups = rollups
+            self.applied_until = None if math.isnan(applied_until) else applied_until
+            self._dirty = False
+
+    def load(self):
+        """
+        โหลด rollup จากไฟล์
+
+        Returns:
+            bool: True ถ้าโหลดสำเร็จ, False ถ้าไม่มีไฟล์หรือไฟล์เสียหาย
+        """
+        if not os.path.isfile(self.path):
+            return False
+
+        try:
+            with open(self.path, 'rb') as file:
+                self.decode(file.read())
+            logger.info(f"Rollups loaded from {self.path}")
+            return True
+        except Exception as e:
+            logger.error(f"Error loading rollups: {e}")
+            return False
+
+    def save(self):
+        """
+        บันทึก rollup ลงไฟล์แบบ atomic (เฉพาะเมื่อมีการเปลี่ยนแปลง)
+
+        Returns:
+            bool: False ถ้าบันทึกไม่สำเร็จ
+        """
+        if not self._dirty:
+            return True
+
+        try:
+            self._dirty = False
+            atomic_write(self.path, self.encode())
+            return True
+        except Exception as e:
+            self._dirty = True
+            logger.error(f"Error saving rollups: {e}")
+            return False
+
+    def lock(self):
+        """
+        ล็อกไฟล์ rollup สำหรับเขียน (advisory lock ที่ path + ".lock") จนกว่าจะ close()
+
+        Returns:
+            bool: True ถ้าได้ล็อก (หรือระบบไม่รองรับ fcntl), False ถ้า process อื่นถือล็อกอยู่
+        """
+        if fcntl is None or self._lock_file is not None:
+            return True
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        lock_file = open(f"{self.path}.lock", 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def start(self):
+        """เริ่ม background thread สำหรับบันทึก rollup เป็นระยะ (ถือล็อกของไฟล์ไว้ระหว่างทำงาน)"""
+        if not self.lock():
+            logger.warning(f"{self.path} is locked by another process; its rollups may be overwritten")
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._persist_loop, name="rollup-writer", daemon=True)
+            self._thread.start()
+
+    def close(self):
+        """หยุด background thread และบันทึก rollup ครั้งสุดท้าย"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+        self.save()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def _persist_loop(self):
+        """Background loop ที่ตัด bucket เก่าและบันทึก rollup เป็นระยะ"""
+        while not self._stop_event.wait(self.persist_interval):
+            self.prune()
+            self.save()
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Runtime Config Module
+โมดูลแปลงการตั้งค่า (dict) เป็น object แบบ frozen ที่คำนวณค่าที่ใช้ทุกเฟรมไว้ล่วงหน้า
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+
+from src.geometry import REFERENCE_SIZE, SceneGeometry, normalize_points
+from src.model_registry import MODEL_FORMATS, predict_ultralytics
+
+# model.type ที่รองรับ และฟังก์ชัน inference ของแต่ละ type (เลือกครั้งเดียวตอนสร้าง RuntimeConfig)
+MODEL_BACKENDS = {
+    "yolov5": predict_ultralytics,
+    "yolov5m": predict_ultralytics,
+    "yolov8": predict_ultralytics
+}
+
+
+class ConfigError(ValueError):
+    """Raised when the configuration is malformed"""
+
+
+@dataclass(frozen=True)
+class GeneralConfig:
+    """Settings from the general section read in the frame loop"""
+
+    __slots__ = ("test_mode", "debug", "display_output", "save_output_video", "output_path")
+    test_mode: bool
+    debug: bool
+    display_output: bool
+    save_output_video: bool
+    output_path: str
+
+
+@dataclass(frozen=True)
+class ModelConfig:
+    """Model settings with the inference backend resolved from model.type"""
+
+    __slots__ = ("type", "backend", "model_path", "confidence_threshold", "classes", "device",
+                 "format", "imgsz", "sha256")
+    type: str
+    backend: object
+    model_path: str
+    confidence_threshold: float
+    classes: tuple
+    device: str
+    format: str
+    imgsz: int
+    sha256: str
+
+
+@dataclass(frozen=True)
+class LineConfig:
+    """Counting line with its equation ax + by + c = 0 at the reference size"""
+
+    __slots__ = ("enabled", "position", "percent", "direction", "a", "b", "c", "norm")
+    enabled: bool
+    position: tuple
+    percent: tuple
+    direction: str
+    a: int
+    b: int
+    c: int
+    norm: float
+
+
+@dataclass(frozen=True, eq=False)
+class RoiConfig:
+    """Region of interest with its polygon at the reference size and as fractions of the frame (if scalable)"""
+
+    __slots__ = ("enabled", "points", "percent")
+    enabled: bool
+    points: np.ndarray
+    percent: tuple
+
+
+@dataclass(frozen=True)
+class TilingConfig:
+    """Tiled inference settings for high-resolution frames"""
+
+    __slots__ = ("enabled", "tile_size", "overlap", "min_roi_coverage", "nms_iou", "nms_containment")
+    enabled: bool
+    tile_size: int
+    overlap: float
+    min_roi_coverage: float
+    nms_iou: float
+    nms_containment: float
+
+
+@dataclass(frozen=True)
+class DetectionConfig:
+    """Frame loop settings of the detection section"""
+
+    __slots__ = ("frame_stride", "reference_size", "tiling")
+    frame_stride: int
+    reference_size: tuple
+    tiling: TilingConfig
+
+
+@dataclass(frozen=True, eq=False)
+class RuntimeConfig:
+    """Validated, immutable view of the configuration used in the frame loop"""
+
+    __slots__ = ("general", "model", "detection", "line", "roi", "geometry")
+    general: GeneralConfig
+    model: ModelConfig
+    detection: DetectionConfig
+    line: LineConfig
+    roi: RoiConfig
+    geometry: SceneGeometry
+
+
+def _section(config, name):
+    section = config.get(name)
+    if not isinstance(section, dict):
+        raise ConfigError(f"missing section '{name}'")
+    return section
+
+
+def build_model_config(model_section):
+    """
+    สร้าง ModelConfig จากส่วน model ของการตั้งค่า (ใช้ทั้งตอนโหลดและตอนสลับโมเดล)
+
+    Args:
+        model_section (dict): ส่วน model ของการตั้งค่า
+
+    Returns:
+        ModelConfig: การตั้งค่าโมเดลแบบ frozen
+
+    Raises:
+        ConfigError: ถ้าการตั้งค่าไม่ถูกต้อง
+    """
+    try:
+        model_type = str(model_section.get("type", "")).lower()
+        if model_type not in MODEL_BACKENDS:
+            raise ConfigError(f"unsupported model.type '{model_section.get('type')}'")
+        classes = model_section.get("classes")
+        model_format = str(model_section.get("format", "pytorch")).lower()
+        if model_format not in MODEL_FORMATS:
+            raise ConfigError(f"unsupported model.format '{model_section.get('format')}'")
+        imgsz = int(model_section.get("imgsz", 640))
+        if imgsz <= 0:
+            raise ConfigError("model.imgsz must be a positive integer")
+        sha256 = model_section.get("sha256")
+        return ModelConfig(
+            type=model_type,
+            backend=MODEL_BACKENDS[model_type],
+            model_path=str(model_section.get("model_path", "")),
+            confidence_threshold=float(model_section["confidence_threshold"]),
+            classes=tuple(int(c) for c in classes) if classes is not None else None,
+            device=str(model_section.get("device", "cpu")),
+            format=model_format,
+            imgsz=imgsz,
+            sha256=str(sha256).lower() if sha256 else None
+        )
+    except ConfigError:
+        raise
+    except (KeyError, TypeError, ValueError) as e:
+        raise ConfigError(f"malformed model configuration: {e!r}") from e
+
+
+def build_runtime_config(config):
+    """
+    สร้าง RuntimeConfig จากการตั้งค่า (ควรผ่าน validate_config มาแล้ว)
+
+    Args:
+        config (dict): Configuration dictionary
+
+    Returns:
+        RuntimeConfig: การตั้งค่าแบบ frozen
+
+    Raises:
+        ConfigError: ถ้าการตั้งค่าไม่ถูกต้อง
+    """
+    if not isinstance(config, dict):
+        raise ConfigError("configuration must be a mapping")
+
+    try:
+        general_section = _section(config, "general")
+        general = GeneralConfig(
+            test_mode=bool(general_section.get("test_mode", False)),
+            debug=bool(general_section.get("debug", False)),
+            display_output=bool(general_section.get("display_output", False)),
+            save_output_video=bool(general_section.get("save_output_video", False)),
+            output_path=str(general_section.get("output_path", "./output"))
+        )
+
+        model = build_model_config(_section(config, "model"))
+
+        detection_section = _section(config, "detection")
+        frame_stride = int(detection_section.get("frame_stride", 1))
+        if frame_stride < 1:
+            raise ConfigError("detection.frame_stride must be a positive integer")
+        tiling_section = detection_section.get("tiling", {})
+        tiling = TilingConfig(
+            enabled=bool(tiling_section.get("enabled", False)),
+            # 0 = ใช้ model.imgsz (ส่งแต่ละช่องเข้าโมเดลโดยไม่ย่อ)
+            tile_size=int(tiling_section.get("tile_size", 0)) or model.imgsz,
+            overlap=float(tiling_section.get("overlap", 0.2)),
+            min_roi_coverage=float(tiling_section.get("min_roi_coverage", 0.0)),
+            nms_iou=float(tiling_section.get("nms_iou", 0.5)),
+            nms_containment=float(tiling_section.get("nms_containment", 0.8))
+        )
+        if tiling.tile_size < 32:
+            raise ConfigError("detection.tiling.tile_size must be at least 32 pixels")
+        if not 0 <= tiling.overlap < 1:
+            raise ConfigError("detection.tiling.overlap must be in [0, 1)")
+        # ขนาดภาพที่ใช้วัดพิกัด pixel ในการตั้งค่า (เส้นนับและ ROI)
+        reference_size = tuple(int(v) for v in detection_section.get("reference_size", REFERENCE_SIZE))
+        if len(reference_size) != 2 or min(reference_size) <= 0:
+            raise ConfigError("detection.reference_size must be [width, height] in pixels")
+        detection = DetectionConfig(frame_stride=frame_stride, reference_size=reference_size, tiling=tiling)
+
+        # เส้นนับและ ROI เก็บเป็นสัดส่วนของภาพ (พิกัดร้อยละมาก่อน ไม่เช่นนั้นแปลงจากพิกัด pixel)
+        line_section = detection_section.get("line_crossing", {})
+        if "line_position_percent" in line_section:
+            percent = tuple(tuple(float(v) for v in point) for point in line_section["line_position_percent"])
+        else:
+            percent = normalize_points(line_section["line_position"], *reference_size)
+
+        roi_section = detection_section.get("region_of_interest", {})
+        roi_enabled = bool(roi_section.get("enabled", False))
+        roi_percent = ()
+        roi_pixels = None
+        if roi_enabled:
+            if roi_section.get("points_percent"):
+                roi_percent = tuple(tuple(float(v) for v in point) for point in roi_section["points_percent"])
+            elif "reference_size" in detection_section:
+                roi_percent = normalize_points(roi_section.get("points", []), *reference_size)
+            else:
+                # การตั้งค่าเดิมที่วาด ROI บนเฟรมจริงโดยไม่ระบุ reference_size: ใช้พิกัด pixel ตรงๆ ทุกขนาดเฟรม
+                roi_pixels = tuple(tuple(int(v) for v in point) for point in roi_section.get("points", []))
+            if len(roi_percent or roi_pixels) < 3:
+                raise ConfigError("detection.region_of_interest.points must be at least three [x, y] points")
+
+        geometry = SceneGeometry(percent, roi_percent or None, reference_size, roi_pixels)
+        reference = geometry.reference
+        if reference.a == 0 and reference.b == 0:
+            raise ConfigError("detection.line_crossing.line_position points must differ")
+        line = LineConfig(
+            enabled=bool(line_section.get("enabled", True)),
+            position=reference.line,
+            percent=geometry.line_percent,
+            direction=line_section.get("direction", "up"),
+            a=reference.a, b=reference.b, c=reference.c, norm=reference.norm
+        )
+        points = reference.roi if roi_enabled else np.zeros((0, 2), dtype=np.int32)
+        points.setflags(write=False)
+        roi = RoiConfig(enabled=roi_enabled, points=points, percent=roi_percent)
+    except ConfigError:
+        raise
+    except (KeyError, TypeError, ValueError) as e:
+        raise ConfigError(f"malformed configuration: {e!r}") from e
+
+    return RuntimeConfig(general=general, model=model, detection=detection, line=line, roi=roi, geometry=geometry)
+
+
+# RuntimeConfig ล่าสุด สร้างใหม่เฉพาะเมื่อ config เป็น object ใหม่ (โหลดหรือ reload)
+_cached = (None, None)
+
+
+def get_runtime_config(config):
+    """
+    ดึง RuntimeConfig ของ config (สร้างครั้งเดียวต่อ config object)
+
+    Args:
+        config (dict): Configuration dictionary
+
+    Returns:
+        RuntimeConfig: การตั้งค่าแบบ frozen
+    """
+    global _cached
+    cached_config, runtime = _cached
+    if cached_config is not config:
+        runtime = build_runtime_config(config)
+        _cached = (config, runtime)
+    return runtime
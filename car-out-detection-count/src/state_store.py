@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+State Store Module
+โมดูลสำหรับบันทึกและกู้คืนสถานะการนับ (checkpoint) ลงไฟล์ไบนารี
+"""
+
+import os
+import time
+import zlib
+import struct
+import tempfile
+import threading
+from loguru import logger
+
+# รูปแบบไฟล์ checkpoint (little-endian)
+# header : magic, version, saved_at, total_count, จำนวน tracks, จำนวน recent counts, หมายเลข track ถัดไป
+# track  : ความยาว id, id (utf-8), x, y, first_seen, class, crossed, หมายเลข track
+# recent : timestamp (epoch), total_count
+# trailer: crc32 ของข้อมูลทั้งหมดก่อนหน้า
+# (version 1 ไม่มีหมายเลข track ใน header และใน track)
+CHECKPOINT_MAGIC = b"VDCK"
+CHECKPOINT_VERSION = 2
+_PREFIX = struct.Struct("<4sH")
+_HEADER = struct.Struct("<4sHdIIII")
+_HEADER_V1 = struct.Struct("<4sHdIII")
+_TRACK_ID_LEN = struct.Struct("<H")
+_TRACK = struct.Struct("<ffdBBI")
+_TRACK_V1 = struct.Struct("<ffdBB")
+_RECENT = struct.Struct("<dI")
+_CRC = struct.Struct("<I")
+
+
+def atomic_write(path, data):
+    """
+    เขียนไฟล์แบบ atomic (เขียนไฟล์ชั่วคราว -> fsync -> rename)
+
+    Args:
+        path (str): Path ของไฟล์ปลายทาง
+        data (bytes): ข้อมูลที่จะเขียน
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+
+    # ชื่อไฟล์ชั่วคราวไม่ซ้ำกัน: หลาย process อาจเขียนไฟล์เดียวกันพร้อมกัน (เช่น manifest ของ registry_dir ร่วม)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f"{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        # mkstemp สร้างไฟล์แบบ 0600: ใช้สิทธิ์ของไฟล์เดิม (หรือ 0644) เหมือนการเขียนไฟล์ทั่วไป
+        try:
+            mode = os.stat(path).st_mode & 0o777
+        except FileNotFoundError:
+            mode = 0o644
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+    # fsync ไดเรกทอรีเพื่อให้การ rename คงอยู่หลังไฟดับ (เฉพาะ POSIX)
+    if hasattr(os, "O_DIRECTORY"):
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def encode_checkpoint(counter_state, logger_state, saved_at=None):
+    """
+    แปลงสถานะเป็นข้อมูลไบนารี
+
+    Args:
+        counter_state (dict): สถานะจาก LineCounter.get_state()
+        logger_state (dict): สถานะจาก DataLogger.get_state()
+        saved_at (float, optional): เวลาที่บันทึก (epoch). ถ้าไม่ระบุจะใช้เวลาปัจจุบัน.
+
+    Returns:
+        bytes: ข้อมูล checkpoint
+    """
+    if saved_at is None:
+        saved_at = time.time()
+
+    tracks = counter_state["tracks"]
+    recent = logger_state["recent_counts"]
+
+    parts = [_HEADER.pack(CHECKPOINT_MAGIC, CHECKPOINT_VERSION, saved_at,
+                          counter_state["total_count"], len(tracks), len(recent),
+                          counter_state.get("next_track_id", 1))]
+
+    for vehicle_id, track in tracks.items():
+        encoded_id = vehicle_id.encode('utf-8')
+        parts.append(_TRACK_ID_LEN.pack(len(encoded_id)))
+        parts.append(encoded_id)
+        parts.append(_TRACK.pack(track["position"][0], track["position"][1],
+                                 track["first_seen"], track["class"],
+                                 1 if track["crossed"] else 0, track.get("track_id", 0)))
+
+    for timestamp, total_count in recent:
+        parts.append(_RECENT.pack(timestamp, total_count))
+
+    payload = b"".join(parts)
+    return payload + _CRC.pack(zlib.crc32(payload))
+
+
+def decode_checkpoint(data):
+    """
+    แปลงข้อมูลไบนารีกลับเป็นสถานะ
+
+    Args:
+        data (bytes): ข้อมูล checkpoint
+
+    Returns:
+        dict: {"saved_at": float, "counter": dict, "logger": dict}
+
+    Raises:
+        ValueError: ถ้าไฟล์เสียหายหรือไม่ใช่รูปแบบที่รองรับ
+    """
+    if len(data) < _HEADER.size + _CRC.size:
+        raise ValueError("Checkpoint file is truncated")
+
+    payload, (crc,) = data[:-_CRC.size], _CRC.unpack(data[-_CRC.size:])
+    if zlib.crc32(payload) != crc:
+        raise ValueError("Checkpoint checksum mismatch")
+
+    magic, version = _PREFIX.unpack_from(payload, 0)
+    if magic != CHECKPOINT_MAGIC:
+        raise ValueError("Not a checkpoint file")
+    if version == CHECKPOINT_VERSION:
+        header, track_struct = _HEADER, _TRACK
+        _, _, saved_at, total_count, n_tracks, n_recent, next_track_id = header.unpack_from(payload, 0)
+    elif version == 1:
+        header, track_struct = _HEADER_V1, _TRACK_V1
+        _, _, saved_at, total_count, n_tracks, n_recent = header.unpack_from(payload, 0)
+        next_track_id = 1
+    else:
+        raise ValueError(f"Unsupported checkpoint version: {version}")
+
+    offset = header.size
+    tracks = {}
+    for _ in range(n_tracks):
+        (id_len,) = _TRACK_ID_LEN.unpack_from(payload, offset)
+        offset += _TRACK_ID_LEN.size
+        vehicle_id = payload[offset:offset + id_len].decode('utf-8')
+        offset += id_len
+        x, y, first_seen, cls, crossed, *track_id = track_struct.unpack_from(payload, offset)
+        offset += track_struct.size
+        tracks[vehicle_id] = {
+            "position": (int(x), int(y)),
+            "first_seen": first_seen,
+            "class": cls,
+            "crossed": bool(crossed),
+            "track_id": track_id[0] if track_id else 0
+        }
+
+    recent = [_RECENT.unpack_from(payload, offset + i * _RECENT.size) for i in range(n_recent)]
+
+    return {
+        "saved_at": saved_at,
+        "counter": {"total_count": total_count, "tracks": tracks, "next_track_id": next_track_id},
+        "logger": {"recent_counts": recent}
+    }
+
+
+class StateCheckpointer:
+    """Class for periodic, atomic checkpoints of counting state"""
+
+    def __init__(self, config):
+        """
+        Initialize StateCheckpointer
+
+        Args:
+            config (dict): Configuration dictionary
+        """
+        checkpoint_config = config.get("checkpoint", {})
+        self.enabled = checkpoint_config.get("enabled", True)
+        self.path = checkpoint_config.get("path", "./logs/state/checkpoint.bin")
+        self.interval = checkpoint_config.get("interval", 5)
+
+        self._last_submit = time.monotonic()
+        self._pending = None
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = None
+
+        # เขียนไฟล์ใน background thread เพื่อไม่ให้ disk I/O บล็อกการประมวลผลเฟรม
+        if self.enabled:
+            self._thread = threading.Thread(target=self._writer_loop, name="checkpoint-writer", daemon=True)
+            self._thread.start()
+            logger.info(f"StateCheckpointer initialized: {self.path} every {self.interval}s")
+
+    def due(self):
+        """
+        ตรวจสอบว่าถึงเวลาบันทึก checkpoint แล้วหรือไม่
+
+        Returns:
+            bool: True ถ้าถึงเวลาบันทึก
+        """
+        return self.enabled and time.monotonic() - self._last_submit >= self.interval
+
+    def submit(self, counter_state, logger_state):
+        """
+        ส่งสถานะให้ background thread บันทึก (เก็บเฉพาะสถานะล่าสุด)
+
+        Args:
+            counter_state (dict): สถานะจาก LineCounter.get_state()
+            logger_state (dict): สถานะจาก DataLogger.get_state()
+        """
+        if not self.enabled:
+            return
+
+        self._last_submit = time.monotonic()
+        with self._condition:
+            self._pending = (counter_state, logger_state, time.time())
+            self._condition.notify()
+
+    def load(self):
+        """
+        โหลด checkpoint ล่าสุด
+
+        Returns:
+            dict: สถานะที่กู้คืนได้ หรือ None ถ้าไม่มีไฟล์หรือไฟล์เสียหาย
+        """
+        if not self.enabled or not os.path.isfile(self.path):
+            return None
+
+        try:
+            start = time.perf_counter()
+            with open(self.path, 'rb') as file:
+                state = decode_checkpoint(file.read())
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            logger.info(f"Checkpoint restored from {self.path} in {elapsed_ms:.1f} ms "
+                        f"(total={state['counter']['total_count']}, tracks={len(state['counter']['tracks'])})")
+            return state
+        except Exception as e:
+            logger.error(f"Error loading checkpoint: {e}")
+            return None
+
+    def close(self, counter_state=None, logger_state=None):
+        """
+        หยุด background thread และบันทึกสถานะสุดท้าย (ถ้ามี)
+
+        Args:
+            counter_state (dict, optional): สถานะสุดท้ายจาก LineCounter
+            logger_state (dict, optional): สถานะสุดท้ายจาก DataLogger
+        """
+        if not self.enabled:
+            return
+
+        if counter_state is not None and logger_state is not None:
+            self.submit(counter_state, logger_state)
+
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _writer_loop(self):
+        """Background loop ที่เขียน checkpoint ล่าสุดลงดิสก์"""
+        while True:
+            with self._condition:
+                while self._pending is None and not self._stopped:
+                    self._condition.wait()
+                pending, self._pending = self._pending, None
+                stopped = self._stopped
+
+            if pending is not None:
+                counter_state, logger_state, saved_at = pending
+                try:
+                    atomic_write(self.path, encode_checkpoint(counter_state, logger_state, saved_at))
+                except Exception as e:
+                    logger.error(f"Error writing checkpoint: {e}")
+
+            if stopped:
+                return
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tiling Module
+โมดูลแบ่งเฟรมความละเอียดสูง (เช่น 4K) เป็นช่องซ้อนทับกันเพื่อตรวจจับรถที่อยู่ไกลโดยไม่ย่อภาพทั้งเฟรม
+ข้ามช่องที่ไม่อยู่ใน ROI และรวมผลจากทุกช่องด้วย NMS ข้ามช่อง
+"""
+
+import cv2
+import numpy as np
+
+
+def _positions(start, end, tile, step):
+    """จุดเริ่มของช่องตามแกนเดียว โดยช่องสุดท้ายชิดขอบ end พอดี"""
+    if end - start <= tile:
+        return [start]
+    positions = list(range(start, end - tile, step))
+    positions.append(end - tile)
+    return positions
+
+
+def tile_grid(width, height, tile_size, overlap, bounds=None):
+    """
+    คำนวณตำแหน่งช่องที่ซ้อนทับกันครอบคลุม bounds (หรือทั้งเฟรม)
+
+    Args:
+        width (int): ความกว้างของเฟรม
+        height (int): ความสูงของเฟรม
+        tile_size (int): ขนาดช่อง (pixel)
+        overlap (float): สัดส่วนการซ้อนทับระหว่างช่องที่ติดกัน (0 ถึง < 1)
+        bounds (tuple, optional): (x1, y1, x2, y2) พื้นที่ที่ต้องครอบคลุม
+
+    Returns:
+        list: ช่องในรูปแบบ (x1, y1, x2, y2)
+    """
+    x1, y1, x2, y2 = bounds if bounds is not None else (0, 0, width, height)
+    x1, y1 = max(0, int(x1)), max(0, int(y1))
+    x2, y2 = min(width, int(x2)), min(height, int(y2))
+    tile_w, tile_h = min(tile_size, width), min(tile_size, height)
+    step = max(1, int(tile_size * (1 - overlap)))
+
+    # ขยายพื้นที่ที่เล็กกว่าช่องให้เต็มช่อง (ไม่เกินขอบเฟรม) เพื่อให้ทุกช่องมีขนาดเท่ากันสำหรับ batch
+    if x2 - x1 < tile_w:
+        x1 = min(x1, width - tile_w)
+        x2 = x1 + tile_w
+    if y2 - y1 < tile_h:
+        y1 = min(y1, height - tile_h)
+        y2 = y1 + tile_h
+
+    return [(x, y, x + tile_w, y + tile_h)
+            for y in _positions(y1, y2, tile_h, step)
+            for x in _positions(x1, x2, tile_w, step)]
+
+
+def roi_tiles(tiles, roi_points, width, height, min_coverage):
+    """
+    เลือกเฉพาะช่องที่มีพื้นที่ ROI อย่างน้อย min_coverage ของช่อง
+
+    Args:
+        tiles (list): ช่องจาก tile_grid()
+        roi_points (numpy.ndarray): จุดของ ROI (N x 2)
+        width (int): ความกว้างของเฟรม
+        height (int): ความสูงของเฟรม
+        min_coverage (float): สัดส่วนขั้นต่ำของพื้นที่ ROI ในช่อง (0 = มี ROI อยู่บ้างก็พอ)
+
+    Returns:
+        list: ช่องที่ต้องตรวจจับ
+    """
+    mask = np.zeros((height, width), dtype=np.uint8)
+    cv2.fillPoly(mask, [roi_points.reshape(-1, 1, 2)], 1)
+    # integral image: พื้นที่ ROI ในแต่ละช่องคำนวณได้ด้วยการบวกลบ 4 ค่า
+    integral = cv2.integral(mask)
+    selected = []
+    for x1, y1, x2, y2 in tiles:
+        area = integral[y2, x2] - integral[y1, x2] - integral[y2, x1] + integral[y1, x1]
+        coverage = area / float((x2 - x1) * (y2 - y1))
+        if area > 0 and coverage >= min_coverage:
+            selected.append((x1, y1, x2, y2))
+    return selected
+
+
+def non_max_suppression(detections, iou_threshold, containment_threshold):
+    """
+    NMS แยกตาม class ของ detection ที่รวมจากทุกช่อง
+
+    กล่องที่ถูกตัดที่ขอบช่องมักอยู่ภายในกล่องเต็มของช่องข้างเคียง ทำให้ IoU ต่ำ
+    จึงตัดกล่องที่พื้นที่ซ้อนทับเทียบกับกล่องที่เล็กกว่า >= containment_threshold ด้วย
+
+    Args:
+        detections (list): [x1, y1, x2, y2, confidence, class]
+        iou_threshold (float): IoU ที่ถือว่าเป็นรถคันเดียวกัน
+        containment_threshold (float): สัดส่วนที่กล่องเล็กอยู่ในกล่องใหญ่ที่ถือว่าเป็นรถคันเดียวกัน
+
+    Returns:
+        list: detections ที่เหลือ เรียงตาม confidence
+    """
+    if len(detections) < 2:
+        return list(detections)
+
+    boxes = np.array([det[:4] for det in detections], dtype=np.float64)
+    scores = np.array([det[4] for det in detections])
+    classes = np.array([det[5] for det in detections])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+
+    order = np.argsort(-scores)
+    keep = []
+    while len(order) > 0:
+        best, rest = order[0], order[1:]
+        keep.append(best)
+        top_left = np.maximum(boxes[best, :2], boxes[rest, :2])
+        bottom_right = np.minimum(boxes[best, 2:], boxes[rest, 2:])
+        intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=1)
+        iou = intersection / np.maximum(areas[best] + areas[rest] - intersection, 1e-9)
+        containment = intersection / np.maximum(np.minimum(areas[best], areas[rest]), 1e-9)
+        overlapping = (iou >= iou_threshold) | (containment >= containment_threshold)
+        duplicate = (classes[rest] == classes[best]) & overlapping
+        order = rest[~duplicate]
+    return [detections[i] for i in keep]
+
+
+class Tiler:
+    """Computes and caches the tile layout for the current frame size and ROI"""
+
+    def __init__(self, tiling, geometry):
+        """
+        Args:
+            tiling (TilingConfig): detection.tiling
+            geometry (SceneGeometry): ROI ที่ใช้ข้ามช่องที่ไม่เกี่ยวข้อง (แปลงตามขนาดเฟรม)
+        """
+        self.tiling = tiling
+        self.geometry = geometry
+        self._shape = None
+        self.tiles = []
+
+    def layout(self, frame):
+        """
+        Args:
+            frame (numpy.ndarray): เฟรมที่จะตรวจจับ
+
+        Returns:
+            list: ช่อง (x1, y1, x2, y2) ของเฟรมขนาดนี้ (คำนวณใหม่เมื่อขนาดเฟรมเปลี่ยน)
+        """
+        shape = frame.shape[:2]
+        if shape != self._shape:
+            height, width = shape
+            pixels = self.geometry.pixels(width, height)
+            tiles = tile_grid(width, height, self.tiling.tile_size, self.tiling.overlap, pixels.roi_bounds)
+            if pixels.roi is not None:
+                tiles = roi_tiles(tiles, pixels.roi, width, height, self.tiling.min_roi_coverage)
+            self.tiles = tiles
+            self._shape = shape
+        return self.tiles
+
+    def crops(self, frame):
+        """
+        Returns:
+            list: ภาพของแต่ละช่อง (view ของเฟรม ไม่คัดลอก)
+        """
+        return [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in self.layout(frame)]
+
+    def merge(self, tile_detections):
+        """
+        แปลงพิกัดของแต่ละช่องกลับเป็นพิกัดของเฟรม แล้วรวมด้วย NMS ข้ามช่อง
+
+        Args:
+            tile_detections (list): detections ของแต่ละช่อง ตามลำดับของ layout()
+
+        Returns:
+            list: [x1, y1, x2, y2, confidence, class] ในพิกัดของเฟรม
+        """
+        merged = []
+        for (tx, ty, _, _), detections in zip(self.tiles, tile_detections):
+            for x1, y1, x2, y2, conf, cls in detections:
+                merged.append([x1 + tx, y1 + ty, x2 + tx, y2 + ty, conf, cls])
+        return non_max_suppression(merged, self.tiling.nms_iou, self.tiling.nms_containment)
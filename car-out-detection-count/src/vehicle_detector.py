@@ -8,66 +8,116 @@ Vehicle Detector Module
 
 import os
 import sys
-import torch
-import numpy as np
+import time
+import threading
+import cv2
 from loguru import logger
-from pathlib import Path
-from ultralytics import YOLO
+
+from src.runtime_config import build_model_config, get_runtime_config
+from src.model_registry import ModelChecksumError, ModelRegistry
+from src.cpu_tuning import inference_context
+from src.tiling import Tiler
+from src.cascade import DetectionCascade
+
+
 class VehicleDetector:
     """Class for detecting vehicles using YOLO models"""
     
-    def __init__(self, config):
+    def __init__(self, config, model=None):
         """
         Initialize VehicleDetector
         
         Args:
             config (dict): Configuration dictionary
+            model (optional): โมเดลที่โหลดไว้แล้ว (ไม่โหลดจาก registry) เช่น ตอนตรวจสอบโมเดล INT8
         """
         self.config = config
         self.model = None
-        self.device = config["model"]["device"]
-        self.conf_threshold = config["model"]["confidence_threshold"]
-        self.classes = config["model"]["classes"]
+        self.runtime = get_runtime_config(config)
+        # การตั้งค่าของโมเดลที่ใช้งานอยู่ (อาจต่างจาก runtime.model ระหว่าง/หลังการสลับโมเดล)
+        self.model_config = self.runtime.model
+        self.device = self.model_config.device
+        self._inference = inference_context(config, self.model_config.format)
+        self.conf_threshold = self.runtime.model.confidence_threshold
+        self.classes = self._classes_argument(self.runtime.model.classes)
+        self._tiler = self._create_tiler(self.runtime)
+        
+        # การสลับโมเดลแบบไม่หยุดทำงาน: โหลดและ warm-up ใน background แล้วสลับระหว่างเฟรม
+        self._swap_lock = threading.Lock()
+        self._loading = None      # ModelConfig ที่กำลังโหลด
+        self._pending = None      # (model, model_config) ที่พร้อมสลับ
+        self._previous = None     # (model, model_config) เดิม สำหรับ rollback ระหว่างช่วงทดลอง
+        self._probation = None    # สถิติของโมเดลใหม่ในช่วงทดลอง
+        self.last_swap = None
         
         # Load model
-        self.load_model()
+        if model is not None:
+            self.model = model
+        else:
+            self.load_model()
+        self.cascade = self._create_cascade()
+    
+    def apply_config(self, config):
+        """
+        นำการตั้งค่าที่โหลดใหม่ (hot reload) มาใช้ระหว่างเฟรม (confidence, classes, ROI)
+        ถ้าส่วนของโมเดลเปลี่ยน จะโหลดโมเดลใหม่ใน background แล้วสลับเมื่อพร้อม
+        
+        Args:
+            config (dict): Configuration dictionary
+        """
+        previous = self.runtime.model
+        self.config = config
+        self.runtime = get_runtime_config(config)
+        self.conf_threshold = self.runtime.model.confidence_threshold
+        self.classes = self._classes_argument(self.runtime.model.classes)
+        self._tiler = self._create_tiler(self.runtime)
+        
+        # เปลี่ยนโมเดล, format, imgsz หรือ device ในไฟล์การตั้งค่า -> สลับโมเดลแบบไม่หยุดทำงาน
+        # (เทียบกับการตั้งค่าครั้งก่อน เพื่อไม่ย้อนโมเดลที่สลับด้วยคำสั่งควบคุม)
+        if self._model_identity(self.runtime.model) != self._model_identity(previous):
+            self.swap_model(self.runtime.model)
+    
+    @staticmethod
+    def _model_identity(model_config):
+        """ค่าที่ต้องโหลดโมเดลใหม่เมื่อเปลี่ยน"""
+        return (model_config.type, model_config.model_path, model_config.format,
+                model_config.imgsz, model_config.sha256, model_config.device)
+    
+    @staticmethod
+    def _classes_argument(classes):
+        """แปลง classes (tuple) เป็น list สำหรับ predict() หรือ None = ทุก class"""
+        return list(classes) if classes is not None else None
+    
+    @staticmethod
+    def _create_tiler(runtime):
+        """Tiler ของ detection.tiling หรือ None ถ้าตรวจจับทั้งเฟรม"""
+        tiling = runtime.detection.tiling
+        return Tiler(tiling, runtime.geometry) if tiling.enabled else None
+    
+    def _create_cascade(self):
+        """DetectionCascade ของ model.cascade หรือ None ถ้าใช้โมเดลหลักทุกเฟรม"""
+        if not self.config["model"].get("cascade", {}).get("enabled", False):
+            return None
+        if self._tiler is not None:
+            logger.warning("model.cascade is ignored while detection.tiling is enabled")
+            return None
+        try:
+            return DetectionCascade(self.config, self.runtime)
+        except Exception as e:
+            logger.exception(f"Error loading cascade proposal model, using the main model on every frame: {e}")
+            return None
     
     def load_model(self):
         """Load YOLO model based on configuration"""
         try:
-            model_type = self.config["model"]["type"].lower()
-            model_path = self.config["model"]["model_path"]
-            logger.info(f"Loading {model_type} model from {model_path}...")
+            # โหลดจากไฟล์ในเครื่องเท่านั้น (ไม่ดาวน์โหลด) ตรวจ checksum และ warm-up ก่อนใช้งาน
+            model_config = self.model_config
+            logger.info(f"Loading {model_config.type} model from {model_config.model_path}...")
+            self.model = ModelRegistry(self.config).load(model_config)
             
-            if model_type == "yolov5" or model_type == "yolov5m":
-                # ใช้โมเดลมาตรฐานแทนไฟล์ที่มีปัญหา
-                try:
-                    # ใช้โมเดลมาตรฐานแทนไฟล์ที่มีปัญหา
-                    self.model = YOLO("yolov5mu.pt")  # ดาวน์โหลดโมเดลมาตรฐานแทน
-                    logger.info(f"YOLOv5 model loaded successfully on {self.device}")
-                except ImportError:
-                    logger.error("Ultralytics not installed. Please install it with: pip install -U ultralytics")
-                    raise ImportError("Ultralytics not installed")
-                    
-            elif model_type == "yolov8":
-                # Check if Ultralytics package is installed
-                try:
-                    # Load model
-                    self.model = YOLO("yolov8n.pt")  # ใช้โมเดลมาตรฐานแทน
-                    
-                    # Set device
-                    if self.device != "cpu":
-                        self.model.to(self.device)
-                        
-                    logger.info(f"YOLOv8 model loaded successfully on {self.device}")
-                    
-                except ImportError:
-                    logger.error("Ultralytics not installed. Please install it with: pip install -U ultralytics")
-                    raise ImportError("Ultralytics not installed")
-                    
-            else:
-                raise ValueError(f"Unsupported model type: {model_type}")
-                
+        except (ModelChecksumError, FileNotFoundError):
+            # ไฟล์โมเดลถูกแก้ไขหรือไม่มีอยู่: หยุดตั้งแต่เริ่ม แทนการทำงานต่อโดยไม่นับรถเลย
+            raise
         except Exception as e:
             logger.exception(f"Error loading model: {e}")
             logger.warning("Continuing without object detection...")
@@ -83,78 +133,262 @@ class VehicleDetector:
         Returns:
             list: List of detection results, each containing [x1, y1, x2, y2, confidence, class]
         """
+        # สลับเป็นโมเดลใหม่ที่โหลดเสร็จแล้ว (ระหว่างเฟรมเท่านั้น)
+        if self._pending is not None:
+            self._activate_pending()
+        
         if self.model is None:
             return []
         
+        started = time.perf_counter()
+        failed = False
         try:
-            model_type = self.config["model"]["type"].lower()
-            detections = []
-            
-            if model_type == "yolov5" or model_type == "yolov5m":
-                # ใช้ API ใหม่สำหรับทั้ง YOLOv5
-                results = self.model.predict(
-                    frame,
-                    conf=self.conf_threshold,
-                    classes=self.classes,
-                    verbose=False
-                )
-                
-                if results and len(results) > 0:
-                    boxes = results[0].boxes
-                    for box in boxes:
-                        xyxy = box.xyxy[0].cpu().numpy()
-                        x1, y1, x2, y2 = map(int, xyxy)
-                        conf = float(box.conf[0].item())
-                        cls = int(box.cls[0].item())
-                        # Add detection in format [x1, y1, x2, y2, confidence, class]
-                        detections.append([x1, y1, x2, y2, conf, cls])
-                        
-            elif model_type == "yolov8":
-                # Run inference
-                results = self.model.predict(
-                    frame,
-                    conf=self.conf_threshold,
-                    classes=self.classes,
-                    verbose=False
-                )
-                
-                # Process results
-                if results and len(results) > 0:
-                    boxes = results[0].boxes
-                    for box in boxes:
-                        xyxy = box.xyxy[0].cpu().numpy()
-                        x1, y1, x2, y2 = map(int, xyxy)
-                        conf = float(box.conf[0].item())
-                        cls = int(box.cls[0].item())
-                        # Add detection in format [x1, y1, x2, y2, confidence, class]
-                        detections.append([x1, y1, x2, y2, conf, cls])
-                        
-            else:
-                logger.error(f"Unsupported model type: {model_type}")
-                return []
-            
-            # กรองตาม ROI หากมีการเปิดใช้งาน ที่ตั้งค่าใน config.yaml ในส่วนของ detection region_of_interest enabled = True
-            if "region_of_interest" in self.config["detection"] and self.config["detection"]["region_of_interest"]["enabled"]:
-                roi_points = np.array(self.config["detection"]["region_of_interest"]["points"], np.int32)
-                
-                # กรองเฉพาะ detections ที่อยู่ในพื้นที่
-                filtered_detections = []
-                for det in detections:
-                    x1, y1, x2, y2, conf, cls = det
-                    center_x = (x1 + x2) // 2
-                    center_y = (y1 + y2) // 2
-                    
-                    # ตรวจสอบว่าจุดศูนย์กลางอยู่ในพื้นที่หรือไม่
-                    if cv2.pointPolygonTest(roi_points, (center_x, center_y), False) >= 0:
-                        filtered_detections.append(det)
-                
-                return filtered_detections
-            
-            return detections
-            
+            detections = self._detect(frame)
         except Exception as e:
             logger.exception(f"Error during detection: {e}")
+            detections = []
+            failed = True
+        
+        if self._probation is not None:
+            self._record_probation(time.perf_counter() - started, failed)
+        return detections
+    
+    def _detect(self, frame):
+        if self._tiler is not None:
+            # ช่องที่ซ้อนทับกัน (เฉพาะที่อยู่ใน ROI) ส่งเข้าโมเดลเป็น batch เดียว แล้วรวมด้วย NMS ข้ามช่อง
+            crops = self._tiler.crops(frame)
+            results = self._predict(crops) if crops else []
+            detections = self._tiler.merge([self._boxes(result) for result in results])
+        elif self.cascade is not None:
+            detections = self._detect_cascade(frame)
+        else:
+            results = self._predict(frame)
+            detections = self._boxes(results[0]) if results else []
+        
+        # กรองตาม ROI หากมีการเปิดใช้งาน ที่ตั้งค่าใน config.yaml ในส่วนของ detection region_of_interest enabled = True
+        if self.runtime.roi.enabled:
+            # ROI ที่ขนาดของเฟรมนี้ (แปลงจากสัดส่วนครั้งเดียวต่อขนาดเฟรม)
+            roi_points = self.runtime.geometry.for_frame(frame).roi
+            # กรองเฉพาะ detections ที่จุดศูนย์กลางอยู่ในพื้นที่
+            filtered_detections = []
+            for det in detections:
+                x1, y1, x2, y2, conf, cls = det
+                center = ((x1 + x2) // 2, (y1 + y2) // 2)
+                if cv2.pointPolygonTest(roi_points, center, False) >= 0:
+                    filtered_detections.append(det)
+            
+            return filtered_detections
+        
+        return detections
+    
+    def _detect_cascade(self, frame):
+        cascade = self.cascade
+        # ขั้นที่ 1: โมเดลเล็กทั้งเฟรม (confidence ต่ำกว่าโมเดลหลักเพื่อไม่พลาดรถ)
+        started = time.perf_counter()
+        results = self._predict(frame, cascade.model, cascade.model_config.imgsz,
+                                cascade.model_config.confidence_threshold, cascade.model_config.backend)
+        proposals = self._boxes(results[0]) if results else []
+        accepted, to_confirm = cascade.plan(proposals, self.conf_threshold,
+                                            self.runtime.geometry.for_frame(frame))
+        proposal_latency = time.perf_counter() - started
+        
+        # ขั้นที่ 2: โมเดลหลักเฉพาะ crop รอบ proposal ที่ต้องยืนยัน (batch เดียว)
+        started = time.perf_counter()
+        regions, region_detections = [], []
+        if to_confirm:
+            height, width = frame.shape[:2]
+            regions = cascade.crop_regions(to_confirm, width, height)
+            crops = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in regions]
+            results = self._predict(crops, imgsz=cascade.confirm_imgsz)
+            region_detections = [self._boxes(result) for result in results]
+        detections = cascade.resolve(accepted, to_confirm, regions, region_detections)
+        cascade.record(proposals, accepted, to_confirm, proposal_latency, time.perf_counter() - started)
+        return detections
+    
+    def _predict(self, source, model=None, imgsz=None, conf=None, backend=None):
+        # ฟังก์ชัน inference ของ model.type (เลือกไว้แล้วตอนสร้าง RuntimeConfig ไม่ต้องตรวจสอบ type ทุกเฟรม)
+        predict = backend or self.model_config.backend
+        with self._inference():
+            return predict(
+                model or self.model,
+                source,
+                conf=self.conf_threshold if conf is None else conf,
+                classes=self.classes,
+                imgsz=imgsz or self.model_config.imgsz,
+                device=self.device
+            )
+    
+    @staticmethod
+    def _boxes(result):
+        """แปลงผลของภาพหนึ่งภาพเป็น [x1, y1, x2, y2, confidence, class]"""
+        boxes = result.boxes
+        if len(boxes) == 0:
             return []
+        # ย้ายข้อมูลจาก device ครั้งเดียวต่อภาพแทนทีละกล่อง
+        xyxy = boxes.xyxy.cpu().numpy().astype(int)
+        confs = boxes.conf.cpu().numpy()
+        classes = boxes.cls.cpu().numpy().astype(int)
+        return [[x1, y1, x2, y2, conf, cls]
+                for (x1, y1, x2, y2), conf, cls in zip(xyxy.tolist(), confs.tolist(), classes.tolist())]
+    
+    def swap_model(self, model_config):
+        """
+        เริ่มโหลดโมเดลใหม่ใน background โมเดลเดิมยังใช้งานต่อจนกว่าโมเดลใหม่จะ warm-up เสร็จ
+        
+        Args:
+            model_config (ModelConfig): การตั้งค่าของโมเดลใหม่
+        
+        Returns:
+            bool: True ถ้าเริ่มโหลด, False ถ้ากำลังโหลดโมเดลอื่นอยู่
+        """
+        with self._swap_lock:
+            if self._loading is not None:
+                logger.warning(f"Model swap to {self._loading.model_path} already in progress, "
+                               f"ignoring {model_config.model_path}")
+                return False
+            self._loading = model_config
+        
+        logger.info(f"Loading {model_config.model_path} ({model_config.format}, imgsz={model_config.imgsz}) "
+                    f"in the background...")
+        threading.Thread(target=self._load_candidate, args=(model_config,), name="model-swap", daemon=True).start()
+        return True
+    
+    def request_model_swap(self, overrides):
+        """
+        สลับโมเดลตามคำสั่งควบคุม โดยแทนค่าในส่วน model ของการตั้งค่าปัจจุบัน
+        
+        Args:
+            overrides (dict): ค่าที่ต้องการเปลี่ยน เช่น {"model_path": ..., "format": "onnx"}
+        
+        Returns:
+            dict: สถานะการสลับโมเดล
+        """
+        model_section = dict(self.config["model"])
+        model_section.update(overrides)
+        started = self.swap_model(build_model_config(model_section))
+        status = self.get_model_status()
+        status["started"] = started
+        return status
+    
+    def _load_candidate(self, model_config):
+        started = time.perf_counter()
+        try:
+            model = ModelRegistry(self.config).load(model_config)
+        except Exception as e:
+            logger.exception(f"Model swap to {model_config.model_path} failed, keeping the current model: {e}")
+            with self._swap_lock:
+                self._loading = None
+            self.last_swap = {"status": "load_failed", "model_path": model_config.model_path, "error": str(e)}
+            return
+        
+        with self._swap_lock:
+            self._loading = None
+            self._pending = (model, model_config)
+        logger.info(f"Model {model_config.model_path} ready after {time.perf_counter() - started:.1f}s, "
+                    f"switching at the next frame")
+    
+    def _activate_pending(self):
+        with self._swap_lock:
+            pending, self._pending = self._pending, None
+        if pending is None:
+            return
+        
+        model_config = self.config.get("model", {})
+        previous = (self.model, self.model_config)
+        self._use_model(*pending)
+        logger.info(f"Switched to model {self.model_config.model_path}")
+        
+        # ไม่มีโมเดลเดิมให้ rollback (โหลดครั้งแรกไม่สำเร็จ) ใช้โมเดลใหม่ทันที
+        if previous[0] is None:
+            self._previous = None
+            self._probation = None
+            self.last_swap = {"status": "committed", "model_path": self.model_config.model_path}
+            return
+        
+        self._previous = previous
+        self._probation = {
+            "frames": 0,
+            "errors": 0,
+            "latencies": [],
+            "limit_frames": model_config.get("swap_probation_frames", 300),
+            "max_latency": model_config.get("swap_max_latency_ms", 0) / 1000,
+            "max_error_rate": model_config.get("swap_max_error_rate", 0.05)
+        }
+        self.last_swap = {"status": "probation", "model_path": self.model_config.model_path}
+    
+    def _record_probation(self, latency, failed):
+        probation = self._probation
+        probation["frames"] += 1
+        probation["latencies"].append(latency)
+        if failed:
+            probation["errors"] += 1
+        
+        # ข้อผิดพลาดเกินที่ยอมรับได้ของทั้งช่วงแล้ว ไม่ต้องรอจนจบช่วงทดลอง
+        if probation["errors"] > probation["max_error_rate"] * probation["limit_frames"]:
+            self.rollback_model(f"{probation['errors']} errors in {probation['frames']} frames")
+            return
+        if probation["frames"] < probation["limit_frames"]:
+            return
+        
+        latencies = sorted(probation["latencies"])
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        if probation["max_latency"] and p95 > probation["max_latency"]:
+            self.rollback_model(f"p95 latency {p95 * 1000:.1f} ms over {probation['max_latency'] * 1000:.0f} ms")
+            return
+        
+        # ผ่านช่วงทดลอง ปล่อยโมเดลเดิม
+        logger.info(f"Model {self.model_config.model_path} passed probation: p95 {p95 * 1000:.1f} ms, "
+                    f"{probation['errors']} errors in {probation['frames']} frames")
+        self.last_swap = {"status": "committed", "model_path": self.model_config.model_path,
+                          "p95_latency_ms": p95 * 1000, "errors": probation["errors"]}
+        self._previous = None
+        self._probation = None
+    
+    def _use_model(self, model, model_config):
+        self.model = model
+        self.model_config = model_config
+        self.device = model_config.device
+        self._inference = inference_context(self.config, model_config.format)
+    
+    def rollback_model(self, reason="requested"):
+        """
+        กลับไปใช้โมเดลเดิม (ได้เฉพาะในช่วงทดลองหลังการสลับ)
+        
+        Args:
+            reason (str): เหตุผลที่ rollback
+        
+        Returns:
+            bool: True ถ้า rollback สำเร็จ
+        """
+        if self._previous is None:
+            logger.warning("No previous model to roll back to")
+            return False
+        
+        failed_path = self.model_config.model_path
+        self._use_model(*self._previous)
+        self._previous = None
+        self._probation = None
+        self.last_swap = {"status": "rolled_back", "model_path": failed_path, "reason": reason}
+        logger.warning(f"Rolled back from {failed_path} to {self.model_config.model_path}: {reason}")
+        return True
+    
+    def get_model_status(self):
+        """
+        Returns:
+            dict: โมเดลที่ใช้งาน, โมเดลที่กำลังโหลด และผลการสลับครั้งล่าสุด
+        """
+        probation = self._probation
+        return {
+            "model_path": self.model_config.model_path,
+            "format": self.model_config.format,
+            "imgsz": self.model_config.imgsz,
+            "device": self.model_config.device,
+            "loaded": self.model is not None,
+            "loading": self._loading.model_path if self._loading else None,
+            "probation_frames": probation["frames"] if probation else None,
+            "last_swap": self.last_swap,
+            "cascade": self.cascade.stats.as_dict() if self.cascade is not None else None
+        }
 
     def draw_detections(self, frame, detections, draw_labels=True):
         """
@@ -185,9 +419,9 @@ class VehicleDetector:
         }
         
         # วาดพื้นที่ ROI ถ้ามีการเปิดใช้งาน
-        if "detection" in self.config and "region_of_interest" in self.config["detection"] and self.config["detection"]["region_of_interest"]["enabled"]:
-            roi_points = np.array(self.config["detection"]["region_of_interest"]["points"], np.int32)
-            roi_points = roi_points.reshape((-1, 1, 2))  # ปรับรูปแบบสำหรับ polylines
+        if self.runtime.roi.enabled:
+            # ROI เดียวกับที่ใช้กรอง detection ที่ขนาดของเฟรมนี้
+            roi_points = self.runtime.geometry.for_frame(frame).roi.reshape((-1, 1, 2))  # ปรับรูปแบบสำหรับ polylines
             cv2.polylines(frame, [roi_points], True, (0, 255, 255), 2)  # วาดเส้นขอบ ROI สีเหลือง
         
         # Draw each detection
@@ -221,6 +455,3 @@ class VehicleDetector:
                 cv2.putText(frame, label, (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
         
         return frame
-
-# Import OpenCV here to avoid circular import
-import cv2
\ No newline at end of file
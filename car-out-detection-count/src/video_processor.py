@@ -9,6 +9,7 @@ Video Processor Module
 import os
 import cv2
 import time
+import zlib
 import numpy as np
 from loguru import logger
 
@@ -29,6 +30,19 @@ class VideoProcessor:
         self.frame_height = 0
         self.fps = 0
         
+        # ตรวจจับเฟรมซ้ำ: เทียบ fingerprint ของเฟรมกับเฟรมที่วิเคราะห์ล่าสุด
+        # ตรวจจับกล้องค้าง: เทียบ checksum ของเฟรมทั้งภาพ (เฟรมเดิมทุก byte)
+        freeze_config = config["video_source"].get("freeze_detection", {})
+        self.freeze_detection = freeze_config.get("enabled", True)
+        self.duplicate_threshold = freeze_config.get("duplicate_threshold", 4.0)
+        self.stale_after = freeze_config.get("stale_after", 60.0)
+        self._fingerprint = None
+        self._frame_checksum = None
+        self._last_change = None
+        self.duplicate_frames = 0
+        self.frozen_frames = 0
+        self.stale = False
+        
         # Try to get environment variables for RTSP
         self.rtsp_username = os.getenv("RTSP_USERNAME", "")
         self.rtsp_password = os.getenv("RTSP_PASSWORD", "")
@@ -145,6 +159,97 @@ class VideoProcessor:
         
         return self.cap.read()
     
+    @staticmethod
+    def frame_fingerprint(frame):
+        """
+        ภาพย่อขาวดำ 32x18 ของเฟรม (ใช้เทียบเฟรมได้เร็วโดยไม่ต้องเทียบทุก pixel)
+        
+        Args:
+            frame (numpy.ndarray): Input frame
+        
+        Returns:
+            numpy.ndarray: fingerprint (int16 เพื่อให้ลบกันได้โดยไม่ล้น)
+        """
+        # สุ่มตัวอย่าง pixel ก่อน (เร็วแม้เป็นภาพ 4K) แล้วเฉลี่ยเป็นภาพย่อ
+        sampled = cv2.resize(frame, (256, 144), interpolation=cv2.INTER_NEAREST)
+        small = cv2.resize(sampled, (32, 18), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.int16)
+    
+    def is_duplicate_frame(self, frame):
+        """
+        ตรวจสอบว่าเฟรมเหมือนเฟรมที่วิเคราะห์ล่าสุดหรือไม่ (ไม่มีช่องใดของภาพย่อเปลี่ยนเกิน duplicate_threshold)
+        และตรวจสอบกล้องค้าง (ดู _check_frozen)
+        
+        Args:
+            frame (numpy.ndarray): เฟรมที่จะวิเคราะห์
+        
+        Returns:
+            bool: True ถ้าควรใช้ detections เดิมแทนการรันโมเดลใหม่
+        """
+        if not self.freeze_detection:
+            return False
+        
+        self._check_frozen(frame)
+        
+        fingerprint = self.frame_fingerprint(frame)
+        # ความต่างสูงสุดของช่องใดช่องหนึ่ง (0-255) แทนค่าเฉลี่ยทั้งภาพ
+        # เพื่อให้รถคันเล็กที่เปลี่ยนภาพเพียงไม่กี่ช่องไม่ถูกเฉลี่ยหายไป
+        if (self._fingerprint is not None
+                and np.abs(fingerprint - self._fingerprint).max() <= self.duplicate_threshold):
+            self.duplicate_frames += 1
+            return True
+        
+        self._fingerprint = fingerprint
+        self.duplicate_frames = 0
+        return False
+    
+    def _check_frozen(self, frame):
+        """
+        ถือว่ากล้องค้าง (stale) เมื่อได้เฟรมที่เหมือนเดิมทุก byte ต่อเนื่องนานกว่า stale_after วินาที
+        ภาพนิ่งจากกล้องที่ยังทำงาน (เช่น ลานจอดตอนกลางคืน) ยังมี noise ของการบีบอัด จึงไม่ถูกนับเป็นกล้องค้าง
+        
+        Args:
+            frame (numpy.ndarray): เฟรมที่จะวิเคราะห์
+        """
+        checksum = zlib.crc32(np.ascontiguousarray(frame))
+        now = time.monotonic()
+        if checksum == self._frame_checksum:
+            self.frozen_frames += 1
+            frozen = now - self._last_change
+            if not self.stale and self.stale_after and frozen >= self.stale_after:
+                self.stale = True
+                logger.warning(f"Camera stream looks frozen: identical frames for {frozen:.0f}s "
+                               f"({self.frozen_frames} frames)")
+            return
+        
+        if self.stale:
+            logger.info(f"Camera stream recovered after {now - self._last_change:.0f}s frozen")
+            self.stale = False
+        self._frame_checksum = checksum
+        self._last_change = now
+        self.frozen_frames = 0
+    
+    def get_camera_status(self):
+        """
+        Returns:
+            dict: status ("running" หรือ "stale") และเวลาที่ได้เฟรมเดิมซ้ำ (วินาที)
+        """
+        frozen = time.monotonic() - self._last_change if self.frozen_frames else 0.0
+        return {"status": "stale" if self.stale else "running", "frozen_seconds": round(frozen, 1)}
+    
+    def get_position_ms(self):
+        """
+        ดึงตำแหน่งเวลาปัจจุบันของวิดีโอ (media timestamp)
+        
+        Returns:
+            int: ตำแหน่งเวลาในหน่วยมิลลิวินาที (0 ถ้าไม่ทราบ)
+        """
+        if self.cap is None:
+            return 0
+        
+        position = self.cap.get(cv2.CAP_PROP_POS_MSEC)
+        return int(position) if position and position > 0 else 0
+    
     def display_frame(self, frame):
         """
         แสดงเฟรมในหน้าต่าง